@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga y escalado del orquestador
+
+Lanza N jobs sintéticos (sleep, CPU, salida continua) por cada escala y mide:
+- spawn: latencia de POST /jobs/ y throughput (jobs/s)
+- list: latencia de GET /jobs/ con los N jobs corriendo
+- idle: CPU y RSS del orquestador, duración del tick del monitor y lag del
+  event loop mientras los N jobs corren (costo del monitoreo)
+- kill: tiempo de POST /jobs/kill para los N jobs
+
+Modos:
+- in-process (por defecto): la app corre con TestClient en este mismo proceso
+  (el CPU/RSS medido incluye al generador de carga)
+- --uvicorn: levanta `uvicorn main:app` en un puerto libre y lo mide aparte
+- --url: contra un servidor ya corriendo (--server-pid para medir su CPU/RSS)
+
+Uso:
+    python benchmark.py --scales 10,100,1000 --workloads sleep,cpu,chatty
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json  # exit 1 si hay regresiones
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import psutil
+
+
+# Código de los jobs sintéticos (python -c, sin shell)
+WORKLOADS = {
+    "sleep": "import time\nwhile True: time.sleep(3600)",
+    "cpu": "while True: pass",
+    "chatty": (
+        "import sys, time\n"
+        "rate = {rate}\n"
+        "i = 0\n"
+        "while True:\n"
+        "    for _ in range(max(1, rate // 10)):\n"
+        "        i += 1\n"
+        "        print('line', i, 'x' * 64)\n"
+        "    sys.stdout.flush()\n"
+        "    time.sleep(0.1)\n"
+    ),
+}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max en milisegundos"""
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+    def pct(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    return {"p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": ordered[-1] * 1000}
+
+
+class ResourceSampler:
+    """CPU (%) y RSS (MB) de un proceso, muestreados en un thread mientras dura una fase"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.process.cpu_percent(interval=None)  # primer llamado: referencia
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._sample():
+                return
+
+    def _sample(self) -> bool:
+        try:
+            cpu = self.process.cpu_percent(interval=None)
+            rss = self.process.memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return False
+        self.cpu.append(cpu)
+        self.rss.append(rss)
+        return True
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()  # al cierre: una fase más corta que `interval` también tiene su muestra
+
+    def summary(self) -> Dict[str, float]:
+        # sin muestras (el proceso terminó) no hay valores: un 0.0 se compararía como real
+        if not self.cpu:
+            return {}
+        return {
+            "cpu_avg_percent": sum(self.cpu) / len(self.cpu),
+            "cpu_max_percent": max(self.cpu),
+            "rss_max_mb": max(self.rss),
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(workdir: str, max_jobs: int) -> Dict[str, str]:
+    """Configuración aislada: DB y logs temporales, cupo para todos los jobs, instrumentación activa"""
+    return {
+        "DB_PATH": os.path.join(workdir, "bench.db"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "MAX_CONCURRENT_JOBS": str(max_jobs),
+        "MAX_QUEUED_JOBS": str(max_jobs),
+        "PERF_ENABLED": "true",
+    }
+
+
+def timed(call: Callable[[], object], samples: List[float]):
+    start = time.perf_counter()
+    response = call()
+    samples.append(time.perf_counter() - start)
+    return response
+
+
+class Benchmark:
+    """Corre las fases para cada workload y escala y junta las métricas en un dict plano"""
+
+    def __init__(self, client, server_pid: Optional[int], args):
+        self.client = client
+        self.server_pid = server_pid
+        self.args = args
+        self.metrics: Dict[str, float] = {}
+
+    def record(self, prefix: str, values: Dict[str, float]):
+        for name, value in values.items():
+            self.metrics[f"{prefix}.{name}"] = round(value, 3)
+
+    def sampler(self) -> ResourceSampler:
+        return ResourceSampler(self.server_pid) if self.server_pid else _NullSampler()
+
+    def run(self):
+        for workload in self.args.workloads:
+            for scale in self.args.scales:
+                print(f"🚀 {workload} x {scale}")
+                self.run_scale(workload, scale)
+
+    def run_scale(self, workload: str, scale: int):
+        prefix = f"{workload}.{scale}"
+        code = WORKLOADS[workload].format(rate=self.args.chatty_rate)
+        payload = {"command": [sys.executable, "-c", code], "timeout": 0}
+        self.client.post("/debug/perf", json={"enabled": True, "reset": True})
+
+        # spawn
+        latencies: List[float] = []
+        job_ids: List[str] = []
+        def spawn(_):
+            response = timed(lambda: self.client.post("/jobs/", json=payload), latencies)
+            if response.status_code == 201:
+                return response.json()["job_id"]
+            return None
+
+        with self.sampler() as resources, ThreadPoolExecutor(self.args.concurrency) as pool:
+            start = time.perf_counter()
+            job_ids = [job_id for job_id in pool.map(spawn, range(scale)) if job_id]
+            elapsed = time.perf_counter() - start
+        self.record(f"{prefix}.spawn", {
+            "jobs_per_s": len(job_ids) / elapsed,
+            "errors": scale - len(job_ids),
+            **percentiles(latencies),
+            **resources.summary(),
+        })
+
+        try:
+            # list
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(self.args.requests):
+                timed(lambda: self.client.get("/jobs/"), latencies)
+            elapsed = time.perf_counter() - start
+            self.record(f"{prefix}.list", {"requests_per_s": self.args.requests / elapsed, **percentiles(latencies)})
+
+            # idle: costo de monitorear los jobs
+            self.client.post("/debug/perf", json={"reset": True})
+            with self.sampler() as resources:
+                time.sleep(self.args.idle)
+            perf = self.client.get("/debug/perf").json()
+            monitor = perf.get("job_monitor") or {}
+            self.record(f"{prefix}.idle", {
+                **resources.summary(),
+                "tick_p95_ms": monitor.get("tick_duration", {}).get("p95_ms", 0.0),
+                "lock_wait_p95_ms": monitor.get("lock", {}).get("wait", {}).get("p95_ms", 0.0),
+                "loop_lag_p95_ms": perf["event_loop_lag"]["p95_ms"],
+                "threads": perf["threads"],
+                "open_fds": perf["open_fds"] or 0,
+            })
+        finally:
+            # kill
+            if job_ids:
+                start = time.perf_counter()
+                self.client.post("/jobs/kill", json={"job_ids": job_ids})
+                self.record(f"{prefix}.kill", {"seconds": time.perf_counter() - start})
+
+
+class _NullSampler:
+    """Sin PID del servidor (--url sin --server-pid): no hay CPU/RSS"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def summary(self) -> Dict[str, float]:
+        return {}
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+# Métricas que no se comparan: informativas o demasiado ruidosas (un solo outlier)
+NOT_COMPARED = (".errors", ".threads", ".open_fds", ".max_ms", ".cpu_max_percent")
+
+
+def compare(metrics: Dict[str, float], baseline: Dict[str, float], tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    Métricas que empeoraron más que `tolerance` (relativo) respecto del baseline.
+    Las latencias además tienen que empeorar al menos `min_delta_ms` (absoluto):
+    pasar de 0.8 ms a 1.0 ms es ruido, no una regresión.
+    """
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        value = metrics.get(name)
+        if value is None or not base or name.endswith(NOT_COMPARED):
+            continue
+        change = (value - base) / abs(base)
+        if higher_is_better(name):
+            change = -change
+        if change <= tolerance:
+            continue
+        if name.endswith("_ms") and value - base < min_delta_ms:
+            continue
+        if name.endswith(".seconds") and (value - base) * 1000 < min_delta_ms:
+            continue
+        regressions.append(f"{name}: {base} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def print_table(metrics: Dict[str, float]):
+    phases: Dict[str, Dict[str, float]] = {}
+    for name, value in metrics.items():
+        phase, metric = name.rsplit(".", 1)
+        phases.setdefault(phase, {})[metric] = value
+    for phase, values in phases.items():
+        print(f"  {phase:<22} " + "  ".join(f"{metric}={value}" for metric, value in values.items()))
+
+
+def run_in_process(args, workdir: str) -> Dict[str, float]:
+    os.environ.update(server_env(workdir, max(args.scales)))
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        bench = Benchmark(client, os.getpid(), args)
+        bench.run()
+    return bench.metrics
+
+
+def run_against(url: str, server_pid: Optional[int], args) -> Dict[str, float]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    with httpx.Client(base_url=url, timeout=120, limits=limits) as client:
+        bench = Benchmark(client, server_pid, args)
+        bench.run()
+    return bench.metrics
+
+
+def run_uvicorn(args, workdir: str) -> Dict[str, float]:
+    port = free_port()
+    env = {**os.environ, **server_env(workdir, max(args.scales))}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn no arrancó")
+                time.sleep(0.1)
+        return run_against(url, server.pid, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga y escalado del orquestador")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--uvicorn", action="store_true", help="Levantar uvicorn y medirlo como proceso aparte")
+    target.add_argument("--url", help="Servidor ya corriendo (p. ej. http://localhost:8000)")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor de --url (para CPU/RSS)")
+    parser.add_argument("--scales", default="10,100,1000", help="Cantidades de jobs (separadas por coma)")
+    parser.add_argument("--workloads", default="sleep,cpu,chatty", help=f"Workloads: {', '.join(WORKLOADS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests en paralelo al lanzar jobs")
+    parser.add_argument("--requests", type=int, default=200, help="Requests de GET /jobs/ por escala")
+    parser.add_argument("--idle", type=float, default=5.0, help="Segundos midiendo el costo del monitoreo")
+    parser.add_argument("--chatty-rate", type=int, default=100, help="Líneas por segundo de cada job chatty")
+    parser.add_argument("--output", help="Guardar los resultados (JSON)")
+    parser.add_argument("--baseline", help="Comparar contra un baseline (JSON); exit 1 si hay regresiones")
+    parser.add_argument("--save-baseline", help="Guardar los resultados como baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo tolerado (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Empeoramiento mínimo (ms) para contar una latencia")
+    args = parser.parse_args()
+
+    args.scales = [int(scale) for scale in args.scales.split(",") if scale]
+    args.workloads = [workload for workload in args.workloads.split(",") if workload]
+    unknown = [workload for workload in args.workloads if workload not in WORKLOADS]
+    if unknown:
+        parser.error(f"workloads desconocidos: {', '.join(unknown)}")
+    return args
+
+
+def main():
+    args = parse_args()
+    mode = "uvicorn" if args.uvicorn else ("url" if args.url else "in-process")
+
+    print("=" * 60)
+    print(f"⏱️  MINI ORCHESTRATOR - BENCHMARK ({mode})")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory(prefix="orchestrator-bench-") as workdir:
+        if args.url:
+            metrics = run_against(args.url.rstrip("/"), args.server_pid, args)
+        elif args.uvicorn:
+            metrics = run_uvicorn(args, workdir)
+        else:
+            metrics = run_in_process(args, workdir)
+
+    results = {
+        "meta": {
+            "mode": mode,
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scales": args.scales,
+            "workloads": args.workloads,
+        },
+        "metrics": metrics,
+    }
+
+    print()
+    print("📊 Resultados")
+    print_table(metrics)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            print(f"💾 Guardado en {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(metrics, baseline["metrics"], args.tolerance, args.min_delta_ms)
+        print()
+        if baseline["meta"].get("mode") != mode:
+            print(f"⚠️  El baseline se midió en modo {baseline['meta'].get('mode')} (ahora: {mode})")
+        if regressions:
+            print(f"❌ {len(regressions)} regresiones (tolerancia {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ Sin regresiones respecto de {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
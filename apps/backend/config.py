@@ -20,13 +20,41 @@ class Settings(BaseSettings):
     # Monitoring
     monitor_interval: float = 1.0  # segundos entre lecturas
     log_retention_days: int = 7
+    log_max_bytes: int = 10 * 1024 * 1024  # tamaño del archivo vivo de un job antes de rotar (0 = sin límite)
+    log_max_age: float = 86400  # segundos antes de rotar el archivo vivo (0 = sin límite)
+    log_compression: str = "gzip"  # segmentos rotados: gzip, zstd (requiere zstandard) o none
+    log_max_total_mb: int = 2048  # cuota de log_dir; se borran los segmentos más viejos (0 = sin cuota)
+    log_max_open_files: int = 256  # FDs de logs abiertos a la vez (pool LRU del writer)
+    log_flush_interval: float = 0.2  # segundos máximos que una línea espera en memoria
+    log_flush_bytes: int = 256 * 1024  # bytes acumulados que fuerzan una escritura
+    log_search_index: bool = True  # índice de trigramas por bloque para /logs/search (sin él, búsqueda lineal)
+    log_line_index_interval: int = 1000  # líneas entre registros del índice de líneas/tiempo (.lines)
+    metrics_history_size: int = 3600  # puntos por serie (sistema y cada proceso)
+    metrics_finished_processes: int = 100  # procesos terminados cuyo historial se conserva
     
     # Process limits
     max_concurrent_jobs: int = 50
-    job_timeout: int = 3600  # segundos
+    max_queued_jobs: int = 10000  # jobs esperando en el scheduler (más -> 429)
+    queue_limits: dict = {}  # límite de jobs corriendo por cola, p. ej. {"batch": 10}
+    spawn_concurrency: int = 8  # threads que lanzan procesos en paralelo (POST /jobs/batch)
+    job_timeout: int = 3600  # segundos (0 = sin límite); se puede cambiar por job
+    kill_grace_period: float = 5.0  # segundos entre SIGTERM y SIGKILL
+    
+    # Command policy
+    command_allow: list = []  # ejecutables permitidos (nombre o ruta); vacío = todos
+    command_deny: list = ["rm", "mkfs", "dd", "format", ">", ">>"]  # argumentos prohibidos
+    command_deny_patterns: list = []  # regex prohibidas en cualquier argumento
+    command_cache_ttl: float = 1.0  # segundos entre chequeos de mtime de los directorios del PATH
+    command_cache_size: int = 1024  # ejecutables resueltos en cache (LRU)
+    
+    # Self-instrumentation (/debug/perf, se puede activar en caliente)
+    perf_enabled: bool = False
+    perf_lag_interval: float = 0.5  # segundos entre sondas de lag del event loop
+    perf_max_profile_seconds: float = 60.0  # duración máxima de un perfil por muestreo
     
     # Paths
     log_dir: str = "./logs"
+    db_path: str = "./orchestrator.db"  # historial de jobs (SQLite)
     
     # CORS
     cors_origins: list = ["http://localhost:3000", "http://localhost:3001"]
@@ -0,0 +1,95 @@
+import heapq
+import itertools
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DeadlineScheduler:
+   """
+   Deadlines de todos los jobs en un solo min-heap con un solo thread.
+   - add/cancel en O(log n) / O(1) (cancelacion perezosa: la entrada vieja se descarta al salir del heap)
+   - el thread duerme hasta el deadline mas proximo -> sin costo mientras no vence nada
+   - al vencer: SIGTERM, y si el job sigue vivo despues de `grace` segundos, SIGKILL
+   """
+   def __init__(self, send_signal: Callable[[str, int], bool], grace: float = 5.0):
+      """
+      send_signal(job_id, sig) -> False si el job ya no existe (no se escala)
+      """
+      self.send_signal = send_signal
+      self.grace = grace
+      self.heap: List[Tuple[float, int, str, int]] = [] # (deadline monotonic, seq, job_id, signal)
+      self.active: Dict[str, int] = {} #[job_id, seq] -> entrada vigente de cada job
+      self._seq = itertools.count()
+      self.cond = threading.Condition()
+      self.running = True
+      self._thread: Optional[threading.Thread] = None
+
+   def add(self, job_id: str, timeout: float):
+      """Programa el deadline de un job (reemplaza el anterior si existia)"""
+      self._push(job_id, time.monotonic() + timeout, signal.SIGTERM)
+      self._ensure_thread()
+
+   def _push(self, job_id: str, deadline: float, sig: int):
+      with self.cond:
+         seq = next(self._seq)
+         self.active[job_id] = seq
+         heapq.heappush(self.heap, (deadline, seq, job_id, sig))
+         if len(self.heap) > 2 * len(self.active) + 64:
+            self._compact()
+         if self.heap[0][1] == seq:
+            self.cond.notify() # nuevo deadline mas proximo: despertar al thread
+
+   def cancel(self, job_id: str):
+      """El job termino: descartar su deadline"""
+      with self.cond:
+         self.active.pop(job_id, None)
+
+   def _compact(self):
+      """Quita las entradas canceladas (con el lock tomado)"""
+      self.heap = [entry for entry in self.heap if self.active.get(entry[2]) == entry[1]]
+      heapq.heapify(self.heap)
+
+   def __len__(self) -> int:
+      return len(self.active)
+
+   def _ensure_thread(self):
+      if self._thread is not None and self._thread.is_alive():
+         return
+      with self.cond:
+         if self._thread is not None and self._thread.is_alive():
+            return
+         self._thread = threading.Thread(target=self._run, name="job-deadlines", daemon=True)
+         self._thread.start()
+
+   def _run(self):
+      while self.running:
+         with self.cond:
+            expired = []
+            now = time.monotonic()
+            while self.heap and self.heap[0][0] <= now:
+               _, seq, job_id, sig = heapq.heappop(self.heap)
+               if self.active.get(job_id) == seq:
+                  del self.active[job_id]
+                  expired.append((job_id, sig))
+            if not expired:
+               timeout = self.heap[0][0] - now if self.heap else None
+               self.cond.wait(timeout)
+               continue
+
+         # las señales se envian fuera del lock
+         for job_id, sig in expired:
+            try:
+               alive = self.send_signal(job_id, sig)
+            except Exception:
+               alive = False
+            if alive and sig == signal.SIGTERM:
+               self._push(job_id, time.monotonic() + self.grace, signal.SIGKILL)
+
+   def shutdown(self):
+      with self.cond:
+         self.running = False
+         self.cond.notify()
+      if self._thread is not None:
+         self._thread.join(timeout=1)
@@ -1,74 +1,200 @@
 import threading
 import time
-from typing import Dict, Optional
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
 import psutil  # get a process and stadistics (from operative system to script)
 from core.process_manager import ProcessManager
+from core.perf import InstrumentedLock, LatencyStats
+
+
+def sample_process(p: psutil.Process, timestamp: float) -> Dict:
+   """
+   Full metrics of one process read with a single oneshot() (same shape as /metrics/process/{pid}).
+   cpu_percent is non blocking: the % since the previous call on the same Process object.
+   """
+   with p.oneshot(): # one read of /proc/<pid>/stat for all the fields
+      memory_info = p.memory_info()
+      metrics = {
+         "timestamp": timestamp,
+         "datetime": datetime.fromtimestamp(timestamp).isoformat(),
+         "pid": p.pid,
+         "name": p.name(),
+         "status": p.status(),
+         "cpu_percent": p.cpu_percent(interval=None), # none -> no wait for any second (interval)
+         "memory": {
+            "rss_mb": memory_info.rss / (1024 * 1024), # from bytes to Mbytes
+            "vms_mb": memory_info.vms / (1024 * 1024)
+         },
+         "num_threads": p.num_threads(),
+         "create_time": p.create_time(),
+      }
+      try: # io may fail on some systems
+         io_counters = p.io_counters()
+         metrics["io"] = {
+            "read_bytes": io_counters.read_bytes,
+            "write_bytes": io_counters.write_bytes
+         }
+      except (psutil.AccessDenied, AttributeError):
+         metrics["io"] = None
+   return metrics
+
 
 class JobMonitorManager:
+   """
+   Monitor de jobs con un unico sampler.
+   Un solo thread recorre todos los PIDs monitoreados en cada tick y publica
+   un snapshot consistente (mismo timestamp para todos), asi el costo no
+   crece en threads al aumentar la cantidad de jobs.
+   """
    def __init__(self, process_manager: ProcessManager, interval: float = 1.0):
       self.pm = process_manager
       self.interval = interval
-      self.stats:Dict[int, Dict] = {} #[PID, stats{}]
+      self.stats:Dict[int, Dict] = {} #[PID, stats{}] -> snapshot del ultimo tick (se reemplaza, no se muta)
+      self.process_metrics:Dict[int, Dict] = {} #[PID, metrics{}] -> mismo tick, todos los campos (sample_process)
+      self.listeners: List[Callable[[Dict[int, Dict]], None]] = [] # reciben process_metrics en cada tick
+      self.exit_listeners: List[Callable[[int], None]] = [] # reciben el PID de cada proceso que termino
+      self.tick = 0 # numero de snapshot publicado (cambia en cada tick -> ETag de respuestas con metricas)
       self.running = True
-      self.monitors:Dict[int, threading.Thread] = {}
-      self.lock = threading.Lock()  # all the threads of the instance are loked
-                                    # |-> so just one thread can acces one resource at the time
+      self.monitors:Dict[int, psutil.Process] = {} #[PID, Process] -> cache de handles (cpu_percent necesita el anterior)
+      self.lock = InstrumentedLock()  # all the threads of the instance are loked
+                                      # |-> so just one thread can acces one resource at the time
+                                      # (records wait times when contended -> /debug/perf)
+      self.tick_duration = LatencyStats() # time spent sampling all the PIDs of a tick
+      self.tick_jitter = LatencyStats()   # how late each tick started vs its slot on the clock
+      self._wakeup = threading.Event()
+      self._sampler: Optional[threading.Thread] = None
 
    def start_monitoring(self, pid:int):
-      if pid in self.monitors:
-         return   # is already monitorized
-      
-      # Crear y arrancar el thread de monitoreo
-      thread = threading.Thread(target=self._monitor_job, args=(pid,), daemon=True)
-      
       with self.lock:
-         self.monitors[pid] = thread
-      
-      thread.start()
-      
+         if pid in self.monitors:
+            return   # is already monitorized
+         try:
+            p = psutil.Process(pid)
+            p.cpu_percent(interval=None) # first call primes the counters (returns 0.0)
+         except psutil.NoSuchProcess:
+            return
+         self.monitors[pid] = p
+
+      self._ensure_sampler()
+
    def stop_monitoring(self, pid:int):
-      if pid in self.stats:
-         with self.lock: # ensure that we can acces the thread
-            del self.stats[pid]
-      if pid in self.monitors:
-         with self.lock:
-            del self.monitors[pid]
-
-
-   def _monitor_job(self, pid:int):
-      try:
-         p = psutil.Process(pid)
-      except psutil.NoSuchProcess:
+      with self.lock: # ensure that we can acces the thread
+         self.monitors.pop(pid, None)
+         if pid in self.stats:
+            stats = dict(self.stats)
+            del stats[pid]
+            self.stats = stats
+         if pid in self.process_metrics:
+            details = dict(self.process_metrics)
+            del details[pid]
+            self.process_metrics = details
+
+   def add_listener(self, callback: Callable[[Dict[int, Dict]], None]):
+      """callback(process_metrics) is called from the sampler thread after every tick"""
+      self.listeners.append(callback)
+
+   def add_exit_listener(self, callback: Callable[[int], None]):
+      """callback(pid) is called from the sampler thread when a monitored process finishes"""
+      self.exit_listeners.append(callback)
+
+   def _ensure_sampler(self):
+      """Arranca el thread sampler la primera vez que se monitorea un PID"""
+      if self._sampler is not None and self._sampler.is_alive():
          return
+      with self.lock:
+         if self._sampler is not None and self._sampler.is_alive():
+            return
+         self._sampler = threading.Thread(target=self._sample_loop, name="job-monitor", daemon=True)
+         self._sampler.start()
 
+   def _sample_loop(self):
+      next_tick = time.monotonic()
       while self.running:
+         started = time.monotonic()
+         self.tick_jitter.observe(started - next_tick)
+         self._sample_once()
+         self.tick_duration.observe(time.monotonic() - started)
+
+         # ticks alineados a un reloj fijo -> las muestras no se desplazan con el tiempo de trabajo
+         next_tick += self.interval
+         delay = next_tick - time.monotonic()
+         if delay < 0:
+            next_tick = time.monotonic() # tick atrasado, no acumular deuda
+            delay = 0
+         self._wakeup.wait(delay)
+
+   def _sample_once(self):
+      with self.lock:
+         targets = list(self.monitors.items())
+
+      timestamp = time.time() # return the time (Actually return the time since unix 1970 in seconds)
+      snapshot: Dict[int, Dict] = {}
+      details: Dict[int, Dict] = {}
+      finished = []
+      for pid, p in targets:
          try:
-            cpu = p.cpu_percent(interval=None) # none -> no wait for any second (interval)
-            ram = p.memory_info().rss / (1024 * 1024) # from bytes to Mbytes
-            status = p.status()
-
-            with self.lock:  # access resource if the resource is free and not used by other????
-               self.stats[pid] = {
-                  "cpu":cpu,
-                  "ram": ram,
-                  "status": status,
-                  "timestamp": time.time() # return the time (Actually return the time since unix 1970 in seconds)
-
-               }
-            if status in ("zombie", "dead", "stopped"):
-               break
-
-            time.sleep(self.interval) #??
+            metrics = sample_process(p, timestamp)
          except psutil.NoSuchProcess:
-            break
-      # when no runing
-      self.stop_monitoring(pid)
+            finished.append(pid)
+            continue
+         except psutil.AccessDenied:
+            continue # still alive, retry on the next tick
+
+         status = metrics["status"]
+         details[pid] = metrics
+         snapshot[pid] = {
+            "cpu": metrics["cpu_percent"],
+            "ram": metrics["memory"]["rss_mb"],
+            "status": status,
+            "timestamp": timestamp,
+         }
+         if status in (psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD): # stopped (SIGSTOP) is still running
+            finished.append(pid)
+
+      with self.lock:
+         # PIDs removidos durante el tick no deben reaparecer
+         self.stats = {pid: s for pid, s in snapshot.items() if pid in self.monitors}
+         self.process_metrics = {pid: m for pid, m in details.items() if pid in self.monitors}
+         for pid in finished:
+            self.monitors.pop(pid, None)
+         self.tick += 1
+
+      for callback in self.listeners:
+         try:
+            callback(details)
+         except Exception:
+            pass # un listener con errores no debe detener el sampler
+
+      for pid in finished:
+         for callback in self.exit_listeners:
+            try:
+               callback(pid)
+            except Exception:
+               pass
 
    def get_stats(self, pid: int) -> Optional[Dict]:
       return self.stats.get(pid)
 
    def get_all_stats(self) -> Dict[int, Dict]:
       return self.stats
-   
+
+   def get_process_metrics(self, pid: int) -> Optional[Dict]:
+      """Full metrics of a monitored PID from the last tick (O(1), no syscalls)"""
+      return self.process_metrics.get(pid)
+
+   def timing_stats(self) -> Dict:
+      """Tick duration/jitter and waits on self.lock (sampled by the sampler thread)"""
+      return {
+         "interval": self.interval,
+         "ticks": self.tick,
+         "monitored": len(self.monitors),
+         "tick_duration": self.tick_duration.summary(),
+         "tick_jitter": self.tick_jitter.summary(),
+         "lock": self.lock.stats(),
+      }
+
    def shutdown(self):
-      self.running = False
\ No newline at end of file
+      self.running = False
+      self._wakeup.set()
+      if self._sampler is not None:
+         self._sampler.join(timeout=self.interval + 1)
@@ -0,0 +1,129 @@
+import os
+import selectors
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# sink(job_id, stream, lines) -> escribe las lineas donde corresponda (log del job)
+OutputSink = Callable[[str, str, List[str]], None]
+
+
+class OutputDrainer:
+   """
+   Lee stdout/stderr de todos los jobs desde un unico thread (selectors).
+   - Lee en chunks de `chunk_size` y entrega lineas completas al sink
+   - Memoria acotada por stream: chunk_size + max_line_bytes (lineas mas largas se cortan)
+   - Backpressure: el sink se llama en el mismo thread, si el disco es lento se deja
+     de leer, el pipe del kernel se llena y el proceso hijo espera (no se acumula en RAM)
+   """
+   def __init__(self, sink: OutputSink, chunk_size: int = 64 * 1024, max_line_bytes: int = 64 * 1024,
+                on_close: Optional[Callable[[str], None]] = None):
+      self.sink = sink
+      self.on_close = on_close # on_close(job_id) cuando todos los streams del job llegaron a EOF
+      self._open_streams: Dict[str, int] = {} #[job_id, streams sin cerrar] (solo el thread de drenado)
+      self.chunk_size = chunk_size
+      self.max_line_bytes = max_line_bytes
+      self.selector = selectors.DefaultSelector()
+      self.running = True
+      self._pending: List[Tuple[str, str, object]] = [] # (job_id, stream, pipe) a registrar
+      self._lock = threading.Lock()
+      self._wake_r, self._wake_w = os.pipe() # self-pipe para despertar select() al registrar
+      os.set_blocking(self._wake_r, False)
+      self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+      self._thread: Optional[threading.Thread] = None
+
+   def attach(self, job_id: str, process: subprocess.Popen):
+      """Empieza a drenar stdout/stderr de un proceso"""
+      with self._lock:
+         wake = not self._pending # si ya habia pendientes, el thread ya fue despertado
+         for stream, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+            if pipe is not None:
+               self._pending.append((job_id, stream, pipe))
+         if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="output-drain", daemon=True)
+            self._thread.start()
+      if wake:
+         os.write(self._wake_w, b"\0")
+
+   def _register_pending(self):
+      with self._lock:
+         pending, self._pending = self._pending, []
+      for job_id, stream, pipe in pending:
+         os.set_blocking(pipe.fileno(), False)
+         # data -> [job_id, stream, pipe, buffer de linea parcial]
+         self.selector.register(pipe.fileno(), selectors.EVENT_READ, [job_id, stream, pipe, b""])
+         self._open_streams[job_id] = self._open_streams.get(job_id, 0) + 1
+
+   def _run(self):
+      while self.running:
+         for key, _ in self.selector.select(timeout=1.0):
+            if key.data is None:
+               try:
+                  os.read(self._wake_r, 4096)
+               except BlockingIOError:
+                  pass
+               self._register_pending()
+            else:
+               self._drain(key.fd, key.data)
+
+      # shutdown: vaciar lo que quede en los buffers parciales
+      for key in list(self.selector.get_map().values()):
+         if key.data is not None:
+            self._close(key.fd, key.data)
+
+   def _drain(self, fd: int, state: list):
+      job_id, stream, _, partial = state
+      try:
+         chunk = os.read(fd, self.chunk_size) # un chunk por tick -> reparto justo entre jobs
+      except BlockingIOError:
+         return
+      except OSError:
+         chunk = b""
+
+      if not chunk: # EOF: el proceso cerro el stream
+         self._close(fd, state)
+         return
+
+      data = partial + chunk
+      *complete, partial = data.split(b"\n")
+      if len(partial) > self.max_line_bytes: # linea sin fin -> cortar para acotar memoria
+         complete.append(partial)
+         partial = b""
+      state[3] = partial
+
+      if complete:
+         self._emit(job_id, stream, complete)
+
+   def _emit(self, job_id: str, stream: str, raw_lines: List[bytes]):
+      lines = [line.decode("utf-8", errors="replace").rstrip("\r") for line in raw_lines]
+      try:
+         self.sink(job_id, stream, lines)
+      except Exception:
+         pass # un error de escritura no debe matar el drenado del resto de jobs
+
+   def _close(self, fd: int, state: list):
+      job_id, stream, pipe, partial = state
+      if partial:
+         self._emit(job_id, stream, [partial])
+      self.selector.unregister(fd)
+      try:
+         pipe.close()
+      except OSError:
+         pass
+
+      remaining = self._open_streams.get(job_id, 1) - 1
+      if remaining > 0:
+         self._open_streams[job_id] = remaining
+         return
+      self._open_streams.pop(job_id, None)
+      if self.on_close is not None:
+         try:
+            self.on_close(job_id)
+         except Exception:
+            pass
+
+   def shutdown(self):
+      self.running = False
+      os.write(self._wake_w, b"\0")
+      if self._thread is not None:
+         self._thread.join(timeout=2)
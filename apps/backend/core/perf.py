@@ -0,0 +1,177 @@
+"""
+Primitivas de medición para la auto-instrumentación (/debug/perf y Prometheus)
+
+Histogramas de latencia con buckets fijos, un lock que mide la espera de
+quien lo toma y un profiler por muestreo de los stacks de los threads.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+
+
+# Límites superiores (segundos) de los histogramas de latencia: 10us .. 10s, 6 por década
+LATENCY_BUCKETS = tuple(round(m * 10.0 ** e, 6) for e in range(-5, 1) for m in (1, 1.5, 2, 3, 5, 7.5)) + (10.0,)
+
+
+class LatencyStats:
+   """
+   Histograma de latencia de una operación (segundos), desde el último reset.
+   - buckets fijos (LATENCY_BUCKETS): memoria y observe O(1), y los mismos
+     conteos se exportan como histograma de Prometheus
+   - los percentiles se interpolan dentro de su bucket (error acotado por el ancho del bucket)
+   - no es thread safe por sí solo: cada instancia se escribe desde un único lugar
+     (event loop, thread del sampler, o con el lock que mide tomado)
+   """
+   def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+      self.buckets = buckets
+      self.counts = [0] * (len(buckets) + 1) # el último es +Inf
+      self.count = 0
+      self.total = 0.0
+      self.max = 0.0
+
+   def observe(self, seconds: float):
+      self.counts[bisect_left(self.buckets, seconds)] += 1
+      self.count += 1
+      self.total += seconds
+      if seconds > self.max:
+         self.max = seconds
+
+   def reset(self):
+      self.counts = [0] * (len(self.buckets) + 1)
+      self.count = 0
+      self.total = 0.0
+      self.max = 0.0
+
+   def quantile(self, q: float) -> float:
+      """Cuantil q en segundos, lineal dentro del bucket que lo contiene (como histogram_quantile)"""
+      counts = list(self.counts) # otro thread puede estar escribiendo mientras tanto
+      rank = q * sum(counts)
+      seen = 0
+      for i, count in enumerate(counts):
+         if count and seen + count >= rank:
+            if i == len(self.buckets):
+               return self.max # bucket +Inf
+            lower = self.buckets[i - 1] if i else 0.0
+            value = lower + (self.buckets[i] - lower) * (rank - seen) / count
+            return min(value, self.max)
+         seen += count
+      return 0.0
+
+   def summary(self) -> Dict:
+      """count, avg, max y percentiles (en milisegundos)"""
+      return {
+         "count": self.count,
+         "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+         "p50_ms": self.quantile(0.50) * 1000,
+         "p95_ms": self.quantile(0.95) * 1000,
+         "p99_ms": self.quantile(0.99) * 1000,
+         "max_ms": self.max * 1000,
+      }
+
+
+class InstrumentedLock:
+   """
+   threading.Lock que registra cuánto esperó quien lo toma.
+   Sin contención es un acquire no bloqueante (sin leer el reloj); solo
+   cuando el lock está ocupado se mide la espera. Las estadísticas se
+   actualizan con el lock tomado, así que no necesitan otra sincronización.
+   """
+   def __init__(self):
+      self._lock = threading.Lock()
+      self.acquisitions = 0
+      self.contended = 0
+      self.wait = LatencyStats() # solo las tomas con contención
+
+   def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+      if self._lock.acquire(False):
+         self.acquisitions += 1
+         return True
+      if not blocking:
+         return False
+      started = time.perf_counter()
+      if not self._lock.acquire(True, timeout):
+         return False
+      self.acquisitions += 1
+      self.contended += 1
+      self.wait.observe(time.perf_counter() - started)
+      return True
+
+   def release(self):
+      self._lock.release()
+
+   def locked(self) -> bool:
+      return self._lock.locked()
+
+   __enter__ = acquire
+
+   def __exit__(self, *exc):
+      self._lock.release()
+
+   def reset(self):
+      with self:
+         self.acquisitions = 0
+         self.contended = 0
+         self.wait.reset()
+
+   def stats(self) -> Dict:
+      return {
+         "acquisitions": self.acquisitions,
+         "contended": self.contended,
+         "wait": self.wait.summary(),
+      }
+
+
+class StackSampler:
+   """
+   Profiler por muestreo: lee el stack de cada thread con sys._current_frames()
+   cada `interval` segundos y cuenta los stacks iguales.
+   Sin hooks de tracing -> el código perfilado corre a velocidad normal; el costo
+   es un recorrido de los stacks por muestra, que paga el thread que muestrea.
+   La salida es el formato colapsado de flamegraph.pl / speedscope / inferno:
+   "thread;func_externa (archivo:línea);...;func_interna (archivo:línea) cantidad"
+   """
+   def __init__(self):
+      self._busy = threading.Lock() # un solo perfil a la vez
+
+   def profile(self, seconds: float, interval: float = 0.01) -> Optional[str]:
+      """Muestrea durante `seconds` (bloquea a quien llama). None si ya hay otro perfil corriendo"""
+      if not self._busy.acquire(False):
+         return None
+      try:
+         return self._collapse(self._sample(seconds, interval))
+      finally:
+         self._busy.release()
+
+   def _sample(self, seconds: float, interval: float) -> Dict[tuple, int]:
+      own = threading.get_ident()
+      labels: Dict[object, str] = {} #[code, "func (file:line)"] -> cada code object se formatea una vez
+      counts: Dict[tuple, int] = {}
+      deadline = time.monotonic() + seconds
+      while time.monotonic() < deadline:
+         names = {t.ident: t.name for t in threading.enumerate()}
+         for ident, frame in sys._current_frames().items():
+            if ident == own:
+               continue
+            stack = []
+            while frame is not None:
+               code = frame.f_code
+               label = labels.get(code)
+               if label is None:
+                  label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                  labels[code] = label
+               stack.append(label)
+               frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            key = tuple(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+         time.sleep(interval)
+      return counts
+
+   @staticmethod
+   def _collapse(counts: Dict[tuple, int]) -> str:
+      lines = [f"{';'.join(stack)} {count}" for stack, count in counts.items()]
+      lines.sort()
+      return "\n".join(lines) + ("\n" if lines else "")
@@ -1,43 +1,142 @@
+import asyncio
+import os
 import subprocess # set a process (from script to Operative System)
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
+from core.output_drain import OutputDrainer, OutputSink
+from core.reaper import ExitReaper
+
+
+async def wait_exit(process: subprocess.Popen):
+   """
+   Await the end of a process without blocking the loop.
+   Linux >= 5.3: a pidfd becomes readable when the process exits (loop.add_reader, no polling);
+   elsewhere: poll() with a growing sleep (1ms -> 50ms)
+   """
+   if process.poll() is not None:
+      return
+   try:
+      pidfd = os.pidfd_open(process.pid)
+   except (AttributeError, OSError): # no pidfd support (or the pid was already reaped)
+      delay = 0.001
+      while process.poll() is None:
+         await asyncio.sleep(delay)
+         delay = min(delay * 2, 0.05)
+      return
+
+   loop = asyncio.get_running_loop()
+   exited = loop.create_future()
+   loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+   try:
+      if process.poll() is None:
+         await exited
+   finally:
+      loop.remove_reader(pidfd)
+      os.close(pidfd)
+   process.poll() # reap the zombie (sets returncode)
 
 class ProcessManager:
-   def __init__(self):
+   def __init__(self, output_sink: Optional[OutputSink] = None,
+                output_closed: Optional[Callable[[str], None]] = None):
       self.jobs: Dict[int, subprocess.Popen] = {}
+      # stdout/stderr de los jobs se drenan hacia el sink (logs por job);
+      # output_closed(job_id) se llama cuando se cerraron todos los streams del job
+      self.drainer = OutputDrainer(output_sink, on_close=output_closed) if output_sink else None
+      # salida de los jobs por evento (pidfd + epoll)
+      self.reaper = ExitReaper(self._notify_exit)
+      self.exit_listeners: List[Callable[[int], None]] = []
 
-   def start_job(self, command:list) -> int:
+   def start_job(self, command:list, job_id: Optional[str] = None) -> int:
+      capture = self.drainer is not None and job_id is not None
       process = subprocess.Popen(
          command,
          stdin=subprocess.PIPE,   # be able to sent data
-         stdout=subprocess.PIPE,  # to read the output
-         stderr=subprocess.PIPE, # to see errors
-         text = True
+         # to read the output / errors (if nobody reads the pipe the job blocks when it is full)
+         stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+         stderr=subprocess.PIPE if capture else subprocess.DEVNULL,
       )
       pid = process.pid
       self.jobs[pid]=process
+      if capture:
+         self.drainer.attach(job_id, process)
       return pid
    
-   def stop_job(self, pid:int) -> bool:
+   async def stop_job(self, pid:int, grace:float = 5.0) -> Optional[int]:
       """
-      Determine if the process exist, return true if the process is stoped
+      Terminate a job without blocking the event loop: SIGTERM, await the exit
+      and SIGKILL if it is still alive after `grace` seconds.
+      Return the exit code (None if the process does not exist or could not be
+      stopped: no permission to signal it, or still alive `grace` seconds after SIGKILL)
       """
-      process = self.jobs[pid]
+      process = self.jobs.get(pid)
       if not process:
+         return None
+      if process.poll() is None:
+         try:
+            process.terminate()
+            try:
+               await asyncio.wait_for(wait_exit(process), timeout=grace)
+            except asyncio.TimeoutError:
+               # force kill
+               process.kill()
+               await asyncio.wait_for(wait_exit(process), timeout=grace)
+         except (PermissionError, asyncio.TimeoutError):
+            return None # still tracked: the caller keeps the job running
+
+      self._release(pid, process)
+      return process.returncode
+
+   def add_exit_listener(self, callback: Callable[[int], None]):
+      """callback(pid) is called from the reaper thread as soon as a watched job exits"""
+      self.exit_listeners.append(callback)
+
+   def watch_exit(self, pid:int) -> bool:
+      """
+      Notify the exit listeners when the job exits (false if pidfd is not available)
+      """
+      return self.reaper.watch(pid)
+
+   def _notify_exit(self, pid:int):
+      for callback in self.exit_listeners:
+         callback(pid)
+
+   def _release(self, pid:int, process: subprocess.Popen):
+      """Forget a finished job and close its stdin (stdout/stderr are closed by the drainer at EOF)"""
+      self.jobs.pop(pid, None)
+      if process.stdin is not None:
+         try:
+            process.stdin.close()
+         except OSError:
+            pass
+
+   def send_signal(self, pid:int, sig:int) -> bool:
+      """
+      Send a signal to a running job, return false if the process already finished
+      """
+      process = self.jobs.get(pid)
+      if process is None or process.poll() is not None:
          return False
-      process.terminate()
-      
-      try:
-         process.wait(timeout=5)
-      except subprocess.TimeoutExpired:
-         # force kill
-         process.kill()   
-
-      del self.jobs[pid]
+      process.send_signal(sig)
       return True
-   
+
+   def reap(self, pid:int) -> Optional[int]:
+      """
+      Collect the exit code of a finished job and forget it (None if it is still running)
+      """
+      process = self.jobs.get(pid)
+      if process is None:
+         return None
+      exit_code = process.poll() # also reaps the zombie
+      if exit_code is not None:
+         self._release(pid, process)
+      return exit_code
 
    def get_job(self, pid:int) -> Optional[subprocess.Popen]:
       return self.jobs[pid]
 
    def list_jobs(self) -> Dict[int, subprocess.Popen]:
       return self.jobs
+
+   def shutdown(self):
+      self.reaper.shutdown()
+      if self.drainer is not None:
+         self.drainer.shutdown()
@@ -0,0 +1,75 @@
+import os
+import select
+import threading
+from typing import Callable, Dict, Optional
+
+
+class ExitReaper:
+   """
+   Detecta la salida de los jobs apenas ocurre, sin polling.
+   Cada proceso se observa con un pidfd (Linux >= 5.3) registrado en un unico epoll:
+   el pidfd se vuelve legible cuando el proceso termina y un solo thread despierta
+   y avisa on_exit(pid). Sin pidfd (otro SO / kernel viejo) watch() devuelve False
+   y la salida la detecta el monitor de jobs en su tick.
+   """
+   def __init__(self, on_exit: Callable[[int], None]):
+      self.on_exit = on_exit
+      self.supported = hasattr(os, "pidfd_open") and hasattr(select, "epoll")
+      self.epoll = select.epoll() if self.supported else None
+      self.fds: Dict[int, int] = {} #[pidfd, PID]
+      self.lock = threading.Lock()
+      self.running = True
+      self._wake_r, self._wake_w = os.pipe() # para despertar al thread en shutdown
+      if self.epoll is not None:
+         self.epoll.register(self._wake_r, select.EPOLLIN)
+      self._thread: Optional[threading.Thread] = None
+
+   def watch(self, pid: int) -> bool:
+      """Empieza a observar un PID (False si no se puede: el llamador debe usar otro mecanismo)"""
+      if self.epoll is None:
+         return False
+      try:
+         fd = os.pidfd_open(pid)
+      except OSError: # ENOSYS (kernel sin pidfd) o ESRCH (ya fue recolectado)
+         return False
+
+      with self.lock:
+         self.fds[fd] = pid
+         if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="job-reaper", daemon=True)
+            self._thread.start()
+      self.epoll.register(fd, select.EPOLLIN) # si ya termino, es legible de inmediato
+      return True
+
+   def _run(self):
+      while self.running:
+         try:
+            events = self.epoll.poll()
+         except InterruptedError:
+            continue
+         for fd, _ in events:
+            if fd == self._wake_r:
+               continue
+            with self.lock:
+               pid = self.fds.pop(fd, None)
+            if pid is None:
+               continue
+            self.epoll.unregister(fd)
+            os.close(fd)
+            try:
+               self.on_exit(pid)
+            except Exception:
+               pass # un error al cerrar un job no debe detener el reaper
+
+   def __len__(self) -> int:
+      return len(self.fds)
+
+   def shutdown(self):
+      self.running = False
+      os.write(self._wake_w, b"\0")
+      if self._thread is not None:
+         self._thread.join(timeout=1)
+      with self.lock:
+         fds, self.fds = self.fds, {}
+      for fd in fds:
+         os.close(fd)
@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+class QueueFullError(Exception):
+   """The run queue is full (max_queued reached)"""
+   pass
+
+
+class QueuedJob:
+   __slots__ = ("job_id", "priority", "queue", "submitted_at")
+
+   def __init__(self, job_id: str, priority: int, queue: str):
+      self.job_id = job_id
+      self.priority = priority
+      self.queue = queue
+      self.submitted_at = time.monotonic()
+
+
+class JobScheduler:
+   """
+   Admission queue in front of ProcessManager.start_job.
+   - global cap (max_concurrent) + optional cap per queue (queue_limits)
+   - one heap per queue ordered by (priority desc, arrival): dispatch picks the best
+     head among the queues with free slots -> O(log n) push/pop, O(#queues) per dispatch
+   - jobs over the limit wait as "queued" and are dispatched when a slot is released
+   """
+   def __init__(self, max_concurrent: int, queue_limits: Optional[Dict[str, int]] = None, max_queued: int = 10000):
+      self.max_concurrent = max_concurrent
+      self.queue_limits = dict(queue_limits or {})
+      self.max_queued = max_queued
+      self.heaps: Dict[str, List] = {} #[queue, heap of (-priority, seq, QueuedJob)]
+      self.queued: Dict[str, QueuedJob] = {} #[job_id, entry] -> lazy deletion on cancel
+      self.running: Dict[str, str] = {} #[job_id, queue]
+      self.running_per_queue: Dict[str, int] = {}
+      self.lock = threading.Lock()
+      self._seq = itertools.count()
+      self.waits: Deque[float] = deque(maxlen=1000) # recent wait times (seconds)
+      self.dispatched_total = 0
+      # callbacks (set with bind): launch(entry) spawns the job, on_error(entry, exc) if it fails
+      self.launch: Optional[Callable[[QueuedJob], None]] = None
+      self.on_error: Optional[Callable[[QueuedJob, Exception], None]] = None
+
+   def bind(self, launch: Callable[[QueuedJob], None], on_error: Callable[[QueuedJob, Exception], None]):
+      self.launch = launch
+      self.on_error = on_error
+
+   def submit(self, job_id: str, priority: int = 0, queue: str = "default", dispatch: bool = True) -> bool:
+      """
+      Enqueue a job and dispatch whatever fits (dispatch=False leaves that to the
+      caller, e.g. from a worker thread so the spawn does not block the event loop).
+      Returns True if the job was dispatched right away, False if it stays queued.
+      """
+      entry = QueuedJob(job_id, priority, queue)
+      with self.lock:
+         if len(self.queued) >= self.max_queued:
+            raise QueueFullError(f"Run queue is full ({self.max_queued} jobs)")
+         self.queued[job_id] = entry
+         heapq.heappush(self.heaps.setdefault(queue, []), (-priority, next(self._seq), entry))
+
+      if dispatch:
+         self.dispatch()
+      return job_id in self.running
+
+   def submit_many(self, jobs: List[Tuple[str, int, str]]) -> int:
+      """
+      Enqueue several (job_id, priority, queue) with a single lock acquisition, without dispatching
+      (the caller runs dispatch(), possibly from several threads to spawn in parallel).
+      Returns how many were accepted: the first n, the rest did not fit in the run queue.
+      """
+      with self.lock:
+         accepted = jobs[:max(0, self.max_queued - len(self.queued))]
+         for job_id, priority, queue in accepted:
+            entry = QueuedJob(job_id, priority, queue)
+            self.queued[job_id] = entry
+            heapq.heappush(self.heaps.setdefault(queue, []), (-priority, next(self._seq), entry))
+      return len(accepted)
+
+   def cancel(self, job_id: str) -> bool:
+      """Remove a queued job (not yet dispatched)"""
+      with self.lock:
+         return self.queued.pop(job_id, None) is not None
+
+   def release(self, job_id: str, dispatch: bool = True) -> bool:
+      """
+      A running job finished: free its slot and dispatch the next ones
+      (dispatch=False leaves that to the caller, e.g. from a worker thread).
+      Returns False if the job held no slot.
+      """
+      with self.lock:
+         queue = self.running.pop(job_id, None)
+         if queue is None:
+            return False
+         self.running_per_queue[queue] -= 1
+      if dispatch:
+         self.dispatch()
+      return True
+
+   def _has_slot(self, queue: str) -> bool:
+      limit = self.queue_limits.get(queue)
+      return limit is None or self.running_per_queue.get(queue, 0) < limit
+
+   def _pop_next(self) -> Optional[QueuedJob]:
+      """Best head among the queues with free slots (call with the lock held)"""
+      if len(self.running) >= self.max_concurrent:
+         return None
+
+      best = None
+      for queue, heap in self.heaps.items():
+         while heap and self.queued.get(heap[0][2].job_id) is not heap[0][2]:
+            heapq.heappop(heap) # cancelled entry
+         if heap and self._has_slot(queue) and (best is None or heap[0] < best[0]):
+            best = (heap[0], queue)
+      if best is None:
+         return None
+
+      _, _, entry = heapq.heappop(self.heaps[best[1]])
+      del self.queued[entry.job_id]
+      self.running[entry.job_id] = entry.queue
+      self.running_per_queue[entry.queue] = self.running_per_queue.get(entry.queue, 0) + 1
+      self.waits.append(time.monotonic() - entry.submitted_at)
+      self.dispatched_total += 1
+      return entry
+
+   def dispatch(self):
+      """
+      Launch queued jobs while there are free slots (launch runs outside the lock,
+      so several threads can dispatch at the same time)
+      """
+      while True:
+         with self.lock:
+            entry = self._pop_next()
+         if entry is None:
+            return
+         try:
+            self.launch(entry)
+         except Exception as e:
+            with self.lock:
+               if self.running.pop(entry.job_id, None) is not None:
+                  self.running_per_queue[entry.queue] -= 1
+            if self.on_error is not None:
+               self.on_error(entry, e)
+
+   def depth(self) -> int:
+      return len(self.queued)
+
+   def stats(self) -> Dict:
+      """Queue depth, running jobs and wait times"""
+      with self.lock:
+         depth_per_queue: Dict[str, int] = {}
+         for entry in self.queued.values():
+            depth_per_queue[entry.queue] = depth_per_queue.get(entry.queue, 0) + 1
+         waits = sorted(self.waits)
+         queues = set(depth_per_queue) | set(self.running_per_queue) | set(self.queue_limits)
+         return {
+            "max_concurrent": self.max_concurrent,
+            "running": len(self.running),
+            "queued": len(self.queued),
+            "dispatched_total": self.dispatched_total,
+            "queues": {
+               queue: {
+                  "queued": depth_per_queue.get(queue, 0),
+                  "running": self.running_per_queue.get(queue, 0),
+                  "limit": self.queue_limits.get(queue),
+               }
+               for queue in sorted(queues)
+            },
+            "wait_seconds": {
+               "samples": len(waits),
+               "avg": sum(waits) / len(waits) if waits else 0.0,
+               "p50": waits[len(waits) // 2] if waits else 0.0,
+               "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+               "max": waits[-1] if waits else 0.0,
+            },
+         }
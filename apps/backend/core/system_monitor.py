@@ -5,12 +5,27 @@ import psutil  # get a process and stadistics (from operative system to script)
 from core.process_manager import ProcessManager
 
 class SystemMonitor:
+   def __init__(self, collector=None):
+      # collector: MetricsCollector con sampler en background (ultimo snapshot)
+      self.collector = collector
+
    def get_system_stats(self) -> Dict:
       """
       Retun:
       - CPU total (%)
       - RAM total / usage / porcent %
+      Served from the collector snapshot when there is one (no syscalls on the request)
       """
+      snapshot = self.collector.latest_system if self.collector is not None else None
+      if snapshot is not None:
+         return {
+            "cpu_percent": snapshot["cpu"]["percent"],
+            "ram_total_mb": snapshot["memory"]["total_mb"],
+            "ram_used_mb": snapshot["memory"]["used_mb"],
+            "ram_percent": snapshot["memory"]["percent"],
+            "timestamp": snapshot["timestamp"],
+         }
+
       ram = psutil.virtual_memory()
 
       return {
@@ -19,4 +34,4 @@ class SystemMonitor:
          "ram_used_mb": ram.used / (1024 * 1024),
          "ram_percent": ram.percent,
          "timestamp": time.time(),
-      }
\ No newline at end of file
+      }
@@ -1,6 +1,8 @@
 """
 Mini Orchestrator - Sistema de gestión y monitoreo de procesos
 """
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -9,18 +11,40 @@ from config import settings
 from core.process_manager import ProcessManager
 from core.system_monitor import SystemMonitor
 from core.job_monitor import JobMonitorManager
+from core.scheduler import JobScheduler
+from core.deadline_scheduler import DeadlineScheduler
+from services.logger import job_logger
+from services.log_follower import log_follow_hub
+from services.log_segments import log_segments
+from services.metrics_collector import metrics_collector
+from services.event_stream import event_broadcaster
+from services.job_store import job_store
+from services.prometheus import prometheus_exporter
+from services.perf import PerfMiddleware, perf_recorder
 
 # Importar routers
-from routers import jobs, metrics, logs
+from routers import jobs, metrics, logs, stream, debug
 
 
 # Instancias globales
-process_manager = ProcessManager()
-system_monitor = SystemMonitor()
+process_manager = ProcessManager(
+    output_sink=job_logger.log_job_output,
+    output_closed=job_logger.close_job_log
+)
+system_monitor = SystemMonitor(collector=metrics_collector)
 job_monitor = JobMonitorManager(
     process_manager=process_manager,
     interval=settings.monitor_interval
 )
+scheduler = JobScheduler(
+    max_concurrent=settings.max_concurrent_jobs,
+    queue_limits=settings.queue_limits,
+    max_queued=settings.max_queued_jobs
+)
+deadline_scheduler = DeadlineScheduler(
+    send_signal=jobs.signal_job,
+    grace=settings.kill_grace_period
+)
 
 
 @asynccontextmanager
@@ -33,9 +57,32 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Iniciando Mini Orchestrator...")
     
+    # Historial persistente de jobs
+    job_store.start()
+    
+    # Compresión de segmentos de log rotados + cuota de log_dir
+    log_segments.start()
+    
     # Inicializar routers con dependencias
-    jobs.init_router(process_manager, job_monitor)
-    metrics.init_router(system_monitor)
+    jobs.init_router(process_manager, job_monitor, scheduler, deadline_scheduler)
+    metrics.init_router(system_monitor, job_monitor)
+    
+    # El historial de procesos se alimenta con cada tick del monitor de jobs
+    job_monitor.add_listener(metrics_collector.record_process_batch)
+    
+    # Exposición para Prometheus (lee los snapshots de los samplers)
+    prometheus_exporter.bind(metrics_collector, job_monitor, scheduler, jobs.jobs_by_pid)
+    
+    # Auto-instrumentación (/debug/perf): timing del monitor + lag del event loop
+    perf_recorder.bind(job_monitor)
+    loop_lag_task = asyncio.create_task(perf_recorder.loop_lag_probe())
+    
+    # Stream en vivo del dashboard
+    event_broadcaster.bind(asyncio.get_running_loop())
+    stream.init_router(system_monitor, job_monitor, metrics_collector)
+    
+    # Sampler de métricas del sistema en background
+    metrics_collector.start(interval=settings.monitor_interval)
     
     print("✅ Routers inicializados")
     print(f"📊 Intervalo de monitoreo: {settings.monitor_interval}s")
@@ -45,7 +92,15 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Cerrando Mini Orchestrator...")
+    loop_lag_task.cancel()
+    deadline_scheduler.shutdown()
     job_monitor.shutdown()
+    metrics_collector.shutdown()
+    process_manager.shutdown()
+    log_follow_hub.shutdown()
+    job_logger.shutdown()
+    log_segments.shutdown()
+    job_store.close()
     print("✅ Recursos liberados")
 
 
@@ -66,10 +121,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia por ruta (solo mide con la instrumentación activa)
+app.add_middleware(PerfMiddleware, recorder=perf_recorder)
+
 # Registrar routers
 app.include_router(jobs.router)
 app.include_router(metrics.router)
 app.include_router(logs.router)
+app.include_router(stream.router)
+app.include_router(debug.router)
 
 
 @app.get("/")
@@ -83,6 +143,8 @@ def root():
             "jobs": "/jobs",
             "metrics": "/metrics",
             "logs": "/logs",
+            "stream": "/stream",
+            "debug": "/debug/perf",
             "docs": "/docs"
         }
     }
@@ -97,6 +159,7 @@ def health_check():
         "status": "healthy",
         "system": system_stats,
         "active_jobs": len(jobs.jobs_db),
+        "queued_jobs": scheduler.depth(),
         "monitored_processes": len(job_monitor.monitors)
     }
 
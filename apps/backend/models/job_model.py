@@ -1,8 +1,18 @@
-from pydantic import BaseModel
+import time
+from typing import Optional
+from pydantic import BaseModel, Field
 
 class Job(BaseModel):
    job_id:str
-   pid:int
+   pid: Optional[int] = None # None while the job waits in the scheduler queue
    command:list
    status: str
+   created_at: float = Field(default_factory=time.time) # unix timestamp
+   started_at: Optional[float] = None
+   finished_at: Optional[float] = None
+   exit_code: Optional[int] = None
+   priority: int = 0
+   queue: str = "default"
+   timeout: Optional[float] = None # seconds since start, None -> no deadline
+   version: int = 0 # change sequence of the job store (set on every save)
    
@@ -0,0 +1,72 @@
+"""
+Router de diagnóstico de performance del orquestador
+"""
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+from config import settings
+from services.perf import perf_recorder
+
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+class PerfToggleRequest(BaseModel):
+    """Activar/desactivar la instrumentación en caliente"""
+    enabled: Optional[bool] = None  # None -> no cambia
+    reset: bool = False  # descartar lo medido hasta ahora
+
+
+@router.get("/perf")
+def get_perf() -> Dict:
+    """
+    Estado de la instrumentación
+
+    - **routes**: latencia por ruta (hasta el inicio de la respuesta)
+    - **event_loop_lag**: atraso del event loop
+    - **job_monitor**: duración y jitter del tick, waits del lock
+    - **threads**, **open_fds**: del proceso del orquestador
+
+    Las latencias y el lag solo se registran mientras `enabled` es true.
+    """
+    return perf_recorder.snapshot()
+
+
+@router.post("/perf")
+def set_perf(request: PerfToggleRequest) -> Dict:
+    """Activa/desactiva la instrumentación sin reiniciar (y opcionalmente la reinicia)"""
+    if request.enabled is not None:
+        perf_recorder.set_enabled(request.enabled)
+    if request.reset:
+        perf_recorder.reset()
+    return perf_recorder.snapshot()
+
+
+@router.get("/perf/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(5.0, gt=0, description="Duración del muestreo"),
+    hz: int = Query(100, ge=1, le=1000, description="Muestras por segundo")
+):
+    """
+    Perfil por muestreo de todos los threads durante `seconds`
+
+    Devuelve el formato colapsado (`thread;func (file:line);... count`) que
+    aceptan flamegraph.pl, speedscope e inferno. Requiere la instrumentación
+    activa (POST /debug/perf) y corre un perfil a la vez.
+    """
+    if not perf_recorder.enabled:
+        raise HTTPException(status_code=409, detail="Instrumentation is disabled (POST /debug/perf)")
+    if seconds > settings.perf_max_profile_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be <= {settings.perf_max_profile_seconds}"
+        )
+
+    profile = await asyncio.to_thread(perf_recorder.profile, seconds, hz)
+    if profile is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(profile)
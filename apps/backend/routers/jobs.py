@@ -1,17 +1,31 @@
 """
 Router para gestión de jobs (procesos)
 """
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+import asyncio
+import base64
+import signal
+import time
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Set
 from datetime import datetime
 
+from config import settings
+from core.deadline_scheduler import DeadlineScheduler
 from core.process_manager import ProcessManager
 from core.job_monitor import JobMonitorManager
+from core.scheduler import JobScheduler, QueuedJob, QueueFullError
 from models.job_model import Job
 from utils.id_generator import generate_job_id
-from utils.validators import validate_command, validate_job_id
+from utils.validators import validate_command, validate_commands, validate_job_id
 from services.logger import job_logger
+from services.metrics_collector import metrics_collector
+from services.event_stream import event_broadcaster
+from services.job_store import SORTABLE, job_store
+from services.prometheus import prometheus_exporter
+from utils.etag import make_etag, not_modified
+from utils.fast_json import dumps, loads
 
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
@@ -19,47 +33,275 @@ router = APIRouter(prefix="/jobs", tags=["jobs"])
 # Estos se inyectarán desde main.py
 process_manager: Optional[ProcessManager] = None
 job_monitor: Optional[JobMonitorManager] = None
+scheduler: Optional[JobScheduler] = None
+deadlines: Optional[DeadlineScheduler] = None
+
+# Event loop de la aplicación: los avisos de salida se procesan ahí
+loop: Optional[asyncio.AbstractEventLoop] = None
 
-# Almacenamiento en memoria de jobs (job_id -> Job)
+# Jobs activos en memoria (job_id -> Job, en cola o corriendo); el historial completo vive en job_store
 jobs_db: Dict[str, Job] = {}
 
+# PID -> job_id de los jobs corriendo (quien lo quita primero, stop o salida, cierra el job)
+active_pids: Dict[int, str] = {}
+
+# PIDs que stop_job está deteniendo: el aviso de salida no los cierra (lo hace stop_job)
+stopping_pids: Set[int] = set()
+
+# Jobs con el deadline vencido (ya recibieron SIGTERM): siguen "running" hasta
+# que el proceso termina, y ahí quedan como "timeout"
+timed_out: Set[str] = set()
+
 
 class CreateJobRequest(BaseModel):
     """Request para crear un nuevo job"""
     command: List[str]
     job_id: Optional[str] = None
+    priority: int = Field(default=0, ge=0, le=9, description="Prioridad (9 = más alta)")
+    queue: str = Field(default="default", pattern=r"^[A-Za-z0-9_-]{1,64}$", description="Cola de ejecución")
+    timeout: Optional[float] = Field(
+        default=None, ge=0,
+        description="Segundos máximos de ejecución (0 = sin límite, por defecto settings.job_timeout)"
+    )
 
 
 class CreateJobResponse(BaseModel):
     """Response al crear un job"""
     job_id: str
-    pid: int
+    pid: Optional[int] = None
     command: List[str]
     status: str
     message: str
 
 
+class BatchJobRequest(BaseModel):
+    """Request para crear varios jobs de una vez"""
+    jobs: List[CreateJobRequest] = Field(min_length=1, max_length=10000)
+
+
+class BatchJobResult(BaseModel):
+    """Resultado de un job del lote"""
+    job_id: Optional[str] = None
+    pid: Optional[int] = None
+    status: str  # estado del job (running, queued, failed, ...) o rejected
+    error: Optional[str] = None
+
+
+class BatchJobResponse(BaseModel):
+    """Response al crear un lote de jobs"""
+    accepted: int
+    rejected: int
+    results: List[BatchJobResult]
+    elapsed_seconds: float
+
+
 class JobStatus(BaseModel):
     """Estado detallado de un job"""
     job_id: str
-    pid: int
+    pid: Optional[int] = None
     command: List[str]
     status: str
+    priority: int = 0
+    queue: str = "default"
+    timeout: Optional[float] = None
     created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    exit_code: Optional[int] = None
+    version: int = 0
     metrics: Optional[Dict] = None
 
 
+class KillJobsRequest(BaseModel):
+    """Request para detener varios jobs"""
+    job_ids: List[str] = Field(min_length=1, max_length=10000)
+
+
+class KillJobsResponse(BaseModel):
+    """Resultado de detener varios jobs"""
+    stopped: List[str] = []
+    not_found: List[str] = []
+    errors: Dict[str, str] = {}
+    elapsed_seconds: float
+
+
 class JobListResponse(BaseModel):
     """Lista de jobs"""
-    total: int
+    total: Optional[int] = None
     jobs: List[JobStatus]
+    next_cursor: Optional[str] = None  # pasar como `cursor` para la página siguiente
+    version: int  # pasar como `since` para recibir solo los cambios posteriores
+    has_more: bool = False  # (modo `since`) quedan cambios: volver a pedir con `version`
+    removed: Optional[List[str]] = None  # (modo `since`) jobs cambiados que ya no cumplen los filtros
+
 
+# Campos de JobStatus que se guardan como timestamp y se devuelven en ISO
+_TIME_FIELDS = ("created_at", "started_at", "finished_at")
 
-def init_router(pm: ProcessManager, jm: JobMonitorManager):
-    """Inicializa el router con las dependencias necesarias"""
-    global process_manager, job_monitor
+
+def init_router(pm: ProcessManager, jm: JobMonitorManager, sched: JobScheduler, dl: DeadlineScheduler):
+    """Inicializa el router con las dependencias necesarias (desde el event loop)"""
+    global process_manager, job_monitor, scheduler, deadlines, loop
     process_manager = pm
     job_monitor = jm
+    scheduler = sched
+    deadlines = dl
+    loop = asyncio.get_running_loop()
+    scheduler.bind(launch=_launch, on_error=_on_launch_error)
+    process_manager.add_exit_listener(_exit_notified)
+    job_monitor.add_exit_listener(_exit_notified)  # respaldo si no hay pidfd
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+def _job_status(job: Job) -> JobStatus:
+    """Construye el JobStatus de un job (con métricas si está activo)"""
+    return JobStatus(
+        job_id=job.job_id,
+        pid=job.pid,
+        command=job.command,
+        status=job.status,
+        priority=job.priority,
+        queue=job.queue,
+        timeout=job.timeout,
+        created_at=_iso(job.created_at),
+        started_at=_iso(job.started_at),
+        finished_at=_iso(job.finished_at),
+        exit_code=job.exit_code,
+        version=job.version,
+        metrics=job_monitor.get_stats(job.pid) if job.job_id in jobs_db and job.pid else None
+    )
+
+
+def jobs_by_pid() -> Dict[int, str]:
+    """Mapa PID -> job_id de los jobs corriendo"""
+    return active_pids
+
+
+def _launch(entry: QueuedJob):
+    """Lanza un job despachado por el scheduler (desde un thread de despacho, nunca en el event loop)"""
+    job = jobs_db[entry.job_id]
+    spawn_start = time.perf_counter()
+    pid = process_manager.start_job(job.command, job_id=job.job_id)
+    prometheus_exporter.job_started(time.perf_counter() - spawn_start)
+    
+    job.pid = pid
+    job.status = "running"
+    job.started_at = time.time()
+    job_store.save(job)
+    if job.timeout:
+        deadlines.add(job.job_id, job.timeout)
+    
+    # Log del inicio
+    job_logger.log_job_start(job.job_id, job.command, pid)
+    event_broadcaster.publish("job", {"event": "started", **job.model_dump()})
+    
+    # El PID se registra antes de observar la salida (monitor o reaper): cualquier
+    # aviso encuentra el job; si ya terminó, se cierra de inmediato
+    active_pids[pid] = job.job_id
+    job_monitor.start_monitoring(pid)
+    process_manager.watch_exit(pid)
+
+
+def signal_job(job_id: str, sig: int) -> bool:
+    """
+    Envía una señal al job cuyo deadline venció (llamado desde el thread de deadlines)
+    
+    Returns:
+        False si el job ya no está corriendo
+    """
+    job = jobs_db.get(job_id)
+    if job is None or job.pid is None or not process_manager.send_signal(job.pid, sig):
+        return False
+    
+    if sig == signal.SIGTERM:
+        # sigue "running" (el proceso vive hasta que sale o hasta el SIGKILL); la
+        # salida lo cierra como "timeout"
+        timed_out.add(job_id)
+        job_logger.log_job_error(job_id, f"Timeout de {job.timeout}s alcanzado, terminando proceso")
+        event_broadcaster.publish("job", {"event": "timeout", **job.model_dump()})
+    return True
+
+
+def _on_launch_error(entry: QueuedJob, error: Exception):
+    """El proceso no pudo lanzarse: el job queda como 'failed'"""
+    job_logger.log_job_error(entry.job_id, str(error))
+    prometheus_exporter.launch_error()
+    job = jobs_db.pop(entry.job_id, None)
+    if job is None:
+        return
+    job.status = "failed"
+    job.finished_at = time.time()
+    job_store.save(job)
+    event_broadcaster.publish("job", {"event": "failed", **job.model_dump()})
+
+
+def _exit_notified(pid: int):
+    """
+    Aviso de salida desde el thread del reaper (o del monitor): solo lo pasa al
+    event loop, así el thread vuelve enseguida a observar los demás procesos
+    """
+    try:
+        loop.call_soon_threadsafe(_on_process_exit, pid)
+    except RuntimeError:
+        pass  # el loop se cerró (shutdown)
+
+
+def _release_slot(job_id: str):
+    """
+    Libera el slot de un job que terminó (en el event loop); el siguiente en
+    cola se lanza desde un thread: Popen no corre en el loop
+    """
+    if scheduler.release(job_id, dispatch=False):
+        loop.run_in_executor(None, scheduler.dispatch)
+
+
+def _on_process_exit(pid: int):
+    """
+    El proceso terminó (en el event loop, vía _exit_notified o desde stop_job):
+    se registra el exit code, se cierra el job y se libera su slot
+    """
+    if pid in stopping_pids:
+        return  # stop_job confirma la salida y cierra el job
+    job_id = active_pids.pop(pid, None)
+    if job_id is None:
+        return  # ya lo cerró stop_job
+    
+    exit_code = process_manager.reap(pid)
+    if exit_code is None:
+        # Sigue vivo (p. ej. detenido con SIGSTOP): conserva su slot hasta que se detenga
+        active_pids[pid] = job_id
+        return
+    
+    deadlines.cancel(job_id)
+    job_monitor.stop_monitoring(pid)
+    metrics_collector.cleanup_process_history(pid)
+    job_logger.log_job_end(job_id, pid, exit_code)
+    job_logger.close_job_log(job_id)
+    job = jobs_db.pop(job_id, None)
+    if job is not None:
+        if job_id in timed_out:
+            job.status = "timeout"
+        else:
+            job.status = "exited" if exit_code == 0 else "failed"
+        job.exit_code = exit_code
+        job.finished_at = time.time()
+        job_store.save(job)
+        prometheus_exporter.job_finished(job.status)
+        event_broadcaster.publish("job", {"event": job.status, **job.model_dump()})
+    timed_out.discard(job_id)
+    _release_slot(job_id)
+
+
+def active_jobs_snapshot() -> List[Dict]:
+    """Jobs activos con sus métricas actuales (snapshot inicial del stream)"""
+    # copia: los threads de despacho (y los avisos de salida) agregan y quitan jobs mientras tanto
+    return [
+        {**job.model_dump(), "metrics": job_monitor.get_stats(job.pid)}
+        for job in list(jobs_db.values())
+    ]
 
 
 @router.post("/", response_model=CreateJobResponse, status_code=status.HTTP_201_CREATED)
@@ -87,62 +329,254 @@ async def create_job(request: CreateJobRequest):
     if job_id in jobs_db:
         raise HTTPException(status_code=400, detail=f"Job {job_id} ya existe")
     
+    # Registrar el job en cola; el scheduler lo lanza si hay un slot libre
+    timeout = request.timeout if request.timeout is not None else settings.job_timeout
+    job = Job(
+        job_id=job_id,
+        command=request.command,
+        status="queued",
+        priority=request.priority,
+        queue=request.queue,
+        timeout=timeout or None
+    )
+    jobs_db[job_id] = job
+    
     try:
-        # Lanzar proceso
-        pid = process_manager.start_job(request.command)
+        scheduler.submit(job_id, priority=request.priority, queue=request.queue, dispatch=False)
+    except QueueFullError as e:
+        del jobs_db[job_id]
+        raise HTTPException(status_code=429, detail=str(e))
+    # Popen desde un thread: un spawn lento no frena al resto de los requests
+    await asyncio.to_thread(scheduler.dispatch)
+    
+    if job.status == "failed" and job.pid is None:
+        raise HTTPException(status_code=500, detail=f"Error al iniciar job {job_id}")
+    
+    if job.status == "queued":
+        job_store.save(job)
+        event_broadcaster.publish("job", {"event": "queued", **job.model_dump()})
+        message = f"Job {job_id} encolado (posición {scheduler.depth()})"
+    else:
+        message = f"Job {job_id} iniciado exitosamente"
+    
+    return CreateJobResponse(
+        job_id=job_id,
+        pid=job.pid,
+        command=request.command,
+        status=job.status,
+        message=message
+    )
+
+
+@router.post("/batch", response_model=BatchJobResponse, status_code=status.HTTP_201_CREATED)
+async def create_jobs_batch(request: BatchJobRequest):
+    """
+    Lanza varios jobs en un solo request
+    
+    Los comandos se validan juntos (cada ejecutable se busca en el PATH una vez),
+    los jobs entran al scheduler en un solo paso y los que tienen slot se lanzan
+    en paralelo desde `spawn_concurrency` threads. El resultado es por job
+    (en el mismo orden): un job inválido no rechaza al resto.
+    """
+    start = time.perf_counter()
+    specs = request.jobs
+    validations = validate_commands([spec.command for spec in specs])
+    
+    results: List[BatchJobResult] = []
+    accepted: List[Job] = []
+    seen = set()
+    for spec, (is_valid, msg) in zip(specs, validations):
+        job_id = spec.job_id or generate_job_id()
+        if is_valid:
+            is_valid, msg = validate_job_id(job_id)
+        if is_valid and (job_id in jobs_db or job_id in seen):
+            is_valid, msg = False, f"Job {job_id} ya existe"
         
-        # Crear registro del job
+        if not is_valid:
+            results.append(BatchJobResult(job_id=job_id, status="rejected", error=msg))
+            continue
+        
+        seen.add(job_id)
+        timeout = spec.timeout if spec.timeout is not None else settings.job_timeout
         job = Job(
             job_id=job_id,
-            pid=pid,
-            command=request.command,
-            status="running"
+            command=spec.command,
+            status="queued",
+            priority=spec.priority,
+            queue=spec.queue,
+            timeout=timeout or None
         )
         jobs_db[job_id] = job
-        
-        # Iniciar monitoreo
-        job_monitor.start_monitoring(pid)
-        
-        # Log del inicio
-        job_logger.log_job_start(job_id, request.command, pid)
-        
-        return CreateJobResponse(
-            job_id=job_id,
-            pid=pid,
-            command=request.command,
-            status="running",
-            message=f"Job {job_id} iniciado exitosamente"
-        )
-        
-    except Exception as e:
-        job_logger.log_job_error(job_id, str(e))
-        raise HTTPException(status_code=500, detail=f"Error al iniciar job: {str(e)}")
+        accepted.append(job)
+        results.append(None)  # se completa después del despacho
+    
+    # Encolar todo con una sola toma del lock; lo que no entra en la cola se rechaza
+    count = scheduler.submit_many([(job.job_id, job.priority, job.queue) for job in accepted])
+    for job in accepted[count:]:
+        del jobs_db[job.job_id]
+        job.status = "rejected"
+    
+    # Lanzar en paralelo: cada thread toma el siguiente job con slot libre
+    workers = min(settings.spawn_concurrency, count)
+    if workers:
+        await asyncio.gather(*(asyncio.to_thread(scheduler.dispatch) for _ in range(workers)))
+    
+    jobs_iter = iter(accepted)
+    for i, result in enumerate(results):
+        if result is not None:
+            continue
+        job = next(jobs_iter)
+        if job.status == "queued":
+            job_store.save(job)
+            event_broadcaster.publish("job", {"event": "queued", **job.model_dump()})
+        error = None
+        if job.status == "rejected":
+            error = f"Run queue is full ({scheduler.max_queued} jobs)"
+        elif job.status == "failed" and job.pid is None:
+            error = f"Error al iniciar job {job.job_id}"
+        results[i] = BatchJobResult(job_id=job.job_id, pid=job.pid, status=job.status, error=error)
+    
+    rejected = sum(1 for result in results if result.status == "rejected")
+    return BatchJobResponse(
+        accepted=len(results) - rejected,
+        rejected=rejected,
+        results=results,
+        elapsed_seconds=time.perf_counter() - start
+    )
+
+
+@router.get("/queue")
+async def queue_stats():
+    """
+    Estado del scheduler: jobs corriendo y en cola (total y por cola)
+    y tiempos de espera recientes (segundos)
+    """
+    return scheduler.stats()
+
+
+def _encode_cursor(sort_value, job_id: str) -> str:
+    return base64.urlsafe_b64encode(dumps([sort_value, job_id])).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        sort_value, job_id = loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return sort_value, job_id
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
 
 
 @router.get("/", response_model=JobListResponse)
-async def list_jobs():
+async def list_jobs(
+    request: Request,
+    status: Optional[str] = Query(default=None, description="Filtrar por estado (varios separados por coma)"),
+    command_prefix: Optional[str] = Query(default=None, description="Comando (unido por espacios) que empieza con"),
+    created_after: Optional[float] = Query(default=None, description="Creados desde (unix timestamp)"),
+    created_before: Optional[float] = Query(default=None, description="Creados antes de (unix timestamp)"),
+    sort: str = Query(default="-created_at", pattern=f"^-?({'|'.join(SORTABLE)})$", description="Orden (- = descendente)"),
+    fields: Optional[str] = Query(default=None, description="Campos a incluir (separados por coma)"),
+    cursor: Optional[str] = Query(default=None, description="Cursor de la página siguiente (next_cursor)"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Máximo de jobs"),
+    offset: int = Query(default=0, ge=0, description="Jobs a saltar (sin cursor)"),
+    include_total: bool = Query(default=True, description="Calcular el total (recorre los jobs filtrados)"),
+    since: Optional[int] = Query(default=None, ge=0, description="Solo jobs creados o modificados después de esta versión")
+):
     """
-    Lista todos los jobs activos
+    Lista jobs (activos e históricos, más recientes primero)
+    
+    - **status**: Filtrar por estado (running, queued, exited, failed, stopped, ...)
+    - **command_prefix** / **created_after** / **created_before**: Filtros
+    - **sort**: created_at, priority o job_id (prefijo `-` para descendente)
+    - **fields**: Proyección, p. ej. `job_id,status,exit_code` (`metrics` solo si se pide o sin `fields`)
+    - **cursor** / **limit**: Paginación por cursor (`offset` se mantiene por compatibilidad)
+    - **since**: Solo los cambios (altas y actualizaciones, en orden) desde una `version` anterior;
+      con filtros, `removed` lista los jobs cambiados que dejaron de cumplirlos
+    
+    El costo depende del tamaño de la página: se leen solo las columnas pedidas
+    y la respuesta se serializa directo a JSON (sin un modelo por job).
+    Responde 304 si el `If-None-Match` coincide con el ETag (versión del store,
+    más el tick del monitor si la página incluye métricas de jobs corriendo).
     """
-    jobs_list = []
+    requested = _split(fields) or list(JobStatus.model_fields)
+    unknown = [field for field in requested if field not in JobStatus.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(unknown)}")
     
-    for job_id, job in jobs_db.items():
-        # Obtener métricas actuales
-        metrics = job_monitor.get_stats(job.pid)
-        
-        jobs_list.append(JobStatus(
-            job_id=job_id,
-            pid=job.pid,
-            command=job.command,
-            status=job.status,
-            created_at=datetime.now().isoformat(),  # TODO: guardar timestamp real
-            metrics=metrics
-        ))
-    
-    return JobListResponse(
-        total=len(jobs_list),
-        jobs=jobs_list
-    )
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    filters = {
+        "statuses": _split(status),
+        "command_prefix": command_prefix,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
+    with_metrics = "metrics" in requested
+    columns = [field for field in requested if field != "metrics"]
+    if with_metrics:
+        columns.append("pid")
+    
+    # Versión leída antes de consultar: todo lo escrito hasta ella ya está en la respuesta
+    version = job_store.version
+    removed = None
+    if since is not None:
+        sort = "version"
+        rows = await asyncio.to_thread(job_store.changes, columns, since, limit=limit + 1, **filters)
+    else:
+        rows = await asyncio.to_thread(
+            job_store.page,
+            columns,
+            sort=sort,
+            descending=descending,
+            after=_decode_cursor(cursor) if cursor else None,
+            limit=limit + 1,  # uno de más para saber si hay página siguiente
+            offset=0 if cursor else offset,
+            **filters
+        )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if since is not None:
+        if rows:
+            version = rows[-1]["version"] if has_more else max(version, rows[-1]["version"])
+        removed = [row["job_id"] for row in rows if not row["matches"]]
+        rows = [row for row in rows if row["matches"]]
+    
+    # Las métricas solo cambian el contenido si hay jobs corriendo en la página
+    live = with_metrics and any(row["job_id"] in jobs_db and row["pid"] for row in rows)
+    etag = make_etag(version, job_monitor.tick) if live else make_etag(version)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    
+    stats = job_monitor.get_all_stats() if with_metrics else {}
+    jobs = []
+    for row in rows:
+        item = {}
+        for field in requested:
+            if field in _TIME_FIELDS:
+                item[field] = _iso(row[field])
+            elif field == "metrics":
+                item[field] = stats.get(row["pid"]) if row["job_id"] in jobs_db else None
+            else:
+                item[field] = row[field]
+        jobs.append(item)
+    
+    total = None
+    if include_total and since is None:
+        total = await asyncio.to_thread(job_store.count, **filters)
+    last = rows[-1] if rows else None
+    body = {
+        "total": total,
+        "jobs": jobs,
+        "next_cursor": _encode_cursor(last[sort], last["job_id"]) if has_more and since is None else None,
+        "version": version,
+        "has_more": has_more,
+        "removed": removed,
+    }
+    return Response(content=dumps(body), media_type="application/json", headers={"ETag": etag})
 
 
 @router.get("/{job_id}", response_model=JobStatus)
@@ -150,20 +584,40 @@ async def get_job(job_id: str):
     """
     Obtiene información detallada de un job específico
     """
-    if job_id not in jobs_db:
+    job = jobs_db.get(job_id)
+    if job is None:
+        # historial: SQLite (y el lock de la conexión, que un flush puede tener tomado)
+        job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
     
-    job = jobs_db[job_id]
-    metrics = job_monitor.get_stats(job.pid)
+    return _job_status(job)
+
+
+@router.post("/kill", response_model=KillJobsResponse)
+async def kill_jobs(request: KillJobsRequest):
+    """
+    Detiene varios jobs a la vez
     
-    return JobStatus(
-        job_id=job_id,
-        pid=job.pid,
-        command=job.command,
-        status=job.status,
-        created_at=datetime.now().isoformat(),
-        metrics=metrics
-    )
+    Las terminaciones corren en paralelo: el tiempo total está acotado por el
+    período de gracia (`kill_grace_period`), no por la cantidad de jobs.
+    
+    - **job_ids**: IDs de los jobs a detener
+    """
+    start = time.perf_counter()
+    job_ids = list(dict.fromkeys(request.job_ids))
+    results = await asyncio.gather(*(stop_job(job_id) for job_id in job_ids), return_exceptions=True)
+    
+    response = KillJobsResponse(elapsed_seconds=0.0)
+    for job_id, result in zip(job_ids, results):
+        if not isinstance(result, Exception):
+            response.stopped.append(job_id)
+        elif isinstance(result, HTTPException) and result.status_code == 404:
+            response.not_found.append(job_id)
+        else:
+            response.errors[job_id] = result.detail if isinstance(result, HTTPException) else str(result)
+    response.elapsed_seconds = time.perf_counter() - start
+    return response
 
 
 @router.delete("/{job_id}")
@@ -176,34 +630,74 @@ async def stop_job(job_id: str):
     
     job = jobs_db[job_id]
     
-    try:
-        # Detener el proceso
-        success = process_manager.stop_job(job.pid)
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="No se pudo detener el proceso")
-        
-        # Detener monitoreo
-        job_monitor.stop_monitoring(job.pid)
-        
-        # Log del fin
-        job_logger.log_job_end(job_id, job.pid)
-        
-        # Actualizar estado
-        job.status = "stopped"
-        
-        # Eliminar del registro
+    # En cola: se cancela sin llegar a lanzarse
+    if job.status == "queued" and scheduler.cancel(job_id):
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        job_store.save(job)
+        prometheus_exporter.job_finished(job.status)
+        event_broadcaster.publish("job", {"event": "cancelled", **job.model_dump()})
         del jobs_db[job_id]
-        
         return {
-            "message": f"Job {job_id} detenido exitosamente",
+            "message": f"Job {job_id} cancelado",
             "job_id": job_id,
-            "pid": job.pid
+            "pid": None
         }
-        
+    
+    pid = job.pid
+    if pid not in active_pids or pid in stopping_pids:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} está iniciando o finalizando")
+    
+    # Detener el proceso (SIGTERM, espera sin bloquear el loop, SIGKILL tras el período de gracia);
+    # el job sigue registrado (slot, deadline, PID) hasta confirmar la salida
+    stopping_pids.add(pid)
+    error = "No se pudo detener el proceso"
+    try:
+        exit_code = await process_manager.stop_job(pid, grace=settings.kill_grace_period)
     except Exception as e:
-        job_logger.log_job_error(job_id, str(e))
-        raise HTTPException(status_code=500, detail=f"Error al detener job: {str(e)}")
+        exit_code, error = None, f"Error al detener job: {str(e)}"
+    finally:
+        stopping_pids.discard(pid)
+    
+    if exit_code is None:
+        # Por si terminó mientras tanto (su aviso de salida se ignoró): lo cierra como una salida normal
+        _on_process_exit(pid)
+        if pid not in active_pids:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} terminó antes de detenerse")
+        job_logger.log_job_error(job_id, error)
+        raise HTTPException(status_code=500, detail=error)
+    
+    if active_pids.pop(pid, None) is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} está iniciando o finalizando")
+    
+    # Detener monitoreo
+    job_monitor.stop_monitoring(pid)
+    metrics_collector.cleanup_process_history(pid)
+    
+    # Log del fin
+    job_logger.log_job_end(job_id, pid, exit_code)
+    job_logger.close_job_log(job_id)
+    
+    # Actualizar estado
+    job.status = "stopped"
+    job.exit_code = exit_code
+    job.finished_at = time.time()
+    job_store.save(job)
+    prometheus_exporter.job_finished(job.status)
+    event_broadcaster.publish("job", {"event": "stopped", **job.model_dump()})
+    
+    # Eliminar de los jobs activos (queda en el historial) y liberar el slot:
+    # el scheduler lanza el siguiente job en cola
+    del jobs_db[job_id]
+    timed_out.discard(job_id)
+    deadlines.cancel(job_id)
+    _release_slot(job_id)
+    
+    return {
+        "message": f"Job {job_id} detenido exitosamente",
+        "job_id": job_id,
+        "pid": pid
+    }
 
 
 @router.post("/{job_id}/restart")
@@ -221,5 +715,7 @@ async def restart_job(job_id: str):
     await stop_job(job_id)
     
     # Relanzar con el mismo comando
-    request = CreateJobRequest(command=command, job_id=job_id)
+    request = CreateJobRequest(
+        command=command, job_id=job_id, priority=job.priority, queue=job.queue, timeout=job.timeout or 0
+    )
     return await create_job(request)
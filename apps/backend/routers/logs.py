@@ -1,11 +1,20 @@
 """
 Router para logs de jobs
 """
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import re
+from datetime import datetime
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 from services.logger import job_logger
+from services.log_reader import decode_cursor, encode_cursor
+from services.log_follower import LAGGED, log_follow_hub
+from utils.fast_json import dumps
+from utils.validators import validate_job_id
 
 
 router = APIRouter(prefix="/logs", tags=["logs"])
@@ -16,35 +25,157 @@ class LogResponse(BaseModel):
     job_id: str
     total_lines: int
     lines: List[str]
+    prev_cursor: Optional[str] = None  # pasar como `before` para la página anterior
+    next_cursor: Optional[str] = None  # pasar como `after` para líneas nuevas
+    first_line: Optional[int] = None  # número de la primera línea (lecturas por línea/fecha)
+
+
+def _check_job_id(job_id: str):
+    """El job_id forma la ruta de sus logs: uno inválido (p. ej. con '/' o '..') no puede salir de log_dir"""
+    is_valid, msg = validate_job_id(job_id)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=msg)
+
+
+@router.get("/search")
+async def search_logs(
+    q: str = Query(..., min_length=1, description="Texto a buscar (o regex con regex=true)"),
+    job_id: Optional[str] = Query(default=None, description="Buscar solo en el log de este job"),
+    regex: bool = Query(default=False, description="Interpretar `q` como expresión regular"),
+    ignore_case: bool = Query(default=True, description="Ignorar mayúsculas/minúsculas"),
+    since: Optional[datetime] = Query(default=None, description="Solo líneas desde esta fecha (ISO o unix)"),
+    until: Optional[datetime] = Query(default=None, description="Solo líneas hasta esta fecha (ISO o unix)"),
+    limit: int = Query(default=100, ge=1, le=10000, description="Máximo de coincidencias")
+):
+    """
+    Busca en los logs de un job o de todos los jobs
+
+    La respuesta es NDJSON: una línea por coincidencia
+    (`job_id`, `offset`, `cursor`, `timestamp`, `line`) a medida que se
+    encuentran, y al final un registro `summary` con lo que se recorrió.
+    `cursor` sirve como `after`/`before` en `GET /logs/{job_id}` para ver
+    el contexto de la coincidencia.
+
+    Cada bloque de ~64 KB de log tiene un índice de trigramas: solo se leen
+    los bloques que pueden contener `q` (y que caen en `since`/`until`).
+    """
+    if job_id is not None:
+        _check_job_id(job_id)
+    since_ts = since.timestamp() if since is not None else None
+    until_ts = until.timestamp() if until is not None else None
+    stats: dict = {}
+    try:
+        matches = await asyncio.to_thread(
+            job_logger.search_logs,
+            q,
+            job_id=job_id,
+            regex=regex,
+            ignore_case=ignore_case,
+            since=since_ts,
+            until=until_ts,
+            limit=limit,
+            stats=stats
+        )
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Regex inválida: {e}")
+
+    def results():
+        # generador sincrónico: Starlette lo itera en el threadpool (lee disco)
+        found = 0
+        for match in matches:
+            found += 1
+            match["cursor"] = encode_cursor(match["offset"])
+            if match["timestamp"] is not None:
+                match["timestamp"] = datetime.fromtimestamp(match["timestamp"]).isoformat()
+            yield dumps(match) + b"\n"
+        yield dumps({"summary": {"matches": found, "truncated": found >= limit, **stats}}) + b"\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
 @router.get("/{job_id}", response_model=LogResponse)
 async def get_job_logs(
     job_id: str,
-    lines: int = Query(default=100, ge=1, le=10000, description="Número de líneas a obtener")
+    lines: int = Query(default=100, ge=1, le=10000, description="Número de líneas a obtener"),
+    before: Optional[str] = Query(default=None, description="Cursor: líneas anteriores a esta posición"),
+    after: Optional[str] = Query(default=None, description="Cursor: líneas posteriores a esta posición"),
+    from_line: Optional[int] = Query(default=None, ge=1, description="Primera línea (desde 1)"),
+    to_line: Optional[int] = Query(default=None, ge=1, description="Última línea (inclusive)"),
+    since: Optional[datetime] = Query(default=None, description="Líneas desde esta fecha (ISO o unix)"),
+    until: Optional[datetime] = Query(default=None, description="Líneas hasta esta fecha (ISO o unix)")
 ):
     """
     Obtiene los logs de un job específico
     
     - **job_id**: ID del job
-    - **lines**: Número de últimas líneas a retornar (1-10000)
+    - **lines**: Número de líneas a retornar (1-10000)
+    - **before**: Cursor (`prev_cursor`) para paginar hacia atrás
+    - **after**: Cursor (`next_cursor`) para paginar hacia adelante
+    - **from_line** / **to_line**: Rango de líneas (acotado a `lines`)
+    - **since** / **until**: Rango de fechas (acotado a `lines`)
+    
+    Sin cursores ni rangos retorna las últimas líneas del log. Los cursores
+    siguen siendo válidos después de una rotación: la lectura cruza los
+    segmentos comprimidos y el archivo vivo. Los rangos se ubican con el
+    índice de líneas/tiempo del log (búsqueda binaria) y la respuesta trae
+    `first_line` y cursores para seguir paginando desde ahí.
     """
+    _check_job_id(job_id)
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Usar solo uno de 'before' o 'after'")
+    by_line = from_line is not None or to_line is not None
+    by_time = since is not None or until is not None
+    if (by_line or by_time) and (before is not None or after is not None):
+        raise HTTPException(status_code=400, detail="Los rangos de líneas/fechas no se combinan con cursores")
+    if by_line and by_time:
+        raise HTTPException(status_code=400, detail="Usar un rango de líneas o de fechas, no ambos")
+    if from_line is not None and to_line is not None and from_line > to_line:
+        raise HTTPException(status_code=400, detail="'from_line' debe ser <= 'to_line'")
+    since_ts = since.timestamp() if since is not None else None
+    until_ts = until.timestamp() if until is not None else None
+    if since_ts is not None and until_ts is not None and since_ts > until_ts:
+        raise HTTPException(status_code=400, detail="'since' debe ser <= 'until'")
+    
+    try:
+        before_offset = decode_cursor(before) if before is not None else None
+        after_offset = decode_cursor(after) if after is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
-        log_lines = job_logger.get_job_logs(job_id, lines=lines)
+        if by_line or by_time:
+            result = await asyncio.to_thread(
+                job_logger.read_job_log_range,
+                job_id,
+                lines=lines,
+                from_line=from_line,
+                to_line=to_line,
+                since=since_ts,
+                until=until_ts
+            )
+        else:
+            result = await asyncio.to_thread(
+                job_logger.read_job_logs,
+                job_id,
+                lines=lines,
+                before=before_offset,
+                after=after_offset
+            )
         
-        if not log_lines:
+        paging = before is not None or after is not None or by_line or by_time
+        if result is None or (not result["lines"] and not paging):
             raise HTTPException(
                 status_code=404,
                 detail=f"No se encontraron logs para el job {job_id}"
             )
         
-        # Limpiar saltos de línea
-        cleaned_lines = [line.rstrip('\n') for line in log_lines]
-        
         return LogResponse(
             job_id=job_id,
-            total_lines=len(cleaned_lines),
-            lines=cleaned_lines
+            total_lines=len(result["lines"]),
+            lines=result["lines"],
+            prev_cursor=encode_cursor(result["start"]) if result["start"] > result["first"] else None,
+            next_cursor=encode_cursor(result["end"]),
+            first_line=result.get("first_line")
         )
         
     except HTTPException:
@@ -56,35 +187,90 @@ async def get_job_logs(
         )
 
 
-@router.delete("/{job_id}")
-async def delete_job_logs(job_id: str):
+@router.get("/{job_id}/follow")
+async def follow_job_logs(
+    job_id: str,
+    after: Optional[str] = Query(default=None, description="Cursor desde el que seguir (por defecto, el final)"),
+    last_event_id: Optional[str] = Header(default=None)
+):
     """
-    Elimina los logs de un job específico
+    Sigue el log de un job en vivo (Server-Sent Events)
     
     - **job_id**: ID del job
-    """
-    from pathlib import Path
-    from config import settings
+    - **after**: Cursor (`next_cursor` de `GET /logs/{job_id}`) desde el que seguir
     
-    log_file = Path(settings.log_dir) / f"{job_id}.log"
+    Cada evento `log` trae las líneas nuevas en `data` y su cursor en `id`,
+    así el cliente puede reconectarse con `Last-Event-ID` sin perder líneas.
+    Si `after` queda muy atrás, o parte del rango ya se borró por cuota o
+    retención, un evento `skipped` indica cuántos bytes se omitieron y el
+    cursor (`after`) para leerlos con `GET /logs/{job_id}`.
+    """
+    _check_job_id(job_id)
+    cursor = after or last_event_id
+    try:
+        offset = decode_cursor(cursor) if cursor is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if not log_file.exists():
+    await asyncio.to_thread(job_logger.flush)  # que el archivo refleje lo registrado hasta ahora
+    try:
+        queue, catch_up = await log_follow_hub.subscribe(job_id, offset)
+    except FileNotFoundError:
         raise HTTPException(
             status_code=404,
             detail=f"No se encontraron logs para el job {job_id}"
         )
     
+    async def event_stream():
+        try:
+            for payload in catch_up:
+                yield payload
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if payload is LAGGED:
+                    yield b"event: lagged\ndata: reconectar con Last-Event-ID\n\n"
+                    return
+                yield payload
+        finally:
+            log_follow_hub.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/{job_id}")
+async def delete_job_logs(job_id: str):
+    """
+    Elimina los logs de un job específico
+    
+    - **job_id**: ID del job
+    """
+    _check_job_id(job_id)
     try:
-        log_file.unlink()
-        return {
-            "message": f"Logs del job {job_id} eliminados exitosamente",
-            "job_id": job_id
-        }
+        deleted = await asyncio.to_thread(job_logger.delete_job_logs, job_id)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error al eliminar logs: {str(e)}"
         )
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No se encontraron logs para el job {job_id}"
+        )
+    
+    return {
+        "message": f"Logs del job {job_id} eliminados exitosamente",
+        "job_id": job_id
+    }
 
 
 @router.post("/cleanup")
@@ -97,7 +283,7 @@ async def cleanup_old_logs(
     - **days**: Días de retención (1-365)
     """
     try:
-        job_logger.cleanup_old_logs(days=days)
+        await asyncio.to_thread(job_logger.cleanup_old_logs, days=days)
         return {
             "message": f"Logs antiguos (>{days} días) eliminados exitosamente"
         }
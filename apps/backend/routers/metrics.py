@@ -1,18 +1,27 @@
 """
 Router para métricas del sistema
 """
-from fastapi import APIRouter, Query
+import asyncio
+
+from fastapi import APIRouter, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 
 from services.metrics_collector import metrics_collector
+from services.prometheus import CONTENT_TYPE, prometheus_exporter
 from core.system_monitor import SystemMonitor
+from core.job_monitor import JobMonitorManager
+from utils.etag import make_etag, not_modified
 
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 # Se inyectará desde main.py
 system_monitor: Optional[SystemMonitor] = None
+job_monitor: Optional[JobMonitorManager] = None
+
+# Resoluciones disponibles en el historial
+RESOLUTION_PATTERN = "^(raw|1s|10s|1m|10m)$"
 
 
 class SystemMetrics(BaseModel):
@@ -32,6 +41,9 @@ class DetailedSystemMetrics(BaseModel):
     memory: Dict
     disk: Dict
     network: Dict
+    resolution: Optional[str] = None  # solo en rollups: "10s", "1m", "10m"
+    min: Optional[Dict] = None
+    max: Optional[Dict] = None
 
 
 class ProcessMetrics(BaseModel):
@@ -46,12 +58,16 @@ class ProcessMetrics(BaseModel):
     num_threads: int
     create_time: float
     io: Optional[Dict] = None
+    resolution: Optional[str] = None  # solo en rollups: "10s", "1m", "10m"
+    min: Optional[Dict] = None
+    max: Optional[Dict] = None
 
 
-def init_router(sm: SystemMonitor):
+def init_router(sm: SystemMonitor, jm: Optional[JobMonitorManager] = None):
     """Inicializa el router con las dependencias necesarias"""
-    global system_monitor
+    global system_monitor, job_monitor
     system_monitor = sm
+    job_monitor = jm
 
 
 @router.get("/system", response_model=SystemMetrics)
@@ -71,21 +87,31 @@ async def get_detailed_system_metrics():
     - Memoria (total, usada, disponible)
     - Disco (total, usado, libre)
     - Red (bytes enviados/recibidos)
+    
+    Se sirve desde el último snapshot del sampler en background.
     """
-    metrics = metrics_collector.collect_system_metrics()
+    metrics = metrics_collector.get_latest_system_metrics()
     return DetailedSystemMetrics(**metrics)
 
 
 @router.get("/system/history", response_model=List[DetailedSystemMetrics])
 async def get_system_history(
-    minutes: int = Query(default=5, ge=1, le=60, description="Minutos de historial")
+    minutes: int = Query(default=5, ge=1, le=10080, description="Minutos de historial"),
+    resolution: Optional[str] = Query(default=None, pattern=RESOLUTION_PATTERN, description="Resolución"),
+    max_points: Optional[int] = Query(default=None, ge=1, le=10000, description="Máximo de puntos")
 ):
     """
     Obtiene historial de métricas del sistema
     
-    - **minutes**: Cantidad de minutos de historial (1-60)
+    - **minutes**: Cantidad de minutos de historial (1-10080, hasta 7 días)
+    - **resolution**: `raw`/`1s`, `10s`, `1m` o `10m` (por defecto se elige automáticamente)
+    - **max_points**: Máximo de puntos deseado; elige el rollup más fino que no lo supere
+    
+    Los rollups devuelven el promedio de cada bucket más `min`/`max`.
     """
-    history = metrics_collector.get_system_history(minutes=minutes)
+    history = metrics_collector.get_system_history(
+        minutes=minutes, resolution=resolution or "", max_points=max_points or 0
+    )
     return [DetailedSystemMetrics(**m) for m in history]
 
 
@@ -95,8 +121,13 @@ async def get_process_metrics(pid: int):
     Obtiene métricas de un proceso específico
     
     - **pid**: Process ID del proceso
+    
+    Los procesos de jobs se sirven desde el último tick del monitor; otros
+    PIDs se muestrean bajo demanda fuera del event loop.
     """
-    metrics = metrics_collector.collect_process_metrics(pid)
+    metrics = job_monitor.get_process_metrics(pid) if job_monitor is not None else None
+    if metrics is None:
+        metrics = await asyncio.to_thread(metrics_collector.collect_process_metrics, pid)
     
     if metrics is None:
         return {"error": f"Proceso {pid} no encontrado"}
@@ -110,23 +141,39 @@ async def get_process_metrics(pid: int):
 @router.get("/process/{pid}/history", response_model=List[ProcessMetrics])
 async def get_process_history(
     pid: int,
-    minutes: int = Query(default=5, ge=1, le=60, description="Minutos de historial")
+    minutes: int = Query(default=5, ge=1, le=10080, description="Minutos de historial"),
+    resolution: Optional[str] = Query(default=None, pattern=RESOLUTION_PATTERN, description="Resolución"),
+    max_points: Optional[int] = Query(default=None, ge=1, le=10000, description="Máximo de puntos")
 ):
     """
     Obtiene historial de métricas de un proceso
     
     - **pid**: Process ID del proceso
-    - **minutes**: Cantidad de minutos de historial (1-60)
+    - **minutes**: Cantidad de minutos de historial (1-10080, hasta 7 días)
+    - **resolution**: `raw`/`1s`, `10s`, `1m` o `10m` (por defecto se elige automáticamente)
+    - **max_points**: Máximo de puntos deseado; elige el rollup más fino que no lo supere
     """
-    history = metrics_collector.get_process_history(pid, minutes=minutes)
+    history = metrics_collector.get_process_history(
+        pid, minutes=minutes, resolution=resolution or "", max_points=max_points or 0
+    )
     return [ProcessMetrics(**m) for m in history]
 
 
 @router.get("/summary")
-async def get_metrics_summary():
+async def get_metrics_summary(request: Request, response: Response):
     """
     Obtiene un resumen general de métricas del sistema y procesos monitoreados
+    
+    Responde 304 si el `If-None-Match` coincide (no hubo una muestra nueva
+    ni cambió la lista de procesos desde la versión que tiene el cliente).
     """
+    if metrics_collector.latest_system is not None:  # con el sampler activo el resumen solo cambia por tick
+        etag = make_etag(metrics_collector.version)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        response.headers["ETag"] = etag
+    
     system_stats = system_monitor.get_system_stats()
     all_process_stats = metrics_collector.process_history
     
@@ -135,3 +182,14 @@ async def get_metrics_summary():
         "monitored_processes": len(all_process_stats),
         "process_pids": list(all_process_stats.keys())
     }
+
+
+@router.get("/prometheus")
+async def get_prometheus_metrics():
+    """
+    Métricas en formato de texto de Prometheus (sistema, jobs y contadores del orquestador)
+    
+    El texto se genera una vez por tick de los samplers y se sirve desde caché:
+    los scrapes no hacen llamadas a psutil.
+    """
+    return Response(content=prometheus_exporter.render(), media_type=CONTENT_TYPE)
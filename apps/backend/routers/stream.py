@@ -0,0 +1,88 @@
+"""
+Router para el stream en vivo del dashboard (Server-Sent Events)
+"""
+from typing import Dict, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from core.job_monitor import JobMonitorManager
+from core.system_monitor import SystemMonitor
+from services.event_stream import LAGGED, event_broadcaster, format_sse
+from services.metrics_collector import MetricsCollector
+from routers import jobs
+
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+# Se inyectarán desde main.py
+system_monitor: Optional[SystemMonitor] = None
+job_monitor: Optional[JobMonitorManager] = None
+
+
+def init_router(sm: SystemMonitor, jm: JobMonitorManager, mc: MetricsCollector):
+    """Inicializa el router y registra los publicadores de ticks en los samplers"""
+    global system_monitor, job_monitor
+    system_monitor = sm
+    job_monitor = jm
+    mc.add_listener(publish_system_tick)
+    jm.add_listener(publish_jobs_tick)
+
+
+def publish_system_tick(metrics: Dict):
+    """Tick del sampler de sistema -> evento `system` (mismo formato que /metrics/system)"""
+    if event_broadcaster.subscribers:
+        event_broadcaster.publish("system", system_monitor.get_system_stats(), tick=True)
+
+
+def publish_jobs_tick(batch: Dict[int, Dict]):
+    """Tick del monitor de jobs -> evento `jobs` con las métricas de cada job (job_id -> metrics)"""
+    if not event_broadcaster.subscribers:
+        return
+    pids = jobs.jobs_by_pid()
+    stats = job_monitor.get_all_stats()
+    event_broadcaster.publish(
+        "jobs",
+        {pids[pid]: metrics for pid, metrics in stats.items() if pid in pids},
+        tick=True
+    )
+
+
+@router.get("")
+async def dashboard_stream():
+    """
+    Stream en vivo para el dashboard (Server-Sent Events)
+    
+    Eventos:
+    - **snapshot**: estado inicial (sistema + jobs activos)
+    - **job**: ciclo de vida de un job (`event`: started, stopped, ...)
+    - **system**: tick de métricas del sistema
+    - **jobs**: tick de métricas de los jobs (job_id -> metrics)
+    
+    Los ticks que el cliente no alcanza a recibir se descartan (solo se envía el último).
+    """
+    subscriber = event_broadcaster.subscribe()
+    snapshot = format_sse("snapshot", {
+        "system": system_monitor.get_system_stats(),
+        "jobs": jobs.active_jobs_snapshot()
+    })
+    
+    async def event_stream():
+        try:
+            yield snapshot
+            while True:
+                batch = await subscriber.next_batch(timeout=15)
+                if batch is None:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield batch
+                if batch is LAGGED:
+                    return
+        finally:
+            event_broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,125 @@
+"""
+Difusión de eventos en vivo para el dashboard (ciclo de vida de jobs + ticks de métricas)
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+
+# Marca para desconectar a un suscriptor que no consume sus eventos
+LAGGED = b"event: lagged\ndata: {}\n\n"
+
+
+def format_sse(event: str, data) -> bytes:
+    """Serializa un evento SSE (una sola vez, se comparte entre suscriptores)"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    """
+    Cola de un cliente del stream.
+    - Eventos de ciclo de vida: en orden, acotados (si se llena, el cliente se desconecta)
+    - Ticks de métricas: un slot por tipo con el último valor; un tick no enviado
+      se reemplaza por el siguiente (se descartan ticks viejos, no se acumulan)
+    """
+
+    def __init__(self, max_events: int):
+        self.events: Deque[bytes] = deque()
+        self.ticks: Dict[str, bytes] = {}
+        self.max_events = max_events
+        self.lagged = False
+        self.ready = asyncio.Event()
+
+    def push_event(self, payload: bytes):
+        if len(self.events) >= self.max_events:
+            self.lagged = True
+        else:
+            self.events.append(payload)
+        self.ready.set()
+
+    def push_tick(self, kind: str, payload: bytes):
+        self.ticks[kind] = payload
+        self.ready.set()
+
+    async def next_batch(self, timeout: float) -> Optional[bytes]:
+        """
+        Espera y devuelve todo lo pendiente en un solo bloque
+        (None si se cumplió el timeout sin eventos)
+        """
+        if not self.events and not self.ticks and not self.lagged:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self.ready.clear()
+
+        if self.lagged:
+            return LAGGED
+        chunks = list(self.events)
+        chunks.extend(self.ticks.values())
+        self.events.clear()
+        self.ticks.clear()
+        return b"".join(chunks)
+
+
+class EventBroadcaster:
+    """
+    Publica eventos a todos los suscriptores del dashboard.
+    `publish` puede llamarse desde cualquier thread (samplers, router):
+    el payload se serializa una vez y el reparto ocurre en el event loop.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.max_events = max_events
+        self.subscribers: Set[Subscriber] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Asocia el broadcaster al event loop de la aplicación"""
+        self.loop = loop
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.max_events)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, data, tick: bool = False):
+        """
+        Publica un evento
+
+        Args:
+            event: Nombre del evento SSE ("job", "system", "jobs", ...)
+            data: Contenido serializable a JSON
+            tick: True para ticks de métricas (solo se conserva el último por tipo)
+        """
+        if not self.subscribers or self.loop is None or self.loop.is_closed():
+            return  # nadie escucha: ni siquiera se serializa
+
+        payload = format_sse(event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self.loop:
+            self._fanout(event, payload, tick)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._fanout, event, payload, tick)
+        except RuntimeError:
+            pass  # el loop se cerró (shutdown)
+
+    def _fanout(self, event: str, payload: bytes, tick: bool):
+        for subscriber in list(self.subscribers):
+            if tick:
+                subscriber.push_tick(event, payload)
+            else:
+                subscriber.push_event(payload)
+
+
+# Instancia global
+event_broadcaster = EventBroadcaster()
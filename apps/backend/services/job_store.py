@@ -0,0 +1,427 @@
+"""
+Almacenamiento persistente de jobs (SQLite en modo WAL)
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from models.job_model import Job
+from utils.fast_json import loads
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    pid         INTEGER,
+    command     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    exit_code   INTEGER,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    queue       TEXT NOT NULL DEFAULT 'default',
+    timeout     REAL,
+    command_line TEXT,
+    version     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_pid ON jobs(pid);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+"""
+
+# Índices sobre columnas agregadas por MIGRATIONS (se crean después de migrar)
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_command_line ON jobs(command_line);
+CREATE INDEX IF NOT EXISTS idx_jobs_priority ON jobs(priority, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_version ON jobs(version);
+"""
+
+COLUMNS = ["job_id", "pid", "command", "status", "created_at", "started_at",
+           "finished_at", "exit_code", "priority", "queue", "timeout", "version"]
+
+# Columnas agregadas después de la primera versión del esquema (bases existentes)
+MIGRATIONS = {
+    "started_at": "REAL",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "queue": "TEXT NOT NULL DEFAULT 'default'",
+    "timeout": "REAL",
+    "command_line": "TEXT",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Comando unido por espacios (filtro por prefijo con el índice); no es un campo de Job
+INSERT_COLUMNS = COLUMNS + ["command_line"]
+
+# Columnas por las que se puede ordenar (no nulas -> paginación por cursor)
+SORTABLE = ("created_at", "priority", "job_id", "version")
+
+# Estados que no sobreviven a un reinicio del orquestador
+ACTIVE_STATUSES = ("running", "queued")
+
+
+class JobStore:
+    """
+    Registro histórico de jobs en SQLite (WAL).
+
+    Las escrituras del ciclo de vida se encolan (coalesciendo por job_id) y un
+    thread las confirma en lote cada `flush_interval` segundos o al llegar a
+    `batch_size`. Las lecturas ven las escrituras pendientes: consultan lo
+    confirmado y le superponen el lote en memoria (sin forzar un flush).
+    
+    Cada escritura recibe un número de versión creciente (`version`): sirve
+    de ETag del listado y para pedir solo los jobs cambiados desde una versión.
+    """
+
+    def __init__(self, db_path: str = "", flush_interval: float = 0.05, batch_size: int = 500):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto desde config)
+            flush_interval: Segundos máximos que una escritura queda pendiente
+            batch_size: Escrituras pendientes que fuerzan un flush inmediato
+        """
+        self.db_path = db_path or settings.db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending: Dict[str, Job] = {}
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()         # conexión (lecturas y escrituras)
+        self.pending_lock = threading.Lock()  # cola de escrituras
+        self.has_pending = threading.Event()
+        self.batch_full = threading.Event()
+        self.running = False
+        self._writer: Optional[threading.Thread] = None
+        self.version = 0  # última versión asignada (se retoma de la base al abrirla)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # seguro en WAL, sin fsync por commit
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {ddl}")
+            if "command_line" not in existing:
+                rows = conn.execute("SELECT job_id, command FROM jobs").fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET command_line = ? WHERE job_id = ?",
+                    [(" ".join(json.loads(command)), job_id) for job_id, command in rows]
+                )
+            conn.executescript(INDEXES)
+            conn.commit()
+            self.version = max(self.version, conn.execute("SELECT MAX(version) FROM jobs").fetchone()[0] or 0)
+            self.conn = conn
+        return self.conn
+
+    def start(self):
+        """
+        Abre la base, marca como 'lost' los jobs que quedaron activos en una
+        ejecución anterior y arranca el thread de escritura
+        """
+        with self.lock:
+            conn = self._connect()
+            placeholders = ",".join("?" for _ in ACTIVE_STATUSES)
+            lost = conn.execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES
+            ).fetchall()
+            with self.pending_lock:
+                first = self.version + 1
+                self.version += len(lost)
+            conn.executemany(
+                "UPDATE jobs SET status = 'lost', version = ? WHERE job_id = ?",
+                [(first + i, job_id) for i, (job_id,) in enumerate(lost)]
+            )
+            conn.commit()
+
+        if self._writer is None or not self._writer.is_alive():
+            self.running = True
+            self._writer = threading.Thread(target=self._write_loop, name="job-store", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while self.running:
+            self.has_pending.wait()
+            # Dar tiempo a que se acumulen más escrituras en el mismo lote
+            self.batch_full.wait(self.flush_interval)
+            self.has_pending.clear()
+            self.batch_full.clear()
+            self.flush()
+
+    def save(self, job: Job):
+        """Encola el alta/actualización de un job (no bloquea)"""
+        with self.pending_lock:
+            self.version += 1
+            job.version = self.version
+            self.pending[job.job_id] = job.model_copy()
+            full = len(self.pending) >= self.batch_size
+        self.has_pending.set()
+        if full:
+            self.batch_full.set()
+
+    def flush(self):
+        """Confirma las escrituras pendientes en una sola transacción"""
+        if not self.pending:
+            return
+        # La conexión se toma antes de vaciar la cola: una lectura concurrente
+        # ve el job en `pending` o espera a que el lote esté confirmado
+        with self.lock:
+            with self.pending_lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return
+
+            rows = [
+                (job.job_id, job.pid, json.dumps(job.command), job.status, job.created_at,
+                 job.started_at, job.finished_at, job.exit_code, job.priority, job.queue,
+                 job.timeout, job.version, " ".join(job.command))
+                for job in batch.values()
+            ]
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO jobs ({', '.join(INSERT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)})",
+                    rows
+                )
+
+    def _to_job(self, row: tuple) -> Job:
+        data = dict(zip(COLUMNS, row))
+        data["command"] = json.loads(data["command"])
+        return Job(**data)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Obtiene un job por ID (incluye escrituras pendientes)"""
+        job = self.pending.get(job_id)
+        if job is not None:
+            return job.model_copy()
+
+        with self.lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row else None
+
+    def exists(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def _filters(
+        self,
+        statuses: Optional[List[str]] = None,
+        command_prefix: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None
+    ) -> Tuple[List[str], list]:
+        """Cláusulas WHERE (y sus parámetros) de los filtros de listado"""
+        clauses: List[str] = []
+        params: list = []
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params += statuses
+        if command_prefix:
+            # rango en vez de LIKE: usa el índice de command_line
+            clauses.append("command_line >= ? AND command_line < ?")
+            params += [command_prefix, command_prefix + "\U0010ffff"]
+        if created_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        return clauses, params
+    
+    @staticmethod
+    def _matches(
+        job: Job,
+        statuses: Optional[List[str]] = None,
+        command_prefix: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None
+    ) -> bool:
+        """Los mismos filtros que _filters, sobre un job pendiente"""
+        if statuses and job.status not in statuses:
+            return False
+        if command_prefix and not " ".join(job.command).startswith(command_prefix):
+            return False
+        if created_after is not None and job.created_at < created_after:
+            return False
+        return created_before is None or job.created_at < created_before
+    
+    def _overlay(self, clauses: List[str], params: list) -> Dict[str, Job]:
+        """
+        Escrituras pendientes que reemplazan a lo confirmado (con `self.lock`
+        tomado: flush no puede confirmarlas mientras tanto). Agrega la
+        cláusula que las excluye de la consulta; se mezclan después.
+        """
+        with self.pending_lock:
+            pending = dict(self.pending)
+        if pending:
+            clauses.append(f"job_id NOT IN ({', '.join('?' for _ in pending)})")
+            params += list(pending)
+        return pending
+    
+    def page(
+        self,
+        columns: List[str],
+        statuses: Optional[List[str]] = None,
+        command_prefix: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None,
+        sort: str = "created_at",
+        descending: bool = True,
+        after: Optional[Tuple] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Página de jobs como dicts con solo las columnas pedidas (sin construir Job)
+        
+        Args:
+            columns: Columnas a leer (proyección)
+            statuses / command_prefix / created_after / created_before: Filtros
+            sort: Columna de orden (ver SORTABLE); se desempata por job_id
+            descending: Orden descendente
+            after: (valor de `sort`, job_id) del último job de la página anterior (cursor)
+            limit: Máximo de jobs
+            offset: Jobs a saltar (si no se usa cursor)
+            
+        Returns:
+            Lista de dicts (siempre incluyen job_id y la columna de orden)
+        """
+        if sort not in SORTABLE:
+            raise ValueError(f"No se puede ordenar por {sort}")
+        
+        select = list(dict.fromkeys(["job_id", sort, *columns]))
+        clauses, params = self._filters(statuses, command_prefix, created_after, created_before)
+        op = "<" if descending else ">"
+        if after is not None:
+            if sort == "job_id":
+                clauses.append(f"job_id {op} ?")
+                params.append(after[1])
+            else:
+                clauses.append(f"({sort}, job_id) {op} (?, ?)")
+                params += [after[0], after[1]]
+        
+        order = "DESC" if descending else "ASC"
+        with self.lock:
+            pending = self._overlay(clauses, params)
+            sql = f"SELECT {', '.join(select)} FROM jobs"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += f" ORDER BY {sort} {order}, job_id {order} LIMIT ? OFFSET ?"
+            # con pendientes, el offset se aplica después de mezclarlos
+            params += [limit + offset, 0] if pending else [limit, offset]
+            rows = self._connect().execute(sql, params).fetchall()
+        
+        result = [dict(zip(select, row)) for row in rows]
+        if "command" in select:
+            for item in result:
+                item["command"] = loads(item["command"])
+        if not pending:
+            return result
+        
+        for job in pending.values():
+            if not self._matches(job, statuses, command_prefix, created_after, created_before):
+                continue
+            item = {column: getattr(job, column) for column in select}
+            if after is not None:
+                key, cursor = (item[sort], item["job_id"]), (after[0], after[1])
+                if (key >= cursor) if descending else (key <= cursor):
+                    continue
+            result.append(item)
+        result.sort(key=lambda item: (item[sort], item["job_id"]), reverse=descending)
+        return result[offset:offset + limit]
+    
+    def changes(
+        self,
+        columns: List[str],
+        changed_since: int,
+        statuses: Optional[List[str]] = None,
+        command_prefix: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        """
+        Jobs escritos después de `changed_since`, en orden de versión. Se
+        recorren todos los cambios (no solo los que cumplen los filtros) para
+        informar también los jobs que dejaron de cumplirlos.
+        
+        Args:
+            columns: Columnas a leer (proyección)
+            changed_since: Versión desde la que se piden los cambios
+            statuses / command_prefix / created_after / created_before: Filtros
+            limit: Máximo de cambios
+            
+        Returns:
+            Lista de dicts (siempre incluyen job_id y version) con "matches":
+            False si el job ya no cumple los filtros
+        """
+        select = list(dict.fromkeys(["job_id", "version", *columns]))
+        clauses, params = self._filters(statuses, command_prefix, created_after, created_before)
+        match = " AND ".join(clauses) or "1"
+        where, where_params = ["version > ?"], [changed_since]
+        with self.lock:
+            pending = self._overlay(where, where_params)
+            sql = (f"SELECT {', '.join(select)}, ({match}) FROM jobs "
+                   f"WHERE {' AND '.join(where)} ORDER BY version LIMIT ?")
+            rows = self._connect().execute(sql, params + where_params + [limit]).fetchall()
+        
+        result = []
+        for row in rows:
+            item = dict(zip(select, row))
+            item["matches"] = bool(row[-1])
+            if "command" in select:
+                item["command"] = loads(item["command"])
+            result.append(item)
+        for job in pending.values():
+            if job.version > changed_since:
+                item = {column: getattr(job, column) for column in select}
+                item["matches"] = self._matches(job, statuses, command_prefix, created_after, created_before)
+                result.append(item)
+        if pending:
+            result.sort(key=lambda item: item["version"])
+        return result[:limit]
+    
+    def count(
+        self,
+        statuses: Optional[List[str]] = None,
+        command_prefix: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None
+    ) -> int:
+        """Cantidad de jobs (opcionalmente filtrados)"""
+        clauses, params = self._filters(statuses, command_prefix, created_after, created_before)
+        with self.lock:
+            pending = self._overlay(clauses, params)
+            sql = "SELECT COUNT(*) FROM jobs"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            total = self._connect().execute(sql, params).fetchone()[0]
+        return total + sum(
+            1 for job in pending.values()
+            if self._matches(job, statuses, command_prefix, created_after, created_before)
+        )
+    
+    def close(self):
+        """Detiene el thread de escritura y cierra la base (confirma lo pendiente)"""
+        self.running = False
+        self.has_pending.set()
+        self.batch_full.set()
+        if self._writer is not None:
+            self._writer.join(timeout=2)
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# Instancia global
+job_store = JobStore()
@@ -0,0 +1,394 @@
+"""
+Seguimiento en vivo de logs (un watcher por job, muchos suscriptores)
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from services.log_reader import encode_cursor
+from services.log_segments import log_segments
+from utils.fast_json import dumps
+
+
+# Máximo de bytes leídos por iteración del watcher / por evento al ponerse al día
+READ_CHUNK = 1024 * 1024
+
+# Lo más atrasado que se envía al suscribirse; lo anterior se anuncia con un evento `skipped`
+CATCH_UP_LIMIT = 1024 * 1024
+
+# Marca enviada a un suscriptor que no consume a tiempo (se desconecta)
+LAGGED = object()
+
+
+class _Inotify:
+    """Wrapper mínimo de inotify(7) vía ctypes (solo Linux)"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    _EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self.callbacks: Dict[int, Callable[[], None]] = {}
+
+    def add_watch(self, path: Path, callback: Callable[[], None]) -> int:
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE
+                | self.IN_DELETE_SELF | self.IN_MOVE_SELF)
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch falló: {path}")
+        self.callbacks[wd] = callback
+        return wd
+
+    def rm_watch(self, wd: int):
+        self.callbacks.pop(wd, None)
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def dispatch(self):
+        """Lee los eventos pendientes y despierta a los watchers correspondientes"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, _, _, name_len = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size + name_len
+            callback = self.callbacks.get(wd)
+            if callback is not None:
+                callback()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _JobWatcher:
+    """
+    Sigue el archivo de log de un job y reparte las líneas nuevas.
+    `offset` es lógico (como los cursores): el archivo vivo empieza en `base`.
+    El archivo seguido queda abierto: al rotar se termina de leer por ese FD
+    (sin descomprimir el segmento) y su inodo no se puede reutilizar para el
+    archivo nuevo, así la rotación siempre se detecta.
+    Las lecturas corren en un thread; el estado solo cambia en el event loop,
+    junto con el broadcast, así un suscriptor nuevo nunca ve un `offset`
+    adelantado a lo ya enviado.
+    """
+
+    def __init__(self, hub: "LogFollowHub", job_id: str, path: Path, offset: int, base: int):
+        self.hub = hub
+        self.job_id = job_id
+        self.path = path
+        self.offset = offset
+        self.base = base
+        self.file: Optional[BinaryIO] = None
+        self.wd: Optional[int] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _watch(self):
+        if self.hub.inotify is None:
+            return
+        if self.wd is not None:
+            self.hub.inotify.rm_watch(self.wd)
+            self.wd = None
+        try:
+            self.wd = self.hub.inotify.add_watch(self.path, self.wake.set)
+        except OSError:
+            self.wd = None
+
+    async def run(self):
+        # Con inotify el timeout es solo una red de seguridad
+        timeout = self.hub.poll_interval if self.wd is None else 1.0
+        try:
+            while self.subscribers:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.wake.clear()
+                try:
+                    file, offset, base, payloads, more = await asyncio.to_thread(
+                        self._read_new, self.file, self.offset, self.base
+                    )
+                except Exception as e:
+                    logging.error(f"Error leyendo el log de {self.job_id}: {e}")
+                    continue
+                if file is not self.file:
+                    self.file = file
+                    self._watch()
+                self.offset, self.base = offset, base
+                for payload in payloads:
+                    self.broadcast(payload)
+                if more:
+                    self.wake.set()
+                timeout = self.hub.poll_interval if self.wd is None else 1.0
+        finally:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _read_new(self, file: Optional[BinaryIO], offset: int, base: int) -> Tuple:
+        """
+        Lee lo nuevo desde `offset` (corre en un thread, no modifica el watcher)
+
+        Returns:
+            (archivo abierto, offset, base, eventos, quedan más datos)
+        """
+        payloads: List[bytes] = []
+        if file is not None:
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(file.fileno()).st_ino:
+                # Rotado: lo que faltaba sigue en el archivo viejo (cerrado por el writer)
+                while True:
+                    offset, events, complete = _read_lines(file, offset, base)
+                    payloads.extend(events)
+                    if complete:
+                        break
+                file.close()
+                file = None
+
+        if file is None:
+            file, new_base = self._open_live()
+            if file is None:
+                # si el path existe rotó de nuevo mientras se abría: reintentar ya
+                return None, offset, base, payloads, self.path.exists()
+            if offset < new_base:
+                # rotaciones intermedias: desde los segmentos
+                payloads.extend(read_events(self.job_id, offset, new_base))
+                offset = new_base
+            base = new_base
+
+        if os.fstat(file.fileno()).st_size < offset - base:
+            offset = base  # truncado -> desde el principio
+
+        offset, events, complete = _read_lines(file, offset, base)
+        payloads.extend(events)
+        return file, offset, base, payloads, not complete
+
+    def _open_live(self) -> Tuple[Optional[BinaryIO], int]:
+        """Abre el archivo vivo y su offset base (consistente: el path no rotó entre medio)"""
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return None, 0
+        base = log_segments.live_base(self.job_id)
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(file.fileno()).st_ino:
+            file.close()
+            return None, 0
+        return file, base
+
+    def broadcast(self, payload: bytes):
+        """Envía el mismo payload ya serializado a todos los suscriptores"""
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Suscriptor lento: se desconecta en vez de acumular memoria
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(LAGGED)
+
+    def stop(self):
+        if self.wd is not None and self.hub.inotify is not None:
+            self.hub.inotify.rm_watch(self.wd)
+            self.wd = None
+        if self.task is not None:
+            self.task.cancel()
+
+
+def _read_lines(file: BinaryIO, offset: int, base: int) -> Tuple[int, List[bytes], bool]:
+    """
+    Hasta READ_CHUNK de líneas completas desde `offset` del archivo abierto
+
+    Returns:
+        (nuevo offset, eventos, True si se llegó al final del archivo)
+    """
+    size = os.fstat(file.fileno()).st_size
+    position = offset - base
+    if size <= position:
+        return offset, [], True
+    file.seek(position)
+    data = file.read(min(READ_CHUNK, size - position))
+    # Solo líneas completas; el resto se lee en la próxima iteración
+    cut = data.rfind(b"\n")
+    if cut == -1:
+        return offset, [], True
+    offset += cut + 1
+    return offset, [format_event(data[:cut], offset)], offset - base >= size
+
+
+def format_event(data: bytes, end_offset: int) -> bytes:
+    """
+    Serializa un bloque de líneas como evento SSE.
+    El `id` es el cursor para reanudar con Last-Event-ID / `after`.
+    """
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    body = "".join(f"data: {line.rstrip(chr(13))}\n" for line in lines)
+    return f"id: {encode_cursor(end_offset)}\nevent: log\n{body}\n".encode("utf-8")
+
+
+def format_skipped(job_id: str, start: int, end: int) -> bytes:
+    """
+    Evento SSE que anuncia bytes que no se envían (cliente muy atrasado o
+    segmentos ya borrados por cuota/retención). El `id` es el cursor donde
+    sigue el stream; `after` permite leer lo omitido con GET /logs/{job_id}.
+    """
+    data = dumps({"job_id": job_id, "skipped_bytes": end - start, "after": encode_cursor(start)})
+    return f"id: {encode_cursor(end)}\nevent: skipped\n".encode("utf-8") + b"data: " + data + b"\n\n"
+
+
+def read_events(job_id: str, start: int, end: int, limit: int = 0) -> List[bytes]:
+    """
+    Eventos con las líneas del rango lógico [start, end), de a READ_CHUNK
+    (lectura bloqueante: llamar desde un thread). Con `limit`, solo se envían
+    los últimos `limit` bytes y lo anterior se anuncia con un evento `skipped`;
+    lo mismo si parte del rango ya no existe.
+    """
+    events: List[bytes] = []
+    position = start
+    if limit and end - start > limit:
+        position = end - limit
+        data = log_segments.read_bytes(job_id, position, min(end, position + READ_CHUNK))
+        position += data.find(b"\n") + 1 if b"\n" in data else len(data)
+        events.append(format_skipped(job_id, start, position))
+
+    while position < end:
+        chunk_end = min(end, position + READ_CHUNK)
+        data = log_segments.read_bytes(job_id, position, chunk_end)
+        missing = (chunk_end - position) - len(data)
+        if missing > 0:
+            # los segmentos borrados son siempre los más viejos: falta el principio del rango
+            events.append(format_skipped(job_id, position, position + missing))
+            position += missing
+        cut = data.rfind(b"\n")
+        if cut == -1:
+            break  # línea a medio escribir (o más larga que READ_CHUNK)
+        position += cut + 1
+        events.append(format_event(data[:cut], position))
+    return events
+
+
+class LogFollowHub:
+    """
+    Gestiona los seguidores de logs: un único watcher (inotify, o polling
+    por stat si no está disponible) por job, compartido por todos sus clientes.
+    """
+
+    def __init__(self, log_dir: str = "", poll_interval: float = 0.25, queue_size: int = 256):
+        self.log_dir = Path(log_dir or settings.log_dir)
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.watchers: Dict[str, _JobWatcher] = {}
+        self.inotify: Optional[_Inotify] = None
+        self._inotify_checked = False
+
+    def _init_inotify(self):
+        if self._inotify_checked:
+            return
+        self._inotify_checked = True
+        try:
+            self.inotify = _Inotify()
+            asyncio.get_running_loop().add_reader(self.inotify.fd, self.inotify.dispatch)
+        except (OSError, AttributeError, NotImplementedError):
+            self.inotify = None
+
+    def log_path(self, job_id: str) -> Path:
+        return self.log_dir / f"{job_id}.log"
+
+    async def subscribe(self, job_id: str, offset: Optional[int] = None) -> tuple:
+        """
+        Registra un suscriptor para un job
+
+        Args:
+            job_id: ID del job
+            offset: Posición desde la que seguir (None = desde el final actual)
+
+        Returns:
+            (cola de eventos, eventos iniciales con las líneas entre offset y la posición del watcher)
+        """
+        self._init_inotify()
+        path = self.log_path(job_id)
+        if not log_segments.exists(job_id):
+            raise FileNotFoundError(path)
+
+        watcher = self.watchers.get(job_id)
+        if watcher is None:
+            base = log_segments.live_base(job_id)
+            try:
+                size = base + os.stat(path).st_size
+            except FileNotFoundError:  # recién rotado, todavía sin reabrir
+                size = base
+            start = size if offset is None else min(offset, size)
+            watcher = _JobWatcher(self, job_id, path, max(start, base), base)
+            self.watchers[job_id] = watcher
+            if start < base:
+                offset = start  # el resto se envía al ponerse al día
+
+        # La cola se registra en la posición actual del watcher (sin await de por
+        # medio); lo anterior se lee aparte, en un thread
+        end = watcher.offset
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        watcher.subscribers.add(queue)
+        if watcher.task is None or watcher.task.done():
+            watcher.task = asyncio.get_running_loop().create_task(watcher.run())
+        watcher.wake.set()
+
+        catch_up: List[bytes] = []
+        if offset is not None and offset < end:
+            try:
+                catch_up = await asyncio.to_thread(read_events, job_id, offset, end, CATCH_UP_LIMIT)
+            except BaseException:
+                self.unsubscribe(job_id, queue)
+                raise
+        return queue, catch_up
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        watcher = self.watchers.get(job_id)
+        if watcher is None:
+            return
+        watcher.subscribers.discard(queue)
+        if not watcher.subscribers:
+            watcher.stop()
+            del self.watchers[job_id]
+
+    def shutdown(self):
+        for watcher in list(self.watchers.values()):
+            watcher.stop()
+        self.watchers.clear()
+        if self.inotify is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self.inotify.fd)
+            except RuntimeError:
+                pass
+            self.inotify.close()
+            self.inotify = None
+        self._inotify_checked = False
+
+
+# Instancia global
+log_follow_hub = LogFollowHub()
@@ -0,0 +1,313 @@
+"""
+Índice de búsqueda de los logs de jobs (trigramas por bloque + bloom filter)
+
+Cada archivo de log (vivo o segmento rotado) tiene un sidecar `.idx` con un
+registro de tamaño fijo por bloque de ~64 KB: rango de bytes, timestamps de
+la primera y última línea y un bloom filter con los trigramas (en minúsculas)
+de las palabras (separadas por espacios) del bloque. El índice se arma en el
+thread escritor a medida que se escriben las líneas; una búsqueda solo lee los bloques cuyo bloom
+contiene todos los trigramas de la consulta y cuyo rango de tiempo aplica.
+"""
+import os
+import re
+import struct
+import time
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from services.log_segments import LogSegments, Segment, log_segments
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+# Bloques de ~64 KB (cerrados siempre en fin de línea)
+BLOCK_BYTES = 64 * 1024
+
+# Bloom filter por bloque: 16384 bits, 3 hashes (~3% de falsos positivos por trigrama con 2000 trigramas)
+BLOOM_BITS = 16384
+BLOOM_BYTES = BLOOM_BITS // 8
+BLOOM_MASK = BLOOM_BITS - 1
+
+# rel_start, rel_end (offsets dentro del archivo), timestamp primera y última línea
+RECORD_HEADER = struct.Struct("<QQdd")
+RECORD_SIZE = RECORD_HEADER.size + BLOOM_BYTES
+
+# Bits del bloom por palabra: los logs repiten mucho vocabulario, así que
+# cada bloque solo expande a trigramas las palabras que no vio antes
+WORD_CACHE_SIZE = 16384
+
+# Formato del timestamp al inicio de cada línea (ver JobLogger)
+TIMESTAMP_LEN = 19
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def word_bits(word: bytes) -> Tuple[int, ...]:
+    """Bits del bloom de los trigramas de una palabra (hash estable entre procesos)"""
+    bits = set()
+    for i in range(len(word) - 2):
+        h = (int.from_bytes(word[i:i + 3], "little") * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        bits.update((h & BLOOM_MASK, (h >> 21) & BLOOM_MASK, (h >> 42) & BLOOM_MASK))
+    return tuple(bits)
+
+
+_last_timestamp: Tuple[bytes, Optional[float]] = (b"", None)
+
+
+def parse_timestamp(line: bytes) -> Optional[float]:
+    """Unix timestamp del prefijo 'YYYY-MM-DD HH:MM:SS' de una línea (hora local)"""
+    global _last_timestamp
+    prefix = line[:TIMESTAMP_LEN]
+    cached_prefix, cached = _last_timestamp
+    if prefix == cached_prefix:
+        return cached
+    try:
+        value = time.mktime(time.strptime(prefix.decode("ascii"), TIMESTAMP_FORMAT))
+    except (UnicodeDecodeError, ValueError):
+        value = None
+    _last_timestamp = (prefix, value)
+    return value
+
+
+class _Block:
+    """Bloque en construcción del archivo vivo de un job"""
+    __slots__ = ("start", "end", "words", "first_ts", "last_ts")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.end = start
+        self.words: Set[bytes] = set()
+        self.first_ts = 0.0
+        self.last_ts = 0.0
+
+
+class LogIndexer:
+    """
+    Arma el índice del archivo vivo de cada job a medida que se escribe.
+    Solo lo usa el thread escritor (LogWriter), no necesita locks.
+    """
+
+    def __init__(self, segments: Optional[LogSegments] = None):
+        self.segments = segments or log_segments
+        self.blocks: Dict[str, _Block] = {}
+        self.word_cache: Dict[bytes, Tuple[int, ...]] = {}
+
+    def add(self, job_id: str, offset: int, data: bytes):
+        """Registra `data` (líneas completas) escrito en `offset` del archivo vivo"""
+        block = self.blocks.get(job_id)
+        if block is None or block.end != offset:  # primer write o el archivo cambió
+            if block is not None:
+                self.finish(job_id)
+            block = self.blocks[job_id] = _Block(offset)
+
+        while data:
+            piece = data
+            room = BLOCK_BYTES - (block.end - block.start)
+            if len(data) > room:
+                # cortar en el último fin de línea que entra en el bloque
+                cut = data.rfind(b"\n", 0, room)
+                if cut == -1:
+                    cut = data.find(b"\n", room)
+                if cut != -1:
+                    piece = data[:cut + 1]
+            self._extend(block, piece)
+            data = data[len(piece):]
+            if block.end - block.start >= BLOCK_BYTES or data:
+                self.finish(job_id)
+                block = self.blocks[job_id] = _Block(block.end)
+
+    @staticmethod
+    def _extend(block: _Block, data: bytes):
+        if block.end == block.start:
+            block.first_ts = parse_timestamp(data) or 0.0
+        last = data.rfind(b"\n", 0, len(data) - 1) + 1
+        block.last_ts = parse_timestamp(data[last:]) or block.last_ts
+        block.words.update(data.lower().split())
+        block.end += len(data)
+
+    def finish(self, job_id: str):
+        """Persiste el bloque en curso (antes de cerrar, desalojar o rotar el archivo)"""
+        block = self.blocks.pop(job_id, None)
+        if block is None or block.end == block.start:
+            return
+        record = RECORD_HEADER.pack(block.start, block.end, block.first_ts, block.last_ts) + self._bloom(block.words)
+        with open(self.segments.live_sidecar_path(job_id, ".idx"), "ab") as f:
+            f.write(record)
+
+    def forget(self, job_id: str):
+        self.blocks.pop(job_id, None)
+
+    def _bloom(self, words: Set[bytes]) -> bytes:
+        if len(self.word_cache) > WORD_CACHE_SIZE:
+            self.word_cache.clear()
+        cache = self.word_cache
+        for word in words - cache.keys():
+            cache[word] = word_bits(word)
+        bloom = bytearray(BLOOM_BYTES)
+        for p in set().union(*map(cache.__getitem__, words)):
+            bloom[p >> 3] |= 1 << (p & 7)
+        return bytes(bloom)
+
+
+class _Query:
+    """Consulta compilada: matcher de líneas + bits del bloom que tienen que estar"""
+
+    def __init__(self, q: str, regex: bool, ignore_case: bool):
+        # todo en bytes: lower() e IGNORECASE solo pliegan ASCII, igual que el índice
+        raw = q.encode("utf-8")
+        if regex:
+            pattern = re.compile(raw, re.IGNORECASE if ignore_case else 0)
+            self.match = lambda line: pattern.search(line) is not None
+            literals = _required_literals(raw)
+        else:
+            needle = raw.lower() if ignore_case else raw
+            if ignore_case:
+                self.match = lambda line: needle in line.lower()
+            else:
+                self.match = lambda line: needle in line
+            literals = [raw]
+
+        # un tramo sin espacios de la consulta cae dentro de una sola palabra de la línea
+        words = {word for literal in literals for word in literal.lower().split()}
+        self.positions = sorted({p for word in words for p in word_bits(word)})
+
+    def may_contain(self, bloom: memoryview) -> bool:
+        for p in self.positions:
+            if not bloom[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+def _required_literals(pattern: bytes) -> List[bytes]:
+    """
+    Tramos literales que toda coincidencia de la regex tiene que contener
+    (solo la secuencia de nivel superior: grupos, alternativas y repeticiones
+    cortan el tramo y no aportan nada)
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+    runs: List[bytes] = []
+    current = bytearray()
+    for op, arg in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(arg)
+            continue
+        if current:
+            runs.append(bytes(current))
+            current = bytearray()
+    if current:
+        runs.append(bytes(current))
+    return runs
+
+
+class LogSearcher:
+    """Búsqueda en los logs de uno o todos los jobs usando los sidecars `.idx`"""
+
+    def __init__(self, segments: Optional[LogSegments] = None):
+        self.segments = segments or log_segments
+
+    def job_ids(self, since: Optional[float] = None) -> List[str]:
+        """Jobs con log, los modificados más recientemente primero"""
+        found: Dict[str, float] = {}
+        with os.scandir(self.segments.log_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".log") and entry.is_file():
+                    found[entry.name[:-4]] = entry.stat().st_mtime
+        if self.segments.rotated_dir.exists():
+            with os.scandir(self.segments.rotated_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        found[entry.name] = max(found.get(entry.name, 0.0), entry.stat().st_mtime)
+        jobs = [(mtime, job_id) for job_id, mtime in found.items() if since is None or mtime >= since]
+        return [job_id for _, job_id in sorted(jobs, reverse=True)]
+
+    def search(self, q: str, job_id: Optional[str] = None, regex: bool = False, ignore_case: bool = True,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 100, stats: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Líneas que contienen `q` (o coinciden con la regex), en orden dentro de cada job
+
+        Args:
+            stats: Se completa durante la búsqueda con jobs, bloques indexados,
+                bloques leídos y bytes leídos
+
+        Returns:
+            Iterador de {"job_id", "offset" (lógico, inicio de la línea), "timestamp", "line"}
+
+        Raises:
+            re.error: Si la regex no es válida (al llamar, no al iterar)
+        """
+        query = _Query(q, regex, ignore_case)
+        stats = stats if stats is not None else {}
+        stats.update({"jobs": 0, "blocks_total": 0, "blocks_read": 0, "bytes_read": 0})
+        return self._search(query, job_id, since, until, limit, stats)
+
+    def _search(self, query: "_Query", job_id: Optional[str], since: Optional[float],
+                until: Optional[float], limit: int, stats: Dict) -> Iterator[Dict]:
+        found = 0
+        for current in ([job_id] if job_id else self.job_ids(since)):
+            stats["jobs"] += 1
+            for part, f, size in self.segments.iter_parts(current, since):
+                for match in self._search_part(current, part, f, size, query, since, until, stats):
+                    yield match
+                    found += 1
+                    if found >= limit:
+                        return
+
+    def _search_part(self, job_id: str, part: Segment, f: BinaryIO, size: int, query: _Query,
+                     since: Optional[float], until: Optional[float], stats: Dict) -> Iterator[Dict]:
+        for start, end in self._candidates(part, size, query, since, until, stats):
+            f.seek(start)
+            data = f.read(end - start)
+            stats["bytes_read"] += len(data)
+            position = start
+            for line in data.split(b"\n"):
+                line_start = position
+                position += len(line) + 1
+                if not line or not query.match(line):
+                    continue
+                timestamp = parse_timestamp(line)
+                if timestamp is not None and ((since is not None and timestamp < since) or
+                                              (until is not None and timestamp > until)):
+                    continue
+                yield {
+                    "job_id": job_id,
+                    "offset": part.start + line_start,
+                    "timestamp": timestamp,
+                    "line": line.decode("utf-8", errors="replace").rstrip("\r"),
+                }
+
+    def _candidates(self, part: Segment, size: int, query: _Query,
+                    since: Optional[float], until: Optional[float], stats: Dict) -> List[Tuple[int, int]]:
+        """Rangos del archivo a leer: bloques que pasan el bloom/tiempo + lo que no está indexado"""
+        try:
+            with open(self.segments.sidecar_path(part, ".idx"), "rb") as f:
+                index = f.read()
+        except FileNotFoundError:
+            index = b""
+
+        ranges: List[Tuple[int, int]] = []
+        covered = 0
+        view = memoryview(index)
+        for pos in range(0, len(index) - RECORD_SIZE + 1, RECORD_SIZE):
+            start, end, first_ts, last_ts = RECORD_HEADER.unpack_from(index, pos)
+            if end > size:
+                break  # índice de un archivo más largo (recreado): ignorar el resto
+            stats["blocks_total"] += 1
+            if start > covered:
+                ranges.append((covered, start))  # hueco sin indexar
+            covered = max(covered, end)
+            if since is not None and last_ts and last_ts < since:
+                continue
+            if until is not None and first_ts and first_ts > until:
+                continue
+            bloom = view[pos + RECORD_HEADER.size:pos + RECORD_SIZE]
+            if query.may_contain(bloom):
+                stats["blocks_read"] += 1
+                ranges.append((start, end))
+        if covered < size:
+            ranges.append((covered, size))  # cola todavía sin indexar (bloque en construcción)
+        return ranges
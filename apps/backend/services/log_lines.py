@@ -0,0 +1,336 @@
+"""
+Índice de líneas y tiempo de los logs de jobs (acceso aleatorio por línea o fecha)
+
+Cada archivo de log (vivo o segmento rotado) tiene un sidecar `.lines` con un
+registro de tamaño fijo cada K líneas: número de línea (global del job, desde
+0), offset dentro del archivo donde empieza y timestamp de esa línea. El
+primer registro es siempre la primera línea del archivo y, al rotar, se
+agrega uno final con el total de líneas y el tamaño del segmento.
+
+Con registros de tamaño fijo, ubicar una línea o un instante es una búsqueda
+binaria con O(log n) lecturas de 24 bytes (entre segmentos y dentro del
+sidecar) más el recorrido de a lo sumo K líneas.
+"""
+import bisect
+import os
+import struct
+from typing import BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.log_index import parse_timestamp
+from services.log_segments import LogSegments, Segment, log_segments
+
+
+# línea, offset dentro del archivo, timestamp de la línea
+RECORD = struct.Struct("<QQd")
+
+SUFFIX = ".lines"
+
+# Lectura al recorrer líneas desde un registro
+CHUNK_SIZE = 64 * 1024
+
+
+class _Records:
+    """Registros de un sidecar como secuencia (cada acceso es un seek + read)"""
+
+    def __init__(self, f: BinaryIO, count: int):
+        self.f = f
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Tuple[int, int, float]:
+        self.f.seek(i * RECORD.size)
+        return RECORD.unpack(self.f.read(RECORD.size))
+
+
+class _Keys:
+    """
+    Vista de `key(item)` sobre una secuencia, para bisect sin `key=` (Python < 3.10):
+    solo se calcula la clave de los elementos que visita la búsqueda binaria
+    """
+
+    def __init__(self, items: Sequence, key: Callable):
+        self.items = items
+        self.key = key
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, i: int):
+        return self.key(self.items[i])
+
+
+def _open_records(path) -> Optional[_Records]:
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    count = os.fstat(f.fileno()).st_size // RECORD.size  # un registro a medio escribir no cuenta
+    if count == 0:
+        f.close()
+        return None
+    return _Records(f, count)
+
+
+class _State:
+    """Posición del archivo vivo de un job en el thread escritor"""
+    __slots__ = ("line", "end", "last_ts")
+
+    def __init__(self, line: int, end: int, last_ts: float):
+        self.line = line  # número de la línea que empieza en `end`
+        self.end = end  # offset (dentro del archivo) hasta el que se escribió
+        self.last_ts = last_ts
+
+
+class LineIndexer:
+    """
+    Arma el sidecar `.lines` del archivo vivo de cada job a medida que se escribe.
+    Solo lo usa el thread escritor (LogWriter), no necesita locks.
+    """
+
+    def __init__(self, segments: Optional[LogSegments] = None, interval: int = 1000):
+        self.segments = segments or log_segments
+        self.interval = interval
+        self.states: Dict[str, _State] = {}
+
+    def add(self, job_id: str, offset: int, data: bytes):
+        """Registra `data` (líneas completas) escrito en `offset` del archivo vivo"""
+        state = self.states.get(job_id)
+        if state is None or state.end != offset:
+            state = self.states[job_id] = self._load(job_id, offset)
+
+        records = []
+        count = data.count(b"\n")
+        if offset == 0:
+            records.append(RECORD.pack(state.line, 0, self._timestamp(state, data)))
+        # próxima línea múltiplo de K (la primera del archivo ya quedó registrada)
+        mark = -(-state.line // self.interval) * self.interval
+        if offset == 0 and mark == state.line:
+            mark += self.interval
+        line, pos = state.line, 0
+        while mark < state.line + count:
+            while line < mark:
+                pos = data.index(b"\n", pos) + 1
+                line += 1
+            records.append(RECORD.pack(mark, offset + pos, self._timestamp(state, data[pos:pos + 32])))
+            mark += self.interval
+
+        last = data.rfind(b"\n", 0, len(data) - 1) + 1
+        state.last_ts = parse_timestamp(data[last:]) or state.last_ts
+        state.line += count
+        state.end = offset + len(data)
+        if records:
+            with open(self.segments.live_sidecar_path(job_id, SUFFIX), "ab") as f:
+                f.write(b"".join(records))
+
+    def seal(self, job_id: str, size: int):
+        """Cierra el sidecar del archivo vivo antes de rotarlo (registro final: total de líneas)"""
+        state = self.states.pop(job_id, None)
+        if state is None:
+            state = self._load(job_id, size)
+        with open(self.segments.live_sidecar_path(job_id, SUFFIX), "ab") as f:
+            f.write(RECORD.pack(state.line, size, state.last_ts))
+
+    def release(self, job_id: str):
+        """Olvida la posición del job (archivo cerrado o desalojado del pool)"""
+        self.states.pop(job_id, None)
+
+    @staticmethod
+    def _timestamp(state: _State, line: bytes) -> float:
+        ts = parse_timestamp(line)
+        if ts is not None:
+            state.last_ts = ts
+        return state.last_ts
+
+    def _load(self, job_id: str, offset: int) -> _State:
+        """
+        Reconstruye la posición del archivo vivo (primer write, reapertura o reinicio):
+        desde el último registro del sidecar, o desde el registro final del último
+        segmento si el archivo vivo todavía no tiene sidecar
+        """
+        sidecar = self.segments.live_sidecar_path(job_id, SUFFIX)
+        records = _open_records(sidecar)
+        if records is not None:
+            with records.f:
+                line, start, ts = records[len(records) - 1]
+            if start <= offset:
+                live = self.segments.live_path(job_id)
+                return _State(line + _count_lines(live, start, offset), offset, ts)
+            sidecar.unlink()  # de un archivo anterior más largo
+
+        line, ts = 0, 0.0
+        segments = self.segments.segments(job_id)
+        if segments:
+            records = _open_records(self.segments.sidecar_path(segments[-1], SUFFIX))
+            if records is not None:
+                with records.f:
+                    line, _, ts = records[len(records) - 1]
+        if offset > 0:
+            # contenido sin indexar (logs previos al índice): solo se registra el inicio
+            with open(sidecar, "ab") as f:
+                f.write(RECORD.pack(line, 0, ts))
+            line += _count_lines(self.segments.live_path(job_id), 0, offset)
+        return _State(line, offset, ts)
+
+
+def live_started_at(segments: LogSegments, job_id: str) -> Optional[float]:
+    """Timestamp de la primera línea del archivo vivo (primer registro de su `.lines`)"""
+    records = _open_records(segments.live_sidecar_path(job_id, SUFFIX))
+    if records is None:
+        return None
+    with records.f:
+        _, offset, ts = records[0]
+    return ts if offset == 0 and ts > 0 else None
+
+
+def _count_lines(path, start: int, end: int) -> int:
+    with open(path, "rb") as f:
+        return _count_in(f, start, end)
+
+
+class LineIndex:
+    """Ubica líneas e instantes del log de un job en offsets lógicos usando los sidecars"""
+
+    def __init__(self, segments: Optional[LogSegments] = None):
+        self.segments = segments or log_segments
+
+    def offset_of_line(self, job_id: str, line: int) -> Optional[int]:
+        """
+        Offset lógico donde empieza la línea `line` (desde 0). Si la línea es
+        anterior a lo que se conserva, el inicio del log; si es posterior, el final.
+        None si el job no tiene log.
+        """
+        def skip(f: BinaryIO, record: Tuple[int, int, float], end: int) -> int:
+            return _skip_lines(f, record[1], end, line - record[0])
+
+        return self._locate(job_id, line, 0, skip)
+
+    def offset_of_time(self, job_id: str, timestamp: float) -> Optional[int]:
+        """
+        Offset lógico de la primera línea con timestamp >= `timestamp`
+        (el final del log si no hay ninguna). None si el job no tiene log.
+        """
+        def skip(f: BinaryIO, record: Tuple[int, int, float], end: int) -> int:
+            return _skip_until(f, record[1], end, timestamp)
+
+        return self._locate(job_id, timestamp, 2, skip)
+
+    def line_at(self, job_id: str, offset: int) -> Optional[int]:
+        """Número (desde 0) de la línea que empieza en el offset lógico `offset`"""
+        def read(parts: List[Segment]) -> Optional[int]:
+            i = bisect.bisect_right(_Keys(parts, lambda part: part.start), offset) - 1
+            if i < 0:
+                return None
+            part = parts[i]
+            records = _open_records(self.segments.sidecar_path(part, SUFFIX))
+            if records is None:
+                return None
+            local = offset - part.start
+            with records.f:
+                j = max(bisect.bisect_right(_Keys(records, lambda r: r[1]), local) - 1, 0)
+                line, start, _ = records[j]
+            f, size = self.segments.open_part(part)
+            with f:
+                return line + _count_in(f, start, min(local, size))
+
+        return self.segments.read_parts(job_id, read)
+
+    def _locate(self, job_id: str, target, field: int,
+                skip: Callable[[BinaryIO, Tuple[int, int, float], int], int]) -> Optional[int]:
+        """
+        Búsqueda binaria de `target` según el campo `field` de los registros
+        (0: línea, 2: timestamp): primero el tramo, después el registro dentro
+        de su sidecar y por último `skip` recorre las líneas que faltan
+        """
+        def read(parts: List[Segment]) -> Optional[int]:
+            if not parts:
+                return None
+
+            def first(part: Segment):
+                records = _open_records(self.segments.sidecar_path(part, SUFFIX))
+                if records is None:
+                    return -1  # sin sidecar (log previo al índice): se trata como el más viejo
+                with records.f:
+                    return records[0][field]
+
+            # último tramo que empieza antes de `target` (por línea: en o antes)
+            if field == 0:
+                i = bisect.bisect_right(_Keys(parts, first), target) - 1
+            else:
+                i = bisect.bisect_left(_Keys(parts, first), target) - 1
+            if i < 0:
+                return parts[0].start  # anterior a lo que se conserva
+
+            part = parts[i]
+            records = _open_records(self.segments.sidecar_path(part, SUFFIX))
+            if records is None:
+                return part.start
+            with records.f:
+                if field == 0:
+                    j = bisect.bisect_right(_Keys(records, lambda r: r[0]), target) - 1
+                else:
+                    j = bisect.bisect_left(_Keys(records, lambda r: r[2]), target) - 1
+                record = records[max(j, 0)]
+            f, size = self.segments.open_part(part)
+            with f:
+                return part.start + skip(f, record, size)
+
+        return self.segments.read_parts(job_id, read)
+
+
+def _skip_lines(f: BinaryIO, start: int, end: int, lines: int) -> int:
+    """Offset después de avanzar `lines` líneas desde `start` (a lo sumo `end`)"""
+    f.seek(start)
+    position = start
+    while lines > 0 and position < end:
+        chunk = f.read(min(CHUNK_SIZE, end - position))
+        if not chunk:
+            break
+        newline = -1
+        while lines > 0:
+            newline = chunk.find(b"\n", newline + 1)
+            if newline == -1:
+                break
+            lines -= 1
+        if lines == 0:
+            return position + newline + 1
+        position += len(chunk)
+    return position
+
+
+def _skip_until(f: BinaryIO, start: int, end: int, timestamp: float) -> int:
+    """Offset de la primera línea desde `start` con timestamp >= `timestamp` (o `end`)"""
+    f.seek(start)
+    position = start
+    pending = b""
+    while position < end:
+        chunk = f.read(min(CHUNK_SIZE, end - position))
+        if not chunk:
+            break
+        data = pending + chunk
+        line_start = 0
+        while True:
+            newline = data.find(b"\n", line_start)
+            if newline == -1:
+                break
+            ts = parse_timestamp(data[line_start:newline])
+            if ts is not None and ts >= timestamp:
+                return position - len(pending) + line_start
+            line_start = newline + 1
+        pending = data[line_start:]
+        position += len(chunk)
+    return end
+
+
+def _count_in(f: BinaryIO, start: int, end: int) -> int:
+    f.seek(start)
+    count = 0
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        count += chunk.count(b"\n")
+        remaining -= len(chunk)
+    return count
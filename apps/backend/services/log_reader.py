@@ -0,0 +1,122 @@
+"""
+Lectura eficiente de archivos de log (tail y paginación por offset)
+"""
+import base64
+from typing import BinaryIO, List, Tuple
+
+
+# Tamaño de bloque para leer el archivo hacia atrás/adelante
+BLOCK_SIZE = 64 * 1024
+
+
+def encode_cursor(offset: int) -> str:
+    """
+    Codifica un offset en bytes como cursor opaco para los clientes
+
+    Args:
+        offset: Posición en bytes dentro del log
+
+    Returns:
+        Cursor opaco (base64 url-safe)
+    """
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decodifica un cursor generado por encode_cursor
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    if offset < 0:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return offset
+
+
+def _split(data: bytes) -> List[str]:
+    return [line.decode("utf-8", errors="replace") for line in data.split(b"\n")]
+
+
+def read_tail(f: BinaryIO, lines: int, end: int) -> Tuple[List[str], int, int]:
+    """
+    Lee las últimas `lines` líneas que terminan antes de `end`, leyendo
+    bloques hacia atrás. El costo depende de `lines`, no del tamaño del archivo.
+
+    Args:
+        f: Archivo abierto en modo binario
+        lines: Número de líneas a leer
+        end: Offset (exclusivo) donde termina la lectura
+
+    Returns:
+        (líneas, offset de inicio, offset de fin)
+    """
+    if end <= 0 or lines <= 0:
+        return [], end, end
+
+    pos = end
+    buf = b""
+    while pos > 0:
+        step = min(BLOCK_SIZE, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        # El salto de línea final del rango no separa líneas
+        limit = len(buf) - 1 if buf.endswith(b"\n") else len(buf)
+        if buf.count(b"\n", 0, limit) >= lines:
+            break
+
+    limit = len(buf) - 1 if buf.endswith(b"\n") else len(buf)
+    idx = limit
+    for _ in range(lines):
+        idx = buf.rfind(b"\n", 0, idx)
+        if idx == -1:
+            break
+    start = pos + idx + 1 if idx != -1 else pos
+
+    body = buf[start - pos:limit]
+    return _split(body), start, end
+
+
+def read_forward(f: BinaryIO, lines: int, start: int, size: int) -> Tuple[List[str], int, int]:
+    """
+    Lee hasta `lines` líneas completas a partir de `start`, leyendo bloques
+    hacia adelante. Una línea a medio escribir al final no se incluye.
+
+    Args:
+        f: Archivo abierto en modo binario
+        lines: Número de líneas a leer
+        start: Offset donde empieza la lectura (inicio de línea)
+        size: Tamaño actual del archivo
+
+    Returns:
+        (líneas, offset de inicio, offset de fin)
+    """
+    if start >= size or lines <= 0:
+        return [], start, start
+
+    f.seek(start)
+    buf = b""
+    pos = start
+    while pos < size and buf.count(b"\n") < lines:
+        chunk = f.read(min(BLOCK_SIZE, size - pos))
+        if not chunk:
+            break
+        buf += chunk
+        pos += len(chunk)
+
+    idx = -1
+    for _ in range(lines):
+        nxt = buf.find(b"\n", idx + 1)
+        if nxt == -1:
+            break
+        idx = nxt
+    if idx == -1:
+        return [], start, start
+
+    return _split(buf[:idx]), start, start + idx + 1
@@ -0,0 +1,612 @@
+"""
+Segmentos rotados de los logs de jobs (rotación, compresión, cuota y lectura)
+
+Cada job tiene un archivo vivo `{log_dir}/{job_id}.log` y, al rotar, sus
+segmentos anteriores en `{log_dir}/rotated/{job_id}/{inicio}-{fin}.log[.gz|.zst]`.
+Cada tramo tiene al lado sus índices (`.idx` de búsqueda, ver log_index,
+`.lines` de líneas/tiempo, ver log_lines, y `.seek` de los segmentos
+comprimidos) que rotan, se borran y cuentan para la cuota junto con él.
+Los segmentos se comprimen en miembros independientes de MEMBER_SIZE bytes
+(descomprimidos); `.seek` guarda el offset comprimido de cada uno, así una
+lectura descomprime solo los miembros que toca.
+Los offsets son lógicos: cuentan bytes desde el inicio del log del job, así
+que los cursores siguen siendo válidos después de rotar (el archivo vivo
+empieza en el `fin` del último segmento).
+"""
+import gzip
+import io
+import logging
+import os
+import queue
+import struct
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from config import settings
+from services.log_reader import read_forward, read_tail
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+
+# Extensión de cada formato de segmento comprimido
+CODECS = {"gzip": ".gz", "zstd": ".zst"}
+
+# Índices que acompañan a cada tramo del log
+SIDECARS = (".idx", ".lines", ".seek")
+
+# Bytes (descomprimidos) de cada miembro gzip / frame zstd de un segmento
+MEMBER_SIZE = 1024 * 1024
+
+# Offset comprimido de cada miembro en el sidecar `.seek`
+MEMBER_OFFSET = struct.Struct("<Q")
+
+# Intentos de una lectura cuyos tramos cambian (compresión o cuota) mientras se leen
+READ_ATTEMPTS = 3
+
+T = TypeVar("T")
+
+
+class Segment:
+    """Un tramo del log: [start, end) en offsets lógicos"""
+    __slots__ = ("start", "end", "path")
+
+    def __init__(self, start: int, end: int, path: Path):
+        self.start = start
+        self.end = end
+        self.path = path
+
+    @property
+    def compressed(self) -> bool:
+        return self.path.suffix in (".gz", ".zst")
+
+
+def _parse_segment(name: str) -> Optional[Tuple[int, int, str]]:
+    """'000000000000-000010485760.log.gz' -> (0, 10485760, '.gz')"""
+    stem, _, rest = name.partition(".log")
+    if rest not in ("", ".gz", ".zst"):
+        return None
+    start, sep, end = stem.partition("-")
+    if not sep or not start.isdigit() or not end.isdigit():
+        return None
+    return int(start), int(end), rest
+
+
+def _decompress(path: Path) -> bytes:
+    """Contenido completo de un segmento zstd sin `.seek` (comprimido antes de los miembros)"""
+    if zstandard is None:
+        raise RuntimeError(f"zstandard no está instalado, no se puede leer {path.name}")
+    with open(path, "rb") as f:
+        return zstandard.ZstdDecompressor().stream_reader(f).read()
+
+
+def _decompress_member(path: Path, data: bytes) -> bytes:
+    if path.suffix == ".gz":
+        return gzip.decompress(data)
+    if zstandard is None:
+        raise RuntimeError(f"zstandard no está instalado, no se puede leer {path.name}")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class _MemberReader(io.RawIOBase):
+    """
+    Segmento comprimido como archivo de solo lectura con seek: cada lectura
+    descomprime solo el miembro que la contiene (a lo sumo MEMBER_SIZE en memoria)
+    """
+
+    def __init__(self, path: Path, offsets: List[int], size: int):
+        super().__init__()
+        self.path = path
+        self.file = open(path, "rb")
+        self.offsets = offsets
+        self.size = size
+        self.position = 0
+        self.member = -1
+        self.data = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def _load(self, member: int):
+        start = self.offsets[member]
+        self.file.seek(start)
+        if member + 1 < len(self.offsets):
+            data = self.file.read(self.offsets[member + 1] - start)
+        else:
+            data = self.file.read()
+        self.data = _decompress_member(self.path, data)
+        self.member = member
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self.size - self.position if size is None or size < 0 else size
+        chunks = []
+        while remaining > 0 and self.position < self.size:
+            member, local = divmod(self.position, MEMBER_SIZE)
+            if member != self.member:
+                self._load(member)
+            chunk = self.data[local:local + remaining]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.position += len(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        self.data = b""
+        super().close()
+
+
+def _unlink_sidecars(segment: Path) -> int:
+    """Borra los índices de un segmento borrado. Retorna los bytes liberados"""
+    parsed = _parse_segment(segment.name)
+    if parsed is None:
+        return 0
+    freed = 0
+    for suffix in SIDECARS:
+        sidecar = segment.with_name(f"{parsed[0]:012d}-{parsed[1]:012d}{suffix}")
+        try:
+            size = sidecar.stat().st_size
+            sidecar.unlink()
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+class LogSegments:
+    """
+    Rotación y lectura de los logs de jobs a través de sus segmentos.
+    - rotate(): renombra el archivo vivo a un segmento (O(1), bajo el lock del writer)
+    - un thread comprime los segmentos en segundo plano y aplica la cuota global
+    - read_tail()/read_forward(): páginas de líneas en offsets lógicos, cruzando
+      segmentos comprimidos y el archivo vivo sin que el cliente lo note
+    """
+
+    def __init__(self, log_dir: str = "", compression: str = "", max_total_mb: Optional[int] = None):
+        self.log_dir = Path(log_dir or settings.log_dir)
+        self.rotated_dir = self.log_dir / "rotated"
+        self.compression = compression or settings.log_compression
+        if self.compression == "zstd" and zstandard is None:
+            logging.warning("zstandard no está instalado: los segmentos se comprimen con gzip")
+            self.compression = "gzip"
+        self.max_total_bytes = (settings.log_max_total_mb if max_total_mb is None else max_total_mb) * 1024 * 1024
+        self.quota_interval = 30.0  # segundos entre chequeos de la cuota sin rotaciones
+
+        self._pending: "queue.Queue[Optional[Path]]" = queue.Queue()  # segmentos a comprimir
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ---- layout ---------------------------------------------------------
+
+    def live_path(self, job_id: str) -> Path:
+        return self.log_dir / f"{job_id}.log"
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.rotated_dir / job_id
+
+    def live_sidecar_path(self, job_id: str, suffix: str) -> Path:
+        return self.log_dir / f"{job_id}{suffix}"
+
+    def sidecar_path(self, part: Segment, suffix: str) -> Path:
+        """Índice (`suffix`, uno de SIDECARS) del tramo: el mismo antes y después de comprimirlo"""
+        if part.path.parent == self.log_dir:
+            return part.path.with_suffix(suffix)
+        return part.path.with_name(f"{part.start:012d}-{part.end:012d}{suffix}")
+
+    def segments(self, job_id: str) -> List[Segment]:
+        """Segmentos rotados del job ordenados por offset (si un segmento está
+        comprimido y sin comprimir a la vez, se usa el que no lo está)"""
+        try:
+            names = os.listdir(self.job_dir(job_id))
+        except FileNotFoundError:
+            return []
+
+        by_start: Dict[int, Segment] = {}
+        for name in names:
+            parsed = _parse_segment(name)
+            if parsed is None:
+                continue
+            start, end, ext = parsed
+            current = by_start.get(start)
+            if current is None or (current.compressed and not ext):
+                by_start[start] = Segment(start, end, self.job_dir(job_id) / name)
+        return [by_start[start] for start in sorted(by_start)]
+
+    def live_base(self, job_id: str) -> int:
+        """Offset lógico donde empieza el archivo vivo (fin del último segmento)"""
+        segments = self.segments(job_id)
+        return segments[-1].end if segments else 0
+
+    def exists(self, job_id: str) -> bool:
+        return self.live_path(job_id).exists() or self.job_dir(job_id).exists()
+
+    # ---- rotación -------------------------------------------------------
+
+    def rotate(self, job_id: str, base: int) -> int:
+        """
+        Convierte el archivo vivo (y su índice) en el segmento [base, base + tamaño)
+        y lo encola para comprimir. Lo llama el LogWriter con el archivo vivo
+        cerrado y el bloque en curso del índice ya persistido.
+
+        Returns:
+            Nuevo offset base del archivo vivo
+        """
+        live = self.live_path(job_id)
+        try:
+            size = live.stat().st_size
+        except FileNotFoundError:
+            return base
+        if size == 0:
+            return base
+
+        end = base + size
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        segment = job_dir / f"{base:012d}-{end:012d}.log"
+        for suffix in SIDECARS:
+            try:
+                os.rename(self.live_sidecar_path(job_id, suffix), job_dir / f"{base:012d}-{end:012d}{suffix}")
+            except FileNotFoundError:
+                pass
+        os.rename(live, segment)
+        self._enqueue(segment)
+        return end
+
+    def start(self):
+        """Arranca el thread de compresión/cuota (idempotente)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="log-compress", daemon=True)
+            self._thread.start()
+        # segmentos que quedaron sin comprimir (reinicio a mitad de una compresión)
+        if self.rotated_dir.exists():
+            for path in self.rotated_dir.glob("*/*.log"):
+                self._pending.put(path)
+
+    def _enqueue(self, segment: Path):
+        if self._thread is None:
+            self.start()
+        self._pending.put(segment)
+
+    def _run(self):
+        while True:
+            try:
+                segment = self._pending.get(timeout=self.quota_interval)
+            except queue.Empty:
+                self.enforce_quota()
+                continue
+            if segment is None:  # shutdown
+                return
+            try:
+                self._compress(segment)
+            except Exception as e:
+                logging.error(f"Error comprimiendo {segment}: {e}")
+            if self._pending.empty():
+                self.enforce_quota()
+
+    def _compress(self, segment: Path):
+        ext = CODECS.get(self.compression)
+        if ext is None or not segment.exists():
+            return
+        target = segment.with_name(segment.name + ext)
+        tmp = segment.with_name(segment.name + ext + ".tmp")
+        offsets: List[int] = []
+        with open(segment, "rb") as src, open(tmp, "wb") as dst:
+            compressor = zstandard.ZstdCompressor(level=3) if ext == ".zst" else None
+            while chunk := src.read(MEMBER_SIZE):
+                offsets.append(dst.tell())
+                if compressor is None:
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6, mtime=0) as gz:
+                        gz.write(chunk)
+                else:
+                    dst.write(compressor.compress(chunk))
+        start, end, _ = _parse_segment(segment.name)
+        seek = segment.with_name(f"{start:012d}-{end:012d}.seek")
+        seek.write_bytes(b"".join(MEMBER_OFFSET.pack(offset) for offset in offsets))
+        # primero aparece el comprimido (con su `.seek`) y después se borra el
+        # original: un lector concurrente siempre encuentra el segmento en alguna forma
+        os.rename(tmp, target)
+        segment.unlink()
+
+    # ---- cuota y retención ----------------------------------------------
+
+    def disk_usage(self) -> Tuple[int, List[Tuple[float, int, Path]]]:
+        """
+        Bytes usados en log_dir y los segmentos que se pueden borrar
+        (mtime, tamaño, ruta). El segmento más nuevo de cada job no se
+        incluye: fija el offset base del archivo vivo.
+        """
+        total = 0
+        deletable: List[Tuple[float, int, Path]] = []
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat().st_size
+        if not self.rotated_dir.exists():
+            return total, deletable
+        with os.scandir(self.rotated_dir) as job_dirs:
+            for job_dir in job_dirs:
+                if not job_dir.is_dir(follow_symlinks=False):
+                    continue
+                files = []
+                with os.scandir(job_dir.path) as entries:
+                    for entry in entries:
+                        st = entry.stat()
+                        total += st.st_size
+                        if _parse_segment(entry.name) is not None:
+                            files.append((entry.name, st))
+                files.sort()
+                for name, st in files[:-1]:
+                    deletable.append((st.st_mtime, st.st_size, Path(job_dir.path) / name))
+        return total, deletable
+
+    def enforce_quota(self) -> int:
+        """Borra los segmentos más viejos hasta quedar bajo la cuota. Retorna los bytes liberados"""
+        if self.max_total_bytes <= 0 or not self.log_dir.exists():
+            return 0
+        total, deletable = self.disk_usage()
+        if total <= self.max_total_bytes:
+            return 0
+        freed = 0
+        deletable.sort()
+        for _, size, path in deletable:
+            if total - freed <= self.max_total_bytes:
+                break
+            try:
+                path.unlink()
+                freed += size
+            except FileNotFoundError:
+                pass
+            freed += _unlink_sidecars(path)
+        if total - freed > self.max_total_bytes:
+            logging.warning(
+                f"Logs por encima de la cuota ({(total - freed) // 2**20} MB): "
+                "solo quedan archivos vivos y el último segmento de cada job"
+            )
+        return freed
+
+    def delete(self, job_id: str) -> bool:
+        """Borra el archivo vivo y los segmentos de un job"""
+        found = False
+        try:
+            self.live_path(job_id).unlink()
+            found = True
+        except FileNotFoundError:
+            pass
+        for suffix in SIDECARS:
+            self.live_sidecar_path(job_id, suffix).unlink(missing_ok=True)
+        job_dir = self.job_dir(job_id)
+        if job_dir.exists():
+            for path in job_dir.iterdir():
+                path.unlink(missing_ok=True)
+            job_dir.rmdir()
+            found = True
+        return found
+
+    def cleanup(self, cutoff: float) -> int:
+        """Borra segmentos (y directorios de jobs vacíos) modificados antes de `cutoff`"""
+        removed = 0
+        if not self.rotated_dir.exists():
+            return removed
+        for job_dir in self.rotated_dir.iterdir():
+            if not job_dir.is_dir():
+                continue
+            paths = sorted(p for p in job_dir.iterdir() if _parse_segment(p.name) is not None)
+            if self.live_path(job_dir.name).exists():
+                paths = paths[:-1]  # con el archivo vivo presente se conserva su segmento base
+            for path in paths:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                    _unlink_sidecars(path)
+                    removed += 1
+            if not any(job_dir.iterdir()):
+                job_dir.rmdir()
+        return removed
+
+    def shutdown(self):
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join(timeout=10)
+
+    # ---- lectura ----------------------------------------------------------
+
+    def parts(self, job_id: str) -> List[Segment]:
+        """
+        Tramos del log del job en orden: segmentos + archivo vivo (si existe).
+        Para leerlos: open_part, dentro de read_parts (reintenta si un tramo
+        cambia entre el listado y la lectura), o iter_parts.
+        """
+        parts = self.segments(job_id)
+        live = self.live_path(job_id)
+        base = parts[-1].end if parts else 0
+        try:
+            size = live.stat().st_size
+        except FileNotFoundError:
+            return parts
+        parts.append(Segment(base, base + size, live))
+        return parts
+
+    def open_part(self, part: Segment) -> Tuple[BinaryIO, int]:
+        """Archivo del tramo (los comprimidos se descomprimen al leer) y su tamaño actual"""
+        if not part.compressed:
+            f = open(part.path, "rb")
+            return f, os.fstat(f.fileno()).st_size
+
+        size = part.end - part.start
+        try:
+            table = self.sidecar_path(part, ".seek").read_bytes()
+        except FileNotFoundError:
+            table = b""
+        offsets = [offset for (offset,) in MEMBER_OFFSET.iter_unpack(table)]
+        if len(offsets) == -(-size // MEMBER_SIZE):
+            return _MemberReader(part.path, offsets, size), size
+        # sin `.seek` (comprimido en un solo miembro): gzip descomprime en streaming al hacer seek
+        if part.path.suffix == ".gz":
+            return gzip.open(part.path, "rb"), size
+        return io.BytesIO(_decompress(part.path)), size
+
+    def read_parts(self, job_id: str, read: Callable[[List[Segment]], T]) -> T:
+        """
+        Llama read(parts(job_id)), volviendo a listar si un segmento se comprime
+        (o se borra por cuota) entre el listado y la lectura (FileNotFoundError)
+        """
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                return read(self.parts(job_id))
+            except FileNotFoundError:
+                if attempt == READ_ATTEMPTS - 1:
+                    raise
+
+    def iter_parts(self, job_id: str, since: Optional[float] = None) -> Iterator[Tuple[Segment, BinaryIO, int]]:
+        """
+        Recorre los tramos del log abiertos, en orden: (tramo, archivo, tamaño).
+        Si un tramo cambia antes de abrirlo se vuelve a listar desde el mismo
+        offset; cada archivo se cierra al pasar al siguiente.
+
+        Args:
+            since: Solo tramos modificados desde este Unix timestamp
+        """
+        position = 0  # offset lógico del próximo tramo
+        attempts = 0
+        while True:
+            for part in self.parts(job_id):
+                if part.start < position:
+                    continue
+                try:
+                    if since is not None and part.path.stat().st_mtime < since:
+                        position = part.end
+                        continue
+                    f, size = self.open_part(part)
+                except FileNotFoundError:
+                    attempts += 1
+                    if attempts >= READ_ATTEMPTS:
+                        attempts = 0
+                        position = part.end  # sigue sin aparecer: se borró
+                    break
+                with f:
+                    yield part, f, size
+                position = part.end
+                attempts = 0
+            else:
+                return
+
+    def read_tail(self, job_id: str, lines: int, end: Optional[int] = None) -> Optional[Dict]:
+        """
+        Últimas `lines` líneas que terminan antes de `end` (offset lógico),
+        retrocediendo por los segmentos si hace falta
+
+        Returns:
+            {"lines", "start", "end", "size", "first"} o None si el job no tiene log
+            (`first`: offset más viejo disponible, lo anterior se borró por cuota/retención)
+        """
+        def read(parts: List[Segment]) -> Optional[Dict]:
+            if not parts:
+                return None
+            size = parts[-1].end
+            stop = size if end is None else min(end, size)
+
+            collected: List[str] = []
+            start = stop
+            for part in reversed(parts):
+                if part.start >= start:
+                    continue
+                f, part_size = self.open_part(part)
+                with f:
+                    local_end = min(start - part.start, part_size)
+                    page, local_start, _ = read_tail(f, lines - len(collected), local_end)
+                collected = page + collected
+                start = part.start + local_start
+                if len(collected) >= lines or local_start > 0:
+                    break
+            return {"lines": collected, "start": start, "end": stop, "size": size, "first": parts[0].start}
+
+        return self.read_parts(job_id, read)
+
+    def read_forward(self, job_id: str, lines: int, start: int) -> Optional[Dict]:
+        """
+        Hasta `lines` líneas completas desde `start` (offset lógico), avanzando
+        por los segmentos y el archivo vivo
+
+        Returns:
+            {"lines", "start", "end", "size", "first"} o None si el job no tiene log
+            (`first`: offset más viejo disponible, lo anterior se borró por cuota/retención)
+        """
+        def read(parts: List[Segment]) -> Optional[Dict]:
+            if not parts:
+                return None
+            collected: List[str] = []
+            first: Optional[int] = None
+            position = start
+            size = parts[-1].end
+            for part in parts:
+                if position >= part.end and part is not parts[-1]:
+                    continue
+                position = max(position, part.start)  # lo anterior se borró (cuota/retención)
+                f, part_size = self.open_part(part)
+                with f:
+                    if part is parts[-1]:
+                        size = part.start + part_size
+                    local_start = min(position - part.start, part_size)
+                    page, _, local_end = read_forward(f, lines - len(collected), local_start, part_size)
+                if page and first is None:
+                    first = part.start + local_start
+                collected.extend(page)
+                position = part.start + local_end
+                if len(collected) >= lines or local_end < part_size:
+                    break  # página completa o línea a medio escribir en el archivo vivo
+            return {
+                "lines": collected,
+                "start": position if first is None else first,
+                "end": position,
+                "size": size,
+                "first": parts[0].start,
+            }
+
+        return self.read_parts(job_id, read)
+
+    def read_bytes(self, job_id: str, start: int, end: int) -> bytes:
+        """Bytes crudos del rango lógico [start, end) (seguimiento en vivo a través de una rotación)"""
+        def read(parts: List[Segment]) -> bytes:
+            chunks = []
+            for part in parts:
+                if part.end <= start or part.start >= end:
+                    continue
+                f, _ = self.open_part(part)
+                with f:
+                    f.seek(max(start - part.start, 0))
+                    chunks.append(f.read(min(end, part.end) - max(start, part.start)))
+            return b"".join(chunks)
+
+        return self.read_parts(job_id, read)
+
+
+# Instancia global
+log_segments = LogSegments()
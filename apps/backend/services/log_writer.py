@@ -0,0 +1,268 @@
+"""
+Escritura asíncrona de los logs de jobs (un thread, escrituras en lote)
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.log_index import LogIndexer
+from services.log_lines import LineIndexer, live_started_at
+from services.log_segments import LogSegments, log_segments
+
+
+class _LogFile:
+    """Archivo vivo abierto de un job"""
+    __slots__ = ("fd", "base", "size", "created_at")
+
+    def __init__(self, fd: int, base: int, size: int, created_at: float):
+        self.fd = fd
+        self.base = base  # offset lógico del inicio del archivo vivo
+        self.size = size
+        # para la rotación por antigüedad: desde la primera línea del archivo,
+        # no desde que se abrió (un desalojo del pool o un reinicio no la reinician)
+        self.created_at = created_at
+
+
+class LogWriter:
+    """
+    Único escritor de los logs de jobs.
+    - los productores (API, thread de drenado) solo encolan bytes ya formateados
+    - el thread agrupa por job y escribe cada cierto tiempo (flush_interval) o
+      al juntar flush_bytes: un write por job por lote
+    - los FDs abiertos viven en un pool LRU acotado (max_open_files); un job
+      desalojado se reabre en modo append en su próxima escritura, así la
+      memoria y los descriptores no crecen con la cantidad de jobs
+    - la rotación por tamaño/antigüedad ocurre acá, sin locks: nadie más escribe
+    - los índices de búsqueda (LogIndexer) y de líneas/tiempo (LineIndexer) se
+      arman con los mismos bytes al escribirlos
+    La salida de los procesos (write, desde el thread de drenado) ocupa a lo
+    sumo queue_size lugares de la cola: si el disco no da abasto, el drenado
+    espera (backpressure) en vez de acumular memoria. Los registros del ciclo de
+    vida del job (record) y los cierres no ocupan lugar: son pocos por job, no
+    esperan (se llaman desde el event loop) y nunca se descartan.
+    """
+
+    def __init__(self, segments: Optional[LogSegments] = None, max_open_files: int = 256,
+                 flush_interval: float = 0.2, flush_bytes: int = 256 * 1024, queue_size: int = 10000,
+                 max_bytes: int = 0, max_age: float = 0, index: bool = True, line_interval: int = 1000):
+        self.segments = segments or log_segments
+        self.max_open_files = max_open_files
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.indexer = LogIndexer(self.segments) if index else None
+        self.lines = LineIndexer(self.segments, line_interval)
+        self.queue: "queue.Queue[Tuple]" = queue.Queue()
+        self.slots = threading.Semaphore(queue_size)  # lugares para la salida de los procesos
+
+        # Solo el thread escritor toca lo siguiente
+        self.open_files: "OrderedDict[str, _LogFile]" = OrderedDict()  # pool LRU de FDs
+        self.buffers: Dict[str, List[bytes]] = {}  # pendientes de escribir por job
+        self.buffered = 0
+        self.deadline: Optional[float] = None  # flush por tiempo del lote actual
+        self.bytes_written = 0
+        self.evictions = 0
+
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # ---- productores ------------------------------------------------------
+
+    def write(self, job_id: str, data: bytes):
+        """
+        Encola salida de un proceso (líneas ya formateadas, terminadas en \\n)
+        para el log de un job; espera si la cola está llena
+        """
+        self._ensure_thread()
+        self.slots.acquire()
+        self.queue.put(("write", job_id, data))
+
+    def record(self, job_id: str, data: bytes):
+        """Encola un registro del ciclo de vida del job (no espera ni se descarta)"""
+        self._ensure_thread()
+        self.queue.put(("record", job_id, data))
+
+    def close(self, job_id: str):
+        """Escribe lo pendiente del job y libera su FD (el job terminó); no espera"""
+        self._ensure_thread()
+        self.queue.put(("close", job_id, None))
+
+    def forget(self, job_id: str, timeout: float = 5.0):
+        """Descarta lo pendiente del job y cierra su FD (antes de borrar el log)"""
+        self._call("forget", job_id, timeout)
+
+    def flush(self, timeout: float = 5.0):
+        """Espera a que todo lo encolado hasta ahora esté en disco (lecturas consistentes)"""
+        if self._thread is None:
+            return
+        self._call("flush", None, timeout)
+
+    def _call(self, command: str, job_id: Optional[str], timeout: float):
+        self._ensure_thread()
+        done = threading.Event()
+        self.queue.put((command, job_id, done))
+        done.wait(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.queue.qsize(),
+            "open_files": len(self.open_files),
+            "max_open_files": self.max_open_files,
+            "buffered_bytes": self.buffered,
+            "bytes_written": self.bytes_written,
+            "evictions": self.evictions,
+        }
+
+    # ---- thread escritor ----------------------------------------------------
+
+    def _run(self):
+        while True:
+            timeout = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+            try:
+                command, job_id, arg = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_all()
+                continue
+
+            if command == "write":
+                self.slots.release()
+            try:
+                if command in ("write", "record"):
+                    self._buffer(job_id, arg)
+                elif command == "close":
+                    self._flush_job(job_id)
+                    self._close(job_id)
+                elif command == "forget":
+                    self.buffered -= sum(len(chunk) for chunk in self.buffers.pop(job_id, ()))
+                    if self.indexer is not None:
+                        self.indexer.forget(job_id)
+                    self.lines.release(job_id)
+                    self._close(job_id)
+                elif command == "flush":
+                    self._flush_all()
+                elif command == "stop":
+                    self._flush_all()
+                    for job_id in list(self.open_files):
+                        self._close(job_id)
+                    return
+            except Exception as e:
+                logging.error(f"Error escribiendo el log de {job_id}: {e}")
+            finally:
+                if isinstance(arg, threading.Event):
+                    arg.set()
+
+    def _buffer(self, job_id: str, data: bytes):
+        self.buffers.setdefault(job_id, []).append(data)
+        self.buffered += len(data)
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.flush_interval
+        if self.buffered >= self.flush_bytes:
+            self._flush_all()
+
+    def _flush_all(self):
+        buffers, self.buffers = self.buffers, {}
+        self.buffered = 0
+        self.deadline = None
+        for job_id, chunks in buffers.items():
+            try:
+                self._write(job_id, b"".join(chunks))
+            except OSError as e:
+                logging.error(f"Error escribiendo el log de {job_id}: {e}")
+
+    def _flush_job(self, job_id: str):
+        chunks = self.buffers.pop(job_id, None)
+        if chunks:
+            data = b"".join(chunks)
+            self.buffered -= len(data)
+            self._write(job_id, data)
+
+    def _write(self, job_id: str, data: bytes):
+        log = self._open(job_id)
+        if log.size and self.max_age and time.time() - log.created_at >= self.max_age:
+            log = self._rotate(job_id, log)
+
+        view = memoryview(data)
+        while view:
+            piece = view
+            if self.max_bytes:
+                if log.size and log.size + len(view) > self.max_bytes:
+                    log = self._rotate(job_id, log)
+                if len(view) > self.max_bytes:
+                    # lote más grande que un segmento: cortar en un fin de línea
+                    cut = data.rfind(b"\n", len(data) - len(view), len(data) - len(view) + self.max_bytes)
+                    if cut != -1:
+                        piece = view[:cut + 1 - (len(data) - len(view))]
+            self._write_all(job_id, log, piece)
+            view = view[len(piece):]
+
+    def _write_all(self, job_id: str, log: _LogFile, data: memoryview):
+        size = len(data)
+        chunk = data.tobytes()
+        while data:
+            written = os.write(log.fd, data)
+            data = data[written:]
+        self.lines.add(job_id, log.size, chunk)
+        if self.indexer is not None:
+            self.indexer.add(job_id, log.size, chunk)
+        log.size += size
+        self.bytes_written += size
+
+    def _open(self, job_id: str) -> _LogFile:
+        log = self.open_files.get(job_id)
+        if log is not None:
+            self.open_files.move_to_end(job_id)
+            return log
+
+        while len(self.open_files) >= self.max_open_files:
+            evicted_id, evicted = self.open_files.popitem(last=False)
+            if self.indexer is not None:
+                self.indexer.finish(evicted_id)
+            self.lines.release(evicted_id)
+            os.close(evicted.fd)
+            self.evictions += 1
+
+        path = self.segments.live_path(job_id)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o644)
+        size = os.fstat(fd).st_size
+        created_at = (live_started_at(self.segments, job_id) if size else None) or time.time()
+        log = _LogFile(fd, self.segments.live_base(job_id), size, created_at)
+        self.open_files[job_id] = log
+        return log
+
+    def _rotate(self, job_id: str, log: _LogFile) -> _LogFile:
+        """Pasa el archivo vivo a un segmento y abre uno nuevo"""
+        del self.open_files[job_id]
+        os.close(log.fd)
+        if self.indexer is not None:
+            self.indexer.finish(job_id)
+        self.lines.seal(job_id, log.size)
+        self.segments.rotate(job_id, log.base)
+        return self._open(job_id)
+
+    def _close(self, job_id: str):
+        log = self.open_files.pop(job_id, None)
+        if log is not None:
+            if self.indexer is not None:
+                self.indexer.finish(job_id)
+            self.lines.release(job_id)
+            os.close(log.fd)
+
+    def shutdown(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self.queue.put(("stop", None, None))
+        self._thread.join(timeout=timeout)
+        self._thread = None
@@ -2,73 +2,93 @@
 Sistema de logging por job
 """
 import logging
-import os
+import math
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterator, List, Optional
 from config import settings
+from services.log_index import LogSearcher
+from services.log_lines import LineIndex
+from services.log_segments import SIDECARS, LogSegments, log_segments
+from services.log_writer import LogWriter
 
 
 class JobLogger:
-    """Manejador de logs individuales por job"""
+    """
+    Manejador de logs individuales por job.
+    Las líneas se formatean acá y se escriben desde un único thread (LogWriter):
+    registrar un evento no hace I/O en el request ni en el drenado de salida.
+    """
     
-    def __init__(self, log_dir: str = ""):
+    def __init__(self, log_dir: str = "", segments: Optional[LogSegments] = None):
         self.log_dir = Path(log_dir or settings.log_dir)
         self.log_dir.mkdir(exist_ok=True, parents=True)
-        self.loggers = {}
+        self.segments = segments or log_segments
+        self.writer = LogWriter(
+            self.segments,
+            max_open_files=settings.log_max_open_files,
+            flush_interval=settings.log_flush_interval,
+            flush_bytes=settings.log_flush_bytes,
+            max_bytes=settings.log_max_bytes,
+            max_age=settings.log_max_age,
+            index=settings.log_search_index,
+            line_interval=settings.log_line_index_interval
+        )
+        self.searcher = LogSearcher(self.segments)
+        self.line_index = LineIndex(self.segments)
     
-    def get_logger(self, job_id: str) -> logging.Logger:
+    def _log(self, job_id: str, level: str, message: str):
         """
-        Obtiene o crea un logger para un job específico
-        
-        Args:
-            job_id: ID del job
-            
-        Returns:
-            Logger configurado para el job
+        Encola un registro con el formato '<fecha> - job.<id> - <NIVEL> - <mensaje>'
+        (sin esperar ni descartarse: se llama también desde el event loop)
         """
-        if job_id in self.loggers:
-            return self.loggers[job_id]
-        
-        # Crear logger
-        logger = logging.getLogger(f"job.{job_id}")
-        logger.setLevel(logging.DEBUG)
-        
-        # Evitar duplicados
-        if logger.handlers:
-            return logger
-        
-        # Archivo de log para este job
-        log_file = self.log_dir / f"{job_id}.log"
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Formato
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        file_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        self.loggers[job_id] = logger
-        
-        return logger
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.writer.record(job_id, f"{timestamp} - job.{job_id} - {level} - {message}\n".encode("utf-8"))
     
     def log_job_start(self, job_id: str, command: list, pid: int):
         """Registra el inicio de un job"""
-        logger = self.get_logger(job_id)
-        logger.info(f"Job iniciado - PID: {pid} - Comando: {' '.join(command)}")
+        self._log(job_id, "INFO", f"Job iniciado - PID: {pid} - Comando: {' '.join(command)}")
     
     def log_job_end(self, job_id: str, pid: int, exit_code: Optional[int] = None):
         """Registra la finalización de un job"""
-        logger = self.get_logger(job_id)
-        logger.info(f"Job finalizado - PID: {pid} - Exit Code: {exit_code}")
+        self._log(job_id, "INFO", f"Job finalizado - PID: {pid} - Exit Code: {exit_code}")
     
     def log_job_error(self, job_id: str, error: str):
         """Registra un error del job"""
-        logger = self.get_logger(job_id)
-        logger.error(f"Error: {error}")
+        self._log(job_id, "ERROR", f"Error: {error}")
+    
+    def log_job_output(self, job_id: str, stream: str, lines: List[str]):
+        """
+        Registra salida del proceso (stdout/stderr) en el log del job
+        
+        Args:
+            job_id: ID del job
+            stream: Nombre del stream ("stdout" o "stderr")
+            lines: Líneas leídas del pipe (sin salto de línea)
+        """
+        # Un solo bloque por lectura, con el mismo formato que los registros del job
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        prefix = f"{timestamp} - job.{job_id} - {stream.upper()} - "
+        text = "".join(f"{prefix}{line}\n" for line in lines)
+        self.writer.write(job_id, text.encode("utf-8"))
+    
+    def close_job_log(self, job_id: str):
+        """
+        Libera el archivo abierto del log de un job que terminó
+        (si llega otra línea, se reabre en modo append)
+        
+        Args:
+            job_id: ID del job
+        """
+        self.writer.close(job_id)
+    
+    def flush(self):
+        """Espera a que lo registrado hasta ahora esté escrito en disco"""
+        self.writer.flush()
+    
+    def shutdown(self):
+        """Escribe lo pendiente y cierra los archivos abiertos"""
+        self.writer.shutdown()
     
     def get_job_logs(self, job_id: str, lines: int = 100) -> list:
         """
@@ -81,17 +101,120 @@ class JobLogger:
         Returns:
             Lista de líneas del log
         """
-        log_file = self.log_dir / f"{job_id}.log"
-        
-        if not log_file.exists():
-            return []
-        
         try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                return all_lines[-lines:] if len(all_lines) > lines else all_lines
+            result = self.read_job_logs(job_id, lines=lines)
         except Exception as e:
             return [f"Error leyendo logs: {str(e)}"]
+        
+        if result is None:
+            return []
+        return [f"{line}\n" for line in result["lines"]]
+    
+    def read_job_logs(
+        self,
+        job_id: str,
+        lines: int = 100,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Lee una página de líneas del log sin recorrer el archivo completo
+        (cruza los segmentos rotados y el archivo vivo de forma transparente)
+        
+        Args:
+            job_id: ID del job
+            lines: Número de líneas a leer
+            before: Offset lógico en bytes; lee las N líneas anteriores (página hacia atrás)
+            after: Offset lógico en bytes; lee las N líneas siguientes (página hacia adelante)
+            
+        Returns:
+            Diccionario con "lines", "start", "end" (offsets lógicos), "size" y
+            "first" (offset más viejo que se conserva), o None si el job no tiene log
+        """
+        if after is not None:
+            return self.segments.read_forward(job_id, lines, after)
+        return self.segments.read_tail(job_id, lines, before)
+    
+    def read_job_log_range(
+        self,
+        job_id: str,
+        lines: int = 100,
+        from_line: Optional[int] = None,
+        to_line: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Lee una página de líneas por número de línea o por fecha, ubicando el
+        rango con el índice de líneas/tiempo (búsqueda binaria, sin recorrer el log)
+        
+        Args:
+            job_id: ID del job
+            lines: Máximo de líneas a leer
+            from_line: Primera línea (desde 1); sin to_line lee `lines` líneas desde ahí
+            to_line: Última línea (inclusive); sin from_line lee las `lines` anteriores
+            since: Unix timestamp; desde la primera línea con fecha >= since
+            until: Unix timestamp; hasta la última línea con fecha <= until
+            
+        Returns:
+            Lo mismo que read_job_logs más "first_line" (número de la primera
+            línea retornada, None si no se conoce), o None si el job no tiene log
+        """
+        self.flush()  # el índice tiene que cubrir lo registrado hasta ahora
+        index = self.line_index
+        
+        end = None
+        if to_line is not None:
+            end = index.offset_of_line(job_id, to_line)
+        elif until is not None:
+            # las fechas del log son al segundo: la primera línea posterior a `until`
+            end = index.offset_of_time(job_id, math.floor(until) + 1)
+        
+        if from_line is None and since is None:
+            if end is None:
+                return None
+            result = self.segments.read_tail(job_id, lines, end)
+        else:
+            if from_line is not None:
+                start = index.offset_of_line(job_id, from_line - 1)
+            else:
+                start = index.offset_of_time(job_id, since)
+            if start is None:
+                return None
+            count = lines
+            if end is not None:
+                first, last = index.line_at(job_id, start), index.line_at(job_id, end)
+                if first is not None and last is not None:
+                    count = max(0, min(lines, last - first))
+            result = self.segments.read_forward(job_id, count, start)
+        
+        if result is not None:
+            first_line = index.line_at(job_id, result["start"])
+            result["first_line"] = first_line + 1 if first_line is not None else None
+        return result
+    
+    def delete_job_logs(self, job_id: str) -> bool:
+        """
+        Elimina el log de un job (archivo vivo y segmentos rotados)
+        
+        Returns:
+            False si el job no tenía logs
+        """
+        self.writer.forget(job_id)
+        return self.segments.delete(job_id)
+    
+    def search_logs(self, q: str, **kwargs) -> Iterator[Dict]:
+        """
+        Busca en los logs usando el índice por bloques (ver LogSearcher.search)
+    
+        Args:
+            q: Texto (o regex con regex=True) a buscar
+    
+        Returns:
+            Iterador de coincidencias {"job_id", "offset", "timestamp", "line"}
+        """
+        self.flush()  # lo encolado hasta ahora también se encuentra
+        return self.searcher.search(q, **kwargs)
     
     def cleanup_old_logs(self, days: int = 0):
         """
@@ -106,9 +229,17 @@ class JobLogger:
         for log_file in self.log_dir.glob("*.log"):
             if log_file.stat().st_mtime < cutoff_time:
                 try:
+                    # el writer descarta lo pendiente y cierra el FD: si no, seguiría
+                    # escribiendo en el archivo borrado (o lo recrearía sin su base)
+                    self.writer.forget(log_file.stem)
                     log_file.unlink()
+                    for suffix in SIDECARS:
+                        log_file.with_suffix(suffix).unlink(missing_ok=True)
                 except Exception as e:
                     logging.error(f"Error eliminando log {log_file}: {e}")
+        
+        # Segmentos rotados (comprimidos) con la misma retención
+        self.segments.cleanup(cutoff_time)
 
 
 # Instancia global
@@ -1,23 +1,229 @@
 """
 Recolector de métricas del sistema y procesos
 """
+import math
 import psutil
+import threading
 import time
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from datetime import datetime
+
+from config import settings
+from core.job_monitor import sample_process
+from services.ring_buffer import TieredHistory
+
+
+# Columnas del historial de procesos (el nombre se guarda aparte, una vez por PID)
+PROCESS_COLUMNS = [
+    "cpu_percent", "rss_mb", "vms_mb", "num_threads", "create_time",
+    "status", "io_read_bytes", "io_write_bytes",
+]
+
+# Los estados de psutil se guardan como índice en esta lista
+PROCESS_STATUSES = [
+    psutil.STATUS_RUNNING, psutil.STATUS_SLEEPING, psutil.STATUS_DISK_SLEEP,
+    psutil.STATUS_STOPPED, psutil.STATUS_TRACING_STOP, psutil.STATUS_ZOMBIE,
+    psutil.STATUS_DEAD, psutil.STATUS_WAKING, psutil.STATUS_IDLE,
+    psutil.STATUS_LOCKED, psutil.STATUS_WAITING, psutil.STATUS_PARKED,
+]
+_STATUS_CODES = {status: i for i, status in enumerate(PROCESS_STATUSES)}
+
+NAN = float("nan")
+
+# Handles de psutil cacheados para PIDs no orquestados (consultas bajo demanda)
+ON_DEMAND_CACHE_SIZE = 256
+
+# Campos que no aplican a min/max de un bucket
+_NON_RANGE_FIELDS = {"timestamp", "datetime", "pid", "name", "status", "create_time"}
+
+
+def _range_only(point: Dict) -> Dict:
+    return {k: v for k, v in point.items() if k not in _NON_RANGE_FIELDS}
 
 
 class MetricsCollector:
     """Colecta y almacena métricas históricas del sistema"""
     
-    def __init__(self, history_size: int = 1000):
+    def __init__(self, history_size: int = 1000, keep_finished: int = 100):
         """
         Args:
-            history_size: Número máximo de puntos históricos a mantener
+            history_size: Número máximo de puntos históricos a mantener (sistema y por proceso)
+            keep_finished: Procesos terminados cuyo historial se sigue conservando
         """
         self.history_size = history_size
-        self.system_history: List[Dict] = []
-        self.process_history: Dict[int, List[Dict]] = {}
+        self.keep_finished = keep_finished
+        self.cpu_count = psutil.cpu_count() or 1
+        self.system_columns = [
+            "cpu_percent", "cpu_count",
+            *[f"per_cpu_{i}" for i in range(self.cpu_count)],
+            "mem_total_mb", "mem_available_mb", "mem_used_mb", "mem_percent",
+            "disk_total_gb", "disk_used_gb", "disk_free_gb", "disk_percent",
+            "net_bytes_sent", "net_bytes_recv", "net_packets_sent", "net_packets_recv",
+        ]
+        self.system_history = TieredHistory(history_size, self.system_columns, last_columns=["cpu_count"])
+        self.process_history: Dict[int, TieredHistory] = {}
+        self.process_names: Dict[int, str] = {}
+        self._on_demand: Dict[int, psutil.Process] = {}
+        # PID -> momento en que terminó, del más viejo al más nuevo
+        self.finished: "OrderedDict[int, float]" = OrderedDict()
+        
+        # Sampler en background: publica el último snapshot (nunca se modifica
+        # después de publicado, se reemplaza la referencia)
+        self.latest_system: Optional[Dict] = None
+        self.lock = threading.Lock()  # protege los historiales (sampler vs. requests)
+        self.running = False
+        self._wakeup = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.listeners: List[Callable[[Dict], None]] = []
+        # Cambia con cada muestra del sistema y cuando aparece/desaparece un proceso (ETag de /metrics/summary)
+        self.version = 0
+    
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """
+        Registra un callback que recibe cada snapshot del sistema
+        (se llama desde el thread del sampler)
+        """
+        self.listeners.append(callback)
+    
+    def start(self, interval: float = 1.0):
+        """
+        Arranca el sampler de métricas del sistema en background
+        
+        Args:
+            interval: Segundos entre muestras
+        """
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        self.running = True
+        self._wakeup.clear()
+        psutil.cpu_percent(interval=None)  # primer llamado: inicializa los contadores
+        psutil.cpu_percent(interval=None, percpu=True)
+        self._sampler = threading.Thread(
+            target=self._sample_loop, args=(interval,), name="system-sampler", daemon=True
+        )
+        self._sampler.start()
+    
+    def _sample_loop(self, interval: float):
+        next_tick = time.monotonic()
+        while self.running:
+            try:
+                metrics = self.collect_system_metrics()
+                for callback in self.listeners:
+                    callback(metrics)
+            except Exception:
+                pass  # un fallo puntual (psutil o listener) no debe detener el sampler
+            
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._wakeup.wait(delay)
+    
+    def shutdown(self):
+        """Detiene el sampler en background"""
+        self.running = False
+        self._wakeup.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=2)
+    
+    def get_latest_system_metrics(self) -> Dict:
+        """
+        Último snapshot de métricas del sistema (no bloqueante si el sampler está activo)
+        
+        Returns:
+            Diccionario con métricas del sistema
+        """
+        latest = self.latest_system
+        if latest is None:
+            latest = self.collect_system_metrics()
+        return latest
+    
+    def _system_row(self, metrics: Dict) -> List[float]:
+        """Aplana un dict de métricas del sistema al orden de las columnas"""
+        per_cpu = list(metrics["cpu"]["per_cpu"][:self.cpu_count])
+        per_cpu += [NAN] * (self.cpu_count - len(per_cpu))
+        memory, disk, network = metrics["memory"], metrics["disk"], metrics["network"]
+        return [
+            metrics["cpu"]["percent"], metrics["cpu"]["count"], *per_cpu,
+            memory["total_mb"], memory["available_mb"], memory["used_mb"], memory["percent"],
+            disk["total_gb"], disk["used_gb"], disk["free_gb"], disk["percent"],
+            network["bytes_sent"], network["bytes_recv"],
+            network["packets_sent"], network["packets_recv"],
+        ]
+    
+    def _system_dict(self, timestamp: float, row: List[float]) -> Dict:
+        """Reconstruye el dict de métricas del sistema desde una fila"""
+        n = self.cpu_count
+        per_cpu = [v for v in row[2:2 + n] if not math.isnan(v)]
+        (mem_total, mem_available, mem_used, mem_percent,
+         disk_total, disk_used, disk_free, disk_percent,
+         bytes_sent, bytes_recv, packets_sent, packets_recv) = row[2 + n:]
+        return {
+            "timestamp": timestamp,
+            "datetime": datetime.fromtimestamp(timestamp).isoformat(),
+            "cpu": {
+                "percent": row[0],
+                "count": int(row[1]),
+                "per_cpu": per_cpu
+            },
+            "memory": {
+                "total_mb": mem_total,
+                "available_mb": mem_available,
+                "used_mb": mem_used,
+                "percent": mem_percent
+            },
+            "disk": {
+                "total_gb": disk_total,
+                "used_gb": disk_used,
+                "free_gb": disk_free,
+                "percent": disk_percent
+            },
+            "network": {
+                "bytes_sent": int(bytes_sent),
+                "bytes_recv": int(bytes_recv),
+                "packets_sent": int(packets_sent),
+                "packets_recv": int(packets_recv)
+            }
+        }
+    
+    def _process_row(self, metrics: Dict) -> List[float]:
+        """Aplana un dict de métricas de proceso al orden de PROCESS_COLUMNS"""
+        io = metrics.get("io")
+        return [
+            metrics["cpu_percent"],
+            metrics["memory"]["rss_mb"],
+            metrics["memory"]["vms_mb"],
+            metrics["num_threads"],
+            metrics["create_time"],
+            _STATUS_CODES.get(metrics["status"], -1),
+            io["read_bytes"] if io else NAN,
+            io["write_bytes"] if io else NAN,
+        ]
+    
+    def _process_dict(self, pid: int, timestamp: float, row: List[float]) -> Dict:
+        """Reconstruye el dict de métricas de un proceso desde una fila"""
+        cpu_percent, rss_mb, vms_mb, num_threads, create_time, status, io_read, io_write = row
+        status_code = int(status)
+        return {
+            "timestamp": timestamp,
+            "datetime": datetime.fromtimestamp(timestamp).isoformat(),
+            "pid": pid,
+            "name": self.process_names.get(pid, ""),
+            "status": PROCESS_STATUSES[status_code] if status_code >= 0 else "unknown",
+            "cpu_percent": cpu_percent,
+            "memory": {
+                "rss_mb": rss_mb,
+                "vms_mb": vms_mb
+            },
+            "num_threads": int(num_threads),
+            "create_time": create_time,
+            "io": None if math.isnan(io_read) else {
+                "read_bytes": int(io_read),
+                "write_bytes": int(io_write)
+            }
+        }
     
     def collect_system_metrics(self) -> Dict:
         """
@@ -26,7 +232,8 @@ class MetricsCollector:
         Returns:
             Diccionario con métricas del sistema
         """
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        # Sin intervalo: el % es desde la muestra anterior (el sampler corre a ritmo fijo)
+        cpu_percent = psutil.cpu_percent(interval=None)
         cpu_count = psutil.cpu_count()
         
         memory = psutil.virtual_memory()
@@ -40,7 +247,7 @@ class MetricsCollector:
             "cpu": {
                 "percent": cpu_percent,
                 "count": cpu_count,
-                "per_cpu": psutil.cpu_percent(percpu=True)
+                "per_cpu": psutil.cpu_percent(interval=None, percpu=True)
             },
             "memory": {
                 "total_mb": memory.total / (1024 * 1024),
@@ -62,16 +269,20 @@ class MetricsCollector:
             }
         }
         
-        # Guardar en historial
-        self.system_history.append(metrics)
-        if len(self.system_history) > self.history_size:
-            self.system_history.pop(0)
+        # Guardar en historial y publicar como último snapshot
+        with self.lock:
+            self.system_history.append(metrics["timestamp"], self._system_row(metrics))
+            self.version += 1
+        self.latest_system = metrics
         
         return metrics
     
     def collect_process_metrics(self, pid: int) -> Optional[Dict]:
         """
-        Recolecta métricas de un proceso específico
+        Recolecta métricas de un proceso no orquestado (bajo demanda)
+        
+        No bloquea: el handle de psutil se reutiliza entre llamadas y el %
+        de CPU es desde la consulta anterior (0.0 en la primera).
         
         Args:
             pid: Process ID
@@ -80,88 +291,134 @@ class MetricsCollector:
             Diccionario con métricas del proceso o None si no existe
         """
         try:
-            process = psutil.Process(pid)
-            
-            # Información básica
-            with process.oneshot():
-                cpu_percent = process.cpu_percent(interval=0.1)
-                memory_info = process.memory_info()
-                
-                metrics = {
-                    "timestamp": time.time(),
-                    "datetime": datetime.now().isoformat(),
-                    "pid": pid,
-                    "name": process.name(),
-                    "status": process.status(),
-                    "cpu_percent": cpu_percent,
-                    "memory": {
-                        "rss_mb": memory_info.rss / (1024 * 1024),
-                        "vms_mb": memory_info.vms / (1024 * 1024)
-                    },
-                    "num_threads": process.num_threads(),
-                    "create_time": process.create_time()
-                }
-                
-                # Intentar obtener IO (puede fallar en algunos sistemas)
-                try:
-                    io_counters = process.io_counters()
-                    metrics["io"] = {
-                        "read_bytes": io_counters.read_bytes,
-                        "write_bytes": io_counters.write_bytes
-                    }
-                except (psutil.AccessDenied, AttributeError):
-                    metrics["io"] = None
-            
-            # Guardar en historial del proceso
-            if pid not in self.process_history:
-                self.process_history[pid] = []
-            
-            self.process_history[pid].append(metrics)
-            if len(self.process_history[pid]) > self.history_size:
-                self.process_history[pid].pop(0)
+            # el cache se comparte entre requests (threads) y cleanup_process_history:
+            # se lee y modifica con el lock, las llamadas a psutil van fuera
+            with self.lock:
+                process = self._on_demand.get(pid)
+            if process is None or not process.is_running():
+                process = psutil.Process(pid)
+                with self.lock:
+                    self._on_demand.pop(pid, None)
+                    while len(self._on_demand) >= ON_DEMAND_CACHE_SIZE:
+                        self._on_demand.pop(next(iter(self._on_demand)))
+                    self._on_demand[pid] = process
             
+            metrics = sample_process(process, time.time())
+            self.record_process_metrics(metrics)
             return metrics
             
         except psutil.NoSuchProcess:
+            with self.lock:
+                self._on_demand.pop(pid, None)
             return None
         except psutil.AccessDenied:
             return {"error": "Access denied to process"}
     
-    def get_system_history(self, minutes: int = 5) -> List[Dict]:
+    def record_process_metrics(self, metrics: Dict):
+        """Guarda una muestra de proceso en su historial"""
+        pid = metrics["pid"]
+        with self.lock:
+            finished_at = self.finished.get(pid)
+            if finished_at is not None:
+                if metrics["create_time"] < finished_at:
+                    return  # muestra tardía del proceso que ya terminó
+                # PID reutilizado por un proceso nuevo: el historial anterior no es suyo
+                del self.finished[pid]
+                self._drop_history(pid)
+            if pid not in self.process_history:
+                self.process_history[pid] = TieredHistory(
+                    self.history_size, PROCESS_COLUMNS, last_columns=["status", "create_time"]
+                )
+                self.version += 1
+            self.process_names[pid] = metrics["name"]
+            self.process_history[pid].append(metrics["timestamp"], self._process_row(metrics))
+    
+    def record_process_batch(self, batch: Dict[int, Dict]):
+        """Guarda un tick completo del monitor de jobs (listener de JobMonitorManager)"""
+        for metrics in batch.values():
+            self.record_process_metrics(metrics)
+    
+    def _history_points(self, history: TieredHistory, minutes: int, resolution: str,
+                        max_points: int, to_dict) -> List[Dict]:
+        """Convierte el resultado de una consulta al historial en la lista de dicts de la API"""
+        cutoff_time = time.time() - (minutes * 60)
+        with self.lock:
+            used, rows = history.query(cutoff_time, resolution=resolution, max_points=max_points)
+            rows = list(rows)
+        
+        points = []
+        for ts, avg, low, high in rows:
+            point = to_dict(ts, avg)
+            if low is not None:
+                # Rollup: valores promedio + min/max del bucket
+                point["resolution"] = used
+                point["min"] = _range_only(to_dict(ts, low))
+                point["max"] = _range_only(to_dict(ts, high))
+            points.append(point)
+        return points
+    
+    def get_system_history(self, minutes: int = 5, resolution: str = "", max_points: int = 0) -> List[Dict]:
         """
         Obtiene historial de métricas del sistema
         
         Args:
             minutes: Minutos de historial a retornar
+            resolution: "raw"/"1s", "10s", "1m" o "10m" (vacío = automática)
+            max_points: Máximo de puntos deseado (elige el rollup adecuado)
             
         Returns:
             Lista de métricas históricas
         """
-        cutoff_time = time.time() - (minutes * 60)
-        return [m for m in self.system_history if m["timestamp"] >= cutoff_time]
+        return self._history_points(
+            self.system_history, minutes, resolution, max_points, self._system_dict
+        )
     
-    def get_process_history(self, pid: int, minutes: int = 5) -> List[Dict]:
+    def get_process_history(self, pid: int, minutes: int = 5, resolution: str = "",
+                            max_points: int = 0) -> List[Dict]:
         """
         Obtiene historial de métricas de un proceso
         
         Args:
             pid: Process ID
             minutes: Minutos de historial a retornar
+            resolution: "raw"/"1s", "10s", "1m" o "10m" (vacío = automática)
+            max_points: Máximo de puntos deseado (elige el rollup adecuado)
             
         Returns:
             Lista de métricas históricas del proceso
         """
-        if pid not in self.process_history:
+        with self.lock:
+            history = self.process_history.get(pid)  # cleanup_process_history puede quitarlo
+        if history is None:
             return []
         
-        cutoff_time = time.time() - (minutes * 60)
-        return [m for m in self.process_history[pid] if m["timestamp"] >= cutoff_time]
+        return self._history_points(
+            history, minutes, resolution, max_points,
+            lambda ts, row: self._process_dict(pid, ts, row)
+        )
     
     def cleanup_process_history(self, pid: int):
-        """Elimina el historial de un proceso terminado"""
-        if pid in self.process_history:
-            del self.process_history[pid]
+        """
+        Marca un proceso como terminado: su historial se sigue pudiendo consultar,
+        pero solo se conservan los de los últimos `keep_finished` procesos
+        """
+        with self.lock:
+            self.finished.pop(pid, None)
+            self.finished[pid] = time.time()
+            self._on_demand.pop(pid, None)
+            while len(self.finished) > self.keep_finished:
+                old, _ = self.finished.popitem(last=False)
+                self._drop_history(old)
+    
+    def _drop_history(self, pid: int):
+        """Elimina el historial de un proceso (con el lock tomado)"""
+        if self.process_history.pop(pid, None) is not None:
+            self.version += 1
+        self.process_names.pop(pid, None)
 
 
 # Instancia global
-metrics_collector = MetricsCollector()
+metrics_collector = MetricsCollector(
+    history_size=settings.metrics_history_size,
+    keep_finished=settings.metrics_finished_processes
+)
@@ -0,0 +1,131 @@
+"""
+Auto-instrumentación del orquestador (/debug/perf)
+
+Latencia por ruta, lag del event loop, timing del monitor de jobs, threads,
+FDs abiertos y un profiler por muestreo bajo demanda. Se activa y desactiva
+en caliente (POST /debug/perf); desactivado, el middleware solo compara un
+booleano y la sonda de lag no mide.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import psutil
+
+from config import settings
+from core.perf import LatencyStats, StackSampler
+
+
+class PerfRecorder:
+    """Estado de la instrumentación + snapshot para /debug/perf"""
+
+    def __init__(self, enabled: bool = False, lag_interval: float = 0.5):
+        self.enabled = enabled
+        self.lag_interval = lag_interval
+        self.routes: Dict[str, LatencyStats] = {}  # "GET /jobs/{job_id}" -> latencias (solo el event loop escribe)
+        self.loop_lag = LatencyStats()
+        self.sampler = StackSampler()
+        self.job_monitor = None  # se asigna con bind
+        self.enabled_at: Optional[float] = time.time() if enabled else None
+        self._process = psutil.Process()
+
+    def bind(self, job_monitor):
+        """Asocia el JobMonitorManager (timing del tick y waits de su lock)"""
+        self.job_monitor = job_monitor
+
+    def set_enabled(self, enabled: bool):
+        if enabled and not self.enabled:
+            self.enabled_at = time.time()
+        self.enabled = enabled
+
+    def reset(self):
+        """Descarta lo medido hasta ahora (rutas, lag, tick y lock del monitor)"""
+        self.routes = {}
+        self.loop_lag.reset()
+        if self.job_monitor is not None:
+            self.job_monitor.tick_duration.reset()
+            self.job_monitor.tick_jitter.reset()
+            self.job_monitor.lock.reset()
+
+    def observe_request(self, route: str, seconds: float):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = LatencyStats()
+        stats.observe(seconds)
+
+    async def loop_lag_probe(self):
+        """
+        Duerme lag_interval y mide cuánto se atrasa al despertar: el atraso es el
+        tiempo que el event loop estuvo ocupado con otra cosa (código bloqueante)
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            if self.enabled:
+                self.loop_lag.observe(max(0.0, loop.time() - expected))
+
+    def open_fds(self) -> Optional[int]:
+        try:
+            return self._process.num_fds()
+        except (AttributeError, psutil.Error):  # num_fds no existe en Windows
+            try:
+                return len(os.listdir("/proc/self/fd"))
+            except OSError:
+                return None
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "enabled_at": self.enabled_at,
+            "threads": threading.active_count(),
+            "open_fds": self.open_fds(),
+            "routes": {route: stats.summary() for route, stats in sorted(list(self.routes.items()))},
+            "event_loop_lag": self.loop_lag.summary(),
+            "job_monitor": self.job_monitor.timing_stats() if self.job_monitor is not None else None,
+        }
+
+    def profile(self, seconds: float, hz: int) -> Optional[str]:
+        """Perfil colapsado de todos los threads (bloquea; None si ya hay uno en curso)"""
+        return self.sampler.profile(seconds, 1.0 / hz)
+
+
+class PerfMiddleware:
+    """
+    Middleware ASGI: latencia por ruta (template, no la URL concreta) hasta
+    que sale el inicio de la respuesta, así los streams (SSE, follow de logs)
+    miden lo que tardan en responder y no su duración.
+    """
+
+    def __init__(self, app, recorder: PerfRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.recorder.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        elapsed = None
+
+        async def timed_send(message):
+            nonlocal elapsed
+            if elapsed is None and message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if elapsed is None:  # excepción antes de responder
+                elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.recorder.observe_request(f"{scope['method']} {path}", elapsed)
+
+
+# Instancia global
+perf_recorder = PerfRecorder(enabled=settings.perf_enabled, lag_interval=settings.perf_lag_interval)
@@ -0,0 +1,184 @@
+"""
+Exposición de métricas en formato de texto de Prometheus
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.perf import LatencyStats
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets (segundos) del histograma de latencia de lanzamiento de procesos
+SPAWN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value) -> str:
+    """Escapa un valor de label (\\, comillas y saltos de línea)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _histogram(name: str, help_text: str, stats: LatencyStats, out: List[str]):
+    """Histograma acumulativo (formato Prometheus) a partir de los buckets de un LatencyStats"""
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} histogram")
+    cumulative = 0
+    for bound, count in zip(stats.buckets, list(stats.counts)):
+        cumulative += count
+        out.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    out.append(f'{name}_bucket{{le="+Inf"}} {stats.count}')
+    out.append(f"{name}_sum {_number(stats.total)}")
+    out.append(f"{name}_count {stats.count}")
+
+
+class PrometheusExporter:
+    """
+    Contadores del orquestador + render del texto de exposición.
+
+    El texto se arma a partir de los snapshots que ya publican los samplers
+    (sistema y jobs) y se guarda en caché por tick: cualquier cantidad de
+    scrapes entre dos ticks devuelve los mismos bytes, sin llamadas a psutil
+    ni re-render. Los contadores se actualizan en cada evento y se reflejan
+    en el siguiente render.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  # contadores
+        self.render_lock = threading.Lock()  # un solo render por tick aunque lleguen varios scrapes
+        self.jobs_started = 0
+        self.jobs_finished: Dict[str, int] = {}  # estado final -> cantidad
+        self.launch_errors = 0
+        self.spawn_seconds = LatencyStats(SPAWN_BUCKETS)
+        self.started_at = time.time()
+
+        # Fuentes (se asignan con bind)
+        self.collector = None
+        self.job_monitor = None
+        self.scheduler = None
+        self.jobs_by_pid: Optional[Callable[[], Dict[int, str]]] = None
+
+        self._cache_key: Optional[Tuple] = None
+        self._cache: bytes = b""
+
+    def bind(self, collector, job_monitor, scheduler, jobs_by_pid: Callable[[], Dict[int, str]]):
+        """Asocia las fuentes de datos (MetricsCollector, JobMonitorManager, JobScheduler)"""
+        self.collector = collector
+        self.job_monitor = job_monitor
+        self.scheduler = scheduler
+        self.jobs_by_pid = jobs_by_pid
+
+    def job_started(self, spawn_seconds: float):
+        """Un proceso se lanzó (con la duración de start_job)"""
+        with self.lock:
+            self.jobs_started += 1
+            self.spawn_seconds.observe(spawn_seconds)
+
+    def job_finished(self, status: str):
+        """Un job terminó con ese estado (exited, failed, stopped, timeout, cancelled)"""
+        with self.lock:
+            self.jobs_finished[status] = self.jobs_finished.get(status, 0) + 1
+
+    def launch_error(self):
+        """Un proceso no se pudo lanzar"""
+        with self.lock:
+            self.launch_errors += 1
+
+    def render(self) -> bytes:
+        """Texto de exposición (en caché hasta el siguiente tick de los samplers)"""
+        key = (self.collector.version, self.job_monitor.tick)
+        if key == self._cache_key:
+            return self._cache
+        with self.render_lock:
+            if key != self._cache_key:
+                self._cache = self._render()
+                self._cache_key = key
+            return self._cache
+
+    def _render(self) -> bytes:
+        out: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, float]]):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                out.append(f"{name}{labels} {_number(value)}")
+
+        # Sistema (último snapshot del sampler)
+        system = self.collector.latest_system
+        if system is not None:
+            memory, disk, network = system["memory"], system["disk"], system["network"]
+            metric("orchestrator_system_cpu_percent", "gauge", "CPU usage of the host",
+                   [("", system["cpu"]["percent"])])
+            metric("orchestrator_system_cpu_count", "gauge", "Logical CPUs",
+                   [("", system["cpu"]["count"])])
+            metric("orchestrator_system_memory_total_bytes", "gauge", "Total memory",
+                   [("", memory["total_mb"] * 1024 * 1024)])
+            metric("orchestrator_system_memory_used_bytes", "gauge", "Used memory",
+                   [("", memory["used_mb"] * 1024 * 1024)])
+            metric("orchestrator_system_memory_available_bytes", "gauge", "Available memory",
+                   [("", memory["available_mb"] * 1024 * 1024)])
+            metric("orchestrator_system_disk_total_bytes", "gauge", "Size of the root filesystem",
+                   [("", disk["total_gb"] * 1024 ** 3)])
+            metric("orchestrator_system_disk_used_bytes", "gauge", "Used space of the root filesystem",
+                   [("", disk["used_gb"] * 1024 ** 3)])
+            metric("orchestrator_system_network_sent_bytes_total", "counter", "Bytes sent by all interfaces",
+                   [("", network["bytes_sent"])])
+            metric("orchestrator_system_network_received_bytes_total", "counter", "Bytes received by all interfaces",
+                   [("", network["bytes_recv"])])
+
+        # Jobs (último tick del monitor)
+        pids = self.jobs_by_pid()
+        cpu, rss, status = [], [], []
+        for pid, stats in self.job_monitor.get_all_stats().items():
+            job_id = pids.get(pid)
+            if job_id is None:
+                continue
+            labels = f'{{job_id="{_escape(job_id)}",pid="{pid}"}}'
+            cpu.append((labels, stats["cpu"]))
+            rss.append((labels, stats["ram"] * 1024 * 1024))
+            status.append((f'{{job_id="{_escape(job_id)}",pid="{pid}",status="{_escape(stats["status"])}"}}', 1))
+        metric("orchestrator_job_cpu_percent", "gauge", "CPU usage of a job", cpu)
+        metric("orchestrator_job_rss_bytes", "gauge", "Resident memory of a job", rss)
+        metric("orchestrator_job_status", "gauge", "Process status of a job (1 for the current status)", status)
+
+        # Scheduler
+        metric("orchestrator_jobs_queued", "gauge", "Jobs waiting for a slot",
+               [("", len(self.scheduler.queued))])
+        metric("orchestrator_jobs_running", "gauge", "Jobs holding a slot",
+               [("", len(self.scheduler.running))])
+
+        # Monitor de jobs (mismos buckets que las latencias de /debug/perf)
+        _histogram("orchestrator_monitor_tick_seconds", "Time to sample all the monitored jobs in a tick",
+                   self.job_monitor.tick_duration, out)
+
+        # Contadores
+        with self.lock:
+            metric("orchestrator_jobs_started_total", "counter", "Processes launched",
+                   [("", self.jobs_started)])
+            metric("orchestrator_jobs_finished_total", "counter", "Jobs finished by final status",
+                   [(f'{{status="{_escape(s)}"}}', n) for s, n in sorted(self.jobs_finished.items())])
+            failed = self.jobs_finished.get("failed", 0) + self.jobs_finished.get("timeout", 0) + self.launch_errors
+            metric("orchestrator_jobs_failed_total", "counter",
+                   "Jobs that could not be launched, exited with an error or timed out", [("", failed)])
+            metric("orchestrator_job_launch_errors_total", "counter", "Processes that could not be launched",
+                   [("", self.launch_errors)])
+            _histogram("orchestrator_spawn_seconds", "Time to launch a process", self.spawn_seconds, out)
+
+        metric("orchestrator_start_time_seconds", "gauge", "Start time of the orchestrator (unix)",
+               [("", self.started_at)])
+
+        out.append("")
+        return "\n".join(out).encode("utf-8")
+
+
+# Instancia global
+prometheus_exporter = PrometheusExporter()
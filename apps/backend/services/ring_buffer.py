@@ -0,0 +1,243 @@
+"""
+Buffer circular columnar para series de métricas
+"""
+from array import array
+from typing import Iterator, List, Sequence, Tuple
+
+
+class RingBuffer:
+    """
+    Buffer circular de capacidad fija con una columna `array('d')` por métrica
+    más una columna de timestamps.
+
+    - append en O(1) (crece hasta `capacity` y luego sobrescribe lo más antiguo)
+    - ~8 bytes por valor en vez de un dict por punto
+    - búsqueda por rango de tiempo con búsqueda binaria (los timestamps son crecientes)
+    """
+
+    def __init__(self, capacity: int, columns: Sequence[str]):
+        """
+        Args:
+            capacity: Número máximo de puntos a mantener
+            columns: Nombres de las columnas (en el orden en que se pasan los valores)
+        """
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.timestamps = array('d')
+        self.data: List[array] = [array('d') for _ in self.columns]
+        self.head = 0  # posición física del punto más antiguo una vez lleno
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        """Agrega un punto (los valores en el orden de `columns`)"""
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(timestamp)
+            for column, value in zip(self.data, values):
+                column.append(value)
+            return
+
+        i = self.head
+        self.timestamps[i] = timestamp
+        for column, value in zip(self.data, values):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+
+    def _physical(self, i: int) -> int:
+        return (self.head + i) % self.capacity if len(self.timestamps) == self.capacity else i
+
+    def bisect(self, timestamp: float) -> int:
+        """Índice lógico del primer punto con timestamp >= `timestamp`"""
+        lo, hi = 0, len(self.timestamps)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._physical(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, start: int = 0, end: int = -1) -> Iterator[Tuple[float, List[float]]]:
+        """Itera (timestamp, valores) entre los índices lógicos [start, end)"""
+        if end < 0:
+            end = len(self.timestamps)
+        for i in range(start, end):
+            p = self._physical(i)
+            yield self.timestamps[p], [column[p] for column in self.data]
+
+    def since(self, timestamp: float) -> Iterator[Tuple[float, List[float]]]:
+        """Itera los puntos con timestamp >= `timestamp`"""
+        return self.rows(self.bisect(timestamp))
+
+    def oldest(self) -> float:
+        """Timestamp del punto más antiguo retenido (inf si está vacío)"""
+        if not self.timestamps:
+            return float("inf")
+        return self.timestamps[self._physical(0)]
+
+    def last(self) -> Tuple[float, List[float]]:
+        """Último punto agregado"""
+        p = self._physical(len(self.timestamps) - 1)
+        return self.timestamps[p], [column[p] for column in self.data]
+
+
+class RollupBuffer:
+    """
+    Agregado por intervalos fijos (buckets) con min/avg/max por columna.
+    Se actualiza incrementalmente con cada muestra: solo el bucket abierto
+    se mantiene en acumuladores, los cerrados se guardan en un RingBuffer.
+    """
+
+    AGGREGATES = ("min", "avg", "max")
+
+    def __init__(self, bucket_seconds: float, capacity: int, columns: Sequence[str],
+                 last_columns: Sequence[str] = ()):
+        """
+        Args:
+            bucket_seconds: Duración de cada bucket
+            capacity: Número máximo de buckets a mantener
+            columns: Nombres de las columnas
+            last_columns: Columnas donde "avg" guarda el último valor (estados, constantes)
+        """
+        self.bucket_seconds = bucket_seconds
+        self.columns = list(columns)
+        self.buffer = RingBuffer(
+            capacity,
+            [f"{column}.{agg}" for agg in self.AGGREGATES for column in self.columns]
+        )
+        self._last_idx = [i for i, column in enumerate(self.columns) if column in last_columns]
+        self.bucket: float = -1.0  # inicio del bucket abierto (-1 = ninguno)
+        self._min: List[float] = []
+        self._max: List[float] = []
+        self._sum: List[float] = []
+        self._last: List[float] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self.buffer) + (1 if self._count else 0)
+
+    def add(self, timestamp: float, values: Sequence[float]):
+        """Agrega una muestra al bucket que le corresponde"""
+        bucket = timestamp - timestamp % self.bucket_seconds
+        if self._count and bucket != self.bucket:
+            self._close()
+
+        if not self._count:
+            self.bucket = bucket
+            self._min = list(values)
+            self._max = list(values)
+            self._sum = list(values)
+            self._last = list(values)
+            self._count = 1
+            return
+
+        mins, maxs, sums = self._min, self._max, self._sum
+        for i, v in enumerate(values):
+            if v < mins[i] or mins[i] != mins[i]:  # x != x -> NaN
+                mins[i] = v
+            if v > maxs[i] or maxs[i] != maxs[i]:
+                maxs[i] = v
+            sums[i] += v
+        self._last = list(values)
+        self._count += 1
+
+    def _open_row(self) -> List[float]:
+        avg = [total / self._count for total in self._sum]
+        for i in self._last_idx:
+            avg[i] = self._last[i]
+        return [*self._min, *avg, *self._max]
+
+    def _close(self):
+        self.buffer.append(self.bucket, self._open_row())
+        self._count = 0
+
+    def _split(self, row: List[float]) -> Tuple[List[float], List[float], List[float]]:
+        n = len(self.columns)
+        return row[n:2 * n], row[:n], row[2 * n:]
+
+    def oldest(self) -> float:
+        """Inicio del bucket más antiguo retenido"""
+        if len(self.buffer):
+            return self.buffer.oldest()
+        return self.bucket if self._count else float("inf")
+
+    def count_since(self, timestamp: float) -> int:
+        """Cantidad de buckets que se superponen con [timestamp, ahora]"""
+        closed = len(self.buffer) - self.buffer.bisect(timestamp - self.bucket_seconds)
+        return closed + (1 if self._count else 0)
+
+    def since(self, timestamp: float) -> Iterator[Tuple[float, List[float], List[float], List[float]]]:
+        """Itera (inicio del bucket, avg, min, max), incluido el bucket abierto"""
+        for ts, row in self.buffer.since(timestamp - self.bucket_seconds):
+            yield (ts, *self._split(row))
+        if self._count:
+            yield (self.bucket, *self._split(self._open_row()))
+
+
+class TieredHistory:
+    """
+    Historial multi-resolución: muestras crudas + rollups de 10s / 1m / 10m.
+    Las consultas eligen el nivel más fino que cubre la ventana pedida y
+    respeta `max_points`, así ventanas largas siguen siendo baratas.
+    """
+
+    # (nombre, segundos por bucket, buckets retenidos) -> 6h, 24h, 7 días
+    ROLLUPS = [("10s", 10, 2160), ("1m", 60, 1440), ("10m", 600, 1008)]
+    RESOLUTIONS = ["raw", "1s", "10s", "1m", "10m"]
+
+    def __init__(self, capacity: int, columns: Sequence[str], last_columns: Sequence[str] = ()):
+        """
+        Args:
+            capacity: Número máximo de muestras crudas
+            columns: Nombres de las columnas
+            last_columns: Columnas no promediables (ver RollupBuffer)
+        """
+        self.raw = RingBuffer(capacity, columns)
+        self.rollups = {
+            name: RollupBuffer(seconds, buckets, columns, last_columns)
+            for name, seconds, buckets in self.ROLLUPS
+        }
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        """Agrega una muestra cruda y actualiza todos los rollups"""
+        self.raw.append(timestamp, values)
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, values)
+
+    def _pick(self, since: float, max_points: int = 0) -> str:
+        raw = self.raw
+        raw_covers = len(raw) < raw.capacity or raw.oldest() <= since
+        if raw_covers and (not max_points or len(raw) - raw.bisect(since) <= max_points):
+            return "raw"
+
+        for name, _, buckets in self.ROLLUPS:
+            rollup = self.rollups[name]
+            covers = len(rollup.buffer) < buckets or rollup.oldest() <= since
+            if covers and (not max_points or rollup.count_since(since) <= max_points):
+                return name
+        return self.ROLLUPS[-1][0]
+
+    def query(self, since: float, resolution: str = "", max_points: int = 0) -> Tuple[str, Iterator]:
+        """
+        Consulta el historial desde `since`
+
+        Args:
+            since: Timestamp inicial
+            resolution: "raw"/"1s", "10s", "1m" o "10m" (vacío = automática)
+            max_points: Máximo de puntos deseado para la elección automática
+
+        Returns:
+            (resolución usada, iterador de (timestamp, avg, min, max)); en "raw" min y max son None
+        """
+        if resolution == "1s":
+            resolution = "raw"
+        if not resolution:
+            resolution = self._pick(since, max_points)
+
+        if resolution == "raw":
+            return "raw", ((ts, row, None, None) for ts, row in self.raw.since(since))
+        return resolution, self.rollups[resolution].since(since)
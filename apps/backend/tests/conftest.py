@@ -0,0 +1,44 @@
+"""
+Fixtures compartidas: logs y base de datos en directorios temporales
+"""
+import os
+import tempfile
+
+# Antes de importar la app: las instancias globales (logger, job_store) leen settings al importarse
+_workdir = tempfile.mkdtemp(prefix="orchestrator-tests-")
+os.environ["LOG_DIR"] = os.path.join(_workdir, "logs")
+os.environ["DB_PATH"] = os.path.join(_workdir, "orchestrator.db")
+
+import pytest
+
+from services.log_segments import LogSegments
+from services.log_writer import LogWriter
+
+
+@pytest.fixture
+def segments(tmp_path):
+    """Segmentos de log en un directorio temporal (sin cuota)"""
+    log_segments = LogSegments(log_dir=str(tmp_path), compression="gzip", max_total_mb=0)
+    yield log_segments
+    log_segments.shutdown()
+
+
+@pytest.fixture
+def make_writer(segments):
+    """Crea LogWriters sobre `segments` y los cierra al terminar el test"""
+    writers = []
+
+    def make(**kwargs) -> LogWriter:
+        kwargs.setdefault("flush_interval", 0.01)
+        writer = LogWriter(segments, **kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.shutdown()
+
+
+def log_line(job_id: str, i: int, second: int = 0) -> bytes:
+    """Una línea con el formato del JobLogger: '<fecha> - job.<id> - STDOUT - <texto>'"""
+    return f"2026-01-01 00:{second // 60:02d}:{second % 60:02d} - job.{job_id} - STDOUT - line {i}\n".encode()
@@ -0,0 +1,127 @@
+"""
+Historial de jobs en SQLite: lecturas que superponen las escrituras pendientes
+"""
+import pytest
+
+from models.job_model import Job
+from services.job_store import JobStore
+
+COLUMNS = ["status", "command", "created_at"]
+
+
+@pytest.fixture
+def store():
+    """Base en memoria sin thread de escritura: lo guardado queda pendiente hasta flush()"""
+    job_store = JobStore(db_path=":memory:")
+    yield job_store
+    job_store.close()
+
+
+def _job(i: int, status: str = "exited", command=None) -> Job:
+    return Job(job_id=f"job{i:03d}", command=command or ["sleep", str(i)], status=status, created_at=1000.0 + i)
+
+
+def _ids(rows):
+    return [row["job_id"] for row in rows]
+
+
+def _fill(store, count=10, flushed=6):
+    """`flushed` jobs confirmados y el resto pendientes; un confirmado se actualiza sin confirmar"""
+    for i in range(count):
+        store.save(_job(i, status="running" if i % 2 else "exited"))
+        if i == flushed - 1:
+            store.flush()
+    store.save(_job(2, status="failed"))  # pendiente que reemplaza a lo confirmado
+
+
+def test_reads_see_pending_writes(store):
+    _fill(store)
+    assert store.pending and len(store.pending) == 5
+
+    assert _ids(store.page(COLUMNS, limit=100)) == [f"job{i:03d}" for i in range(9, -1, -1)]
+    assert store.get("job002").status == "failed"
+    assert store.count() == 10
+
+    # el pendiente reemplaza a la fila confirmada también para los filtros
+    assert "job002" not in _ids(store.page(COLUMNS, statuses=["exited"]))
+    assert _ids(store.page(COLUMNS, statuses=["failed"])) == ["job002"]
+    assert store.count(statuses=["exited"]) == 4
+    assert store.count(statuses=["running"]) == 5
+
+
+def test_page_is_the_same_before_and_after_flush(store):
+    _fill(store)
+    queries = [
+        dict(limit=100),
+        dict(limit=3, offset=4),
+        dict(statuses=["running"], sort="job_id", descending=False),
+        dict(command_prefix="sleep 1", limit=100),
+        dict(created_after=1003.0, created_before=1008.0),
+        dict(sort="version", limit=4),
+    ]
+    before = [store.page(COLUMNS, **query) for query in queries]
+    store.flush()
+    assert not store.pending
+    assert [store.page(COLUMNS, **query) for query in queries] == before
+    assert before[1] == store.page(COLUMNS, limit=100)[4:7]
+    assert _ids(before[3]) == ["job001"]
+
+
+@pytest.mark.parametrize("sort, descending", [("created_at", True), ("job_id", False), ("version", True)])
+def test_cursor_walk_visits_every_job_once(store, sort, descending):
+    """Paginar por cursor mezclando pendientes y confirmados no repite ni saltea jobs"""
+    _fill(store, count=11, flushed=4)
+    seen, after = [], None
+    while True:
+        rows = store.page(COLUMNS, sort=sort, descending=descending, after=after, limit=3)
+        if not rows:
+            break
+        seen += _ids(rows)
+        after = (rows[-1][sort], rows[-1]["job_id"])
+    assert seen == _ids(store.page(COLUMNS, sort=sort, descending=descending, limit=100))
+    assert sorted(seen) == [f"job{i:03d}" for i in range(11)]
+
+
+def test_start_marks_active_jobs_as_lost(store):
+    """Los jobs que quedaron corriendo o en cola en una ejecución anterior pasan a 'lost'"""
+    for i, status in enumerate(["running", "queued", "exited", "timeout"]):
+        store.save(_job(i, status=status))
+    store.flush()
+    version = store.version
+
+    store.start()
+    assert [store.get(f"job{i:03d}").status for i in range(4)] == ["lost", "lost", "exited", "timeout"]
+    assert store.get("job000").version > version  # el cambio se informa a los listados por versión
+
+
+def test_changes_in_version_order_with_pending(store):
+    _fill(store)
+    changes = store.changes(COLUMNS, 0, limit=100)
+    versions = [change["version"] for change in changes]
+    assert versions == sorted(versions) and len(set(versions)) == 10
+    assert changes[-1]["job_id"] == "job002" and changes[-1]["status"] == "failed"
+
+    since = changes[5]["version"]
+    assert store.changes(COLUMNS, since, limit=100) == changes[6:]
+    assert store.changes(COLUMNS, 0, limit=3) == changes[:3]
+    assert store.changes(COLUMNS, store.version) == []
+
+    store.flush()
+    assert store.changes(COLUMNS, 0, limit=100) == changes
+
+
+def test_changes_report_jobs_that_stop_matching(store):
+    """Con filtros se informan todos los cambios; los que ya no cumplen vienen con matches=False"""
+    for i in range(4):
+        store.save(_job(i, status="running"))
+    store.flush()
+    since = store.version
+    store.save(_job(1, status="exited"))
+    store.flush()
+    store.save(_job(3, status="failed"))  # pendiente
+
+    changes = store.changes(COLUMNS, since, statuses=["running"])
+    assert [(change["job_id"], change["matches"]) for change in changes] == [("job001", False), ("job003", False)]
+    store.save(_job(0, status="running"))
+    last = store.changes(COLUMNS, since, statuses=["running"])[-1]
+    assert (last["job_id"], last["status"], last["command"], last["matches"]) == ("job000", "running", ["sleep", "0"], True)
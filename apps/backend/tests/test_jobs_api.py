@@ -0,0 +1,124 @@
+"""
+Listado de jobs (GET /jobs/): paginación por cursor, filtros, proyección, ETag y cambios desde una versión
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.job_model import Job
+from services.job_store import job_store
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _historical(prefix: str, count: int, flushed: int):
+    """Jobs terminados con comando `<prefix> <i>`; los primeros `flushed` ya confirmados en la base"""
+    for i in range(count):
+        status = ("exited", "failed", "stopped")[i % 3]
+        job_store.save(Job(job_id=f"{prefix}-{i:03d}", command=[prefix, str(i)], status=status,
+                           priority=i % 4, created_at=2000.0 + i // 2))  # fechas repetidas: desempata job_id
+        if i == flushed - 1:
+            job_store.flush()
+
+
+def _walk(client, params, limit):
+    """Recorre todas las páginas siguiendo next_cursor"""
+    seen, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, limit=limit, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/jobs/", params=query).json()
+        pages += 1
+        seen += [job["job_id"] for job in body["jobs"]]
+        cursor = body["next_cursor"]
+        assert body["has_more"] == (cursor is not None)
+        if cursor is None:
+            return seen, pages
+
+
+@pytest.mark.parametrize("sort", ["-created_at", "created_at", "priority", "-priority", "job_id"])
+def test_cursor_pages_cover_every_job_once(client, sort):
+    _historical("pagecursor", 23, flushed=15)
+    params = {"command_prefix": "pagecursor", "sort": sort, "fields": "job_id"}
+    seen, pages = _walk(client, params, limit=5)
+    assert pages == 5
+    assert len(seen) == len(set(seen)) == 23
+
+    everything = client.get("/jobs/", params=dict(params, limit=100)).json()
+    assert everything["total"] == 23 and everything["next_cursor"] is None
+    assert seen == [job["job_id"] for job in everything["jobs"]]
+
+
+def test_filters_and_projection(client):
+    _historical("pagefilter", 12, flushed=6)
+    body = client.get("/jobs/", params={"command_prefix": "pagefilter", "status": "failed,stopped",
+                                        "fields": "job_id,status", "limit": 3}).json()
+    assert body["total"] == 8
+    assert all(set(job) == {"job_id", "status"} for job in body["jobs"])
+    assert all(job["status"] in ("failed", "stopped") for job in body["jobs"])
+
+    created = client.get("/jobs/", params={"command_prefix": "pagefilter", "created_after": 2002.0,
+                                           "created_before": 2004.0, "fields": "job_id"}).json()
+    assert sorted(job["job_id"] for job in created["jobs"]) == [f"pagefilter-{i:03d}" for i in range(4, 8)]
+
+    # offset sin cursor: la misma página que recortar el listado completo
+    full = client.get("/jobs/", params={"command_prefix": "pagefilter", "fields": "job_id"}).json()["jobs"]
+    page = client.get("/jobs/", params={"command_prefix": "pagefilter", "fields": "job_id",
+                                        "offset": 4, "limit": 3}).json()["jobs"]
+    assert page == full[4:7]
+
+
+def test_invalid_cursor_and_fields(client):
+    assert client.get("/jobs/", params={"cursor": "no-es-un-cursor"}).status_code == 400
+    assert client.get("/jobs/", params={"fields": "job_id,nope"}).status_code == 400
+    assert client.get("/jobs/", params={"sort": "command"}).status_code == 422
+
+
+def test_etag_round_trip(client):
+    """Sin cambios: 304 con el mismo ETag; cualquier escritura en el store lo invalida"""
+    _historical("pageetag", 3, flushed=3)
+    params = {"command_prefix": "pageetag", "fields": "job_id,status"}
+    first = client.get("/jobs/", params=params)
+    etag = first.headers["etag"]
+
+    cached = client.get("/jobs/", params=params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["etag"] == etag and not cached.content
+
+    job_store.save(Job(job_id="pageetag-000", command=["pageetag", "0"], status="failed", created_at=2000.0))
+    fresh = client.get("/jobs/", params=params, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
+    assert fresh.json()["version"] > first.json()["version"]
+
+
+def test_since_returns_changes_and_removed(client):
+    _historical("pagesince", 6, flushed=6)
+    params = {"command_prefix": "pagesince", "status": "exited", "fields": "job_id,status"}
+    version = client.get("/jobs/", params=params).json()["version"]
+
+    body = client.get("/jobs/", params=dict(params, since=version)).json()
+    assert (body["jobs"], body["removed"], body["version"]) == ([], [], version)
+
+    job_store.save(Job(job_id="pagesince-000", command=["pagesince", "0"], status="stopped", created_at=2000.0))
+    job_store.flush()
+    job_store.save(Job(job_id="pagesince-001", command=["pagesince", "1"], status="exited", created_at=2000.0))
+    body = client.get("/jobs/", params=dict(params, since=version)).json()
+    assert body["jobs"] == [{"job_id": "pagesince-001", "status": "exited"}]
+    assert body["removed"] == ["pagesince-000"]  # dejó de cumplir status=exited
+    assert body["total"] is None and body["next_cursor"] is None
+
+    # página a página: cada `version` devuelta sirve de `since` para la siguiente
+    for i in range(2, 6):
+        job_store.save(Job(job_id=f"pagesince-{i:03d}", command=["pagesince", str(i)], status="exited",
+                           created_at=2001.0))
+    seen, since = [], body["version"]
+    while True:
+        page = client.get("/jobs/", params=dict(params, since=since, limit=3)).json()
+        seen += [job["job_id"] for job in page["jobs"]]
+        since = page["version"]
+        if not page["has_more"]:
+            break
+    assert seen == [f"pagesince-{i:03d}" for i in range(2, 6)]
+    assert client.get("/jobs/", params=dict(params, since=since)).json()["jobs"] == []
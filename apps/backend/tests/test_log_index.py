@@ -0,0 +1,122 @@
+"""
+Índice de búsqueda de los logs: literales de regex, bloom filter y búsqueda por bloques
+"""
+import time
+
+import pytest
+
+from services.log_index import LogIndexer, LogSearcher, _Query, _required_literals, word_bits
+from tests.conftest import log_line
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    (b"ERROR", [b"ERROR"]),
+    (b"foo.*bar", [b"foo", b"bar"]),
+    (b"colou?r", [b"colo", b"r"]),
+    (b"ab{2}c", [b"a", b"c"]),
+    (b"x\\.y", [b"x.y"]),
+    (b"\\d+ms", [b"ms"]),
+    (b"(foo)bar", [b"bar"]),
+    (b"[Ee]rror", [b"rror"]),
+    (b"foo|bar", []),  # alternativa de nivel superior: ningún tramo es obligatorio
+    (b"(", []),  # regex inválida: sin literales (el error lo da re.compile)
+])
+def test_required_literals(pattern, literals):
+    assert _required_literals(pattern) == literals
+
+
+def _bloom(words):
+    return memoryview(LogIndexer()._bloom({word.lower() for word in words}))
+
+
+def test_bloom_contains_indexed_words():
+    """Las palabras del bloque pasan el bloom; otras (con estos hashes fijos) no"""
+    bloom = _bloom([b"Connection", b"refused", b"needle-42"])
+    assert _Query("needle-42", regex=False, ignore_case=True).may_contain(bloom)
+    assert _Query("CONNECTION refused", regex=False, ignore_case=True).may_contain(bloom)
+    assert _Query("nect", regex=False, ignore_case=True).may_contain(bloom)  # dentro de una palabra
+    assert not _Query("timeout", regex=False, ignore_case=True).may_contain(bloom)
+    assert not _Query("needle-43", regex=False, ignore_case=True).may_contain(bloom)
+    assert _Query("Conn.*refused", regex=True, ignore_case=True).may_contain(bloom)
+    assert not _Query("Conn.*timeout", regex=True, ignore_case=True).may_contain(bloom)
+
+
+def test_short_or_unconstrained_queries_read_every_block():
+    """Sin trigramas obligatorios (palabras < 3 bytes, alternativas) no se descarta ningún bloque"""
+    bloom = _bloom([b"abc"])
+    assert _Query("zz", regex=False, ignore_case=True).positions == []
+    assert _Query("zz", regex=False, ignore_case=True).may_contain(bloom)
+    assert _Query("foo|bar", regex=True, ignore_case=True).may_contain(bloom)
+
+
+def test_word_bits_are_stable():
+    """El hash no depende de PYTHONHASHSEED: los índices sirven entre procesos"""
+    assert word_bits(b"needle") == word_bits(b"needle")
+    assert word_bits(b"ab") == ()
+    assert all(0 <= bit < 16384 for bit in word_bits(b"abcdef"))
+
+
+@pytest.fixture
+def indexed_log(segments, make_writer):
+    """~300 KB de log con rotación: bloques indexados en segmentos y en el archivo vivo"""
+    writer = make_writer(max_bytes=100 * 1024)
+    lines = []
+    for i in range(6000):
+        line = log_line("j1", i, second=i // 100)
+        if i in (42, 5998):
+            line = line.replace(b"line", b"needle-%d" % i)
+        lines.append(line)
+    for start in range(0, len(lines), 100):
+        writer.write("j1", b"".join(lines[start:start + 100]))
+    writer.write("j2", log_line("j2", 0).replace(b"line", b"needle-j2"))
+    writer.flush()
+    assert segments.segments("j1")  # hubo rotación
+    return LogSearcher(segments), lines
+
+
+def test_search_reads_only_candidate_blocks(indexed_log):
+    searcher, lines = indexed_log
+    stats = {}
+    matches = list(searcher.search("needle-42", job_id="j1", stats=stats))
+    assert [m["line"] for m in matches] == [lines[42].decode().rstrip("\n")]
+    assert matches[0]["offset"] == sum(len(line) for line in lines[:42])
+    assert stats["blocks_read"] < stats["blocks_total"]
+
+
+def test_search_finds_lines_not_yet_indexed(indexed_log):
+    """El bloque en construcción del archivo vivo no tiene registro en `.idx`: se lee igual"""
+    searcher, lines = indexed_log
+    matches = list(searcher.search("NEEDLE-5998", job_id="j1"))
+    assert [m["line"] for m in matches] == [lines[5998].decode().rstrip("\n")]
+
+
+def test_search_matches_brute_force(indexed_log):
+    searcher, lines = indexed_log
+    text = [line.decode().rstrip("\n") for line in lines]
+
+    matches = list(searcher.search("line 59", job_id="j1", limit=10000))
+    assert [m["line"] for m in matches] == [line for line in text if "line 59" in line]
+
+    matches = list(searcher.search(r"needle-\d+", job_id="j1", regex=True))
+    assert [m["line"] for m in matches] == [text[42], text[5998]]
+
+    assert list(searcher.search("NEEDLE-42", job_id="j1", ignore_case=False)) == []
+
+
+def test_search_offsets_are_read_cursors(indexed_log, segments):
+    """El offset de una coincidencia sirve de cursor para leer el contexto"""
+    searcher, lines = indexed_log
+    for match in searcher.search("line 300", job_id="j1", limit=20):
+        assert segments.read_forward("j1", 1, match["offset"])["lines"] == [match["line"]]
+
+
+def test_search_time_range_and_all_jobs(indexed_log):
+    searcher, lines = indexed_log
+    since = time.mktime(time.strptime("2026-01-01 00:00:10", "%Y-%m-%d %H:%M:%S"))
+    until = time.mktime(time.strptime("2026-01-01 00:00:11", "%Y-%m-%d %H:%M:%S"))
+    matches = list(searcher.search("STDOUT", job_id="j1", since=since, until=until, limit=10000))
+    assert [m["line"] for m in matches] == [line.decode().rstrip("\n") for line in lines[1000:1200]]
+
+    # sin job_id: todos los jobs; el límite corta entre jobs
+    assert {m["job_id"] for m in searcher.search("needle", limit=100)} == {"j1", "j2"}
+    assert len(list(searcher.search("needle", limit=2))) == 2
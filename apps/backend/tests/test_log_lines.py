@@ -0,0 +1,105 @@
+"""
+Índice de líneas y tiempo de los logs: búsqueda binaria entre tramos y recorrido desde un registro
+"""
+import io
+import time
+
+import pytest
+
+from services import log_lines
+from services.log_lines import LineIndex, _skip_lines, _skip_until
+from tests.conftest import log_line
+
+
+def _ts(second: int) -> float:
+    return time.mktime(time.strptime(f"2026-01-01 00:{second // 60:02d}:{second % 60:02d}", "%Y-%m-%d %H:%M:%S"))
+
+
+@pytest.fixture
+def indexed_log(segments, make_writer):
+    """
+    5000 líneas (30 por segundo) con un registro cada 100 líneas, repartidas en
+    varios segmentos: hay registros y segmentos que empiezan a mitad de un segundo
+    """
+    writer = make_writer(max_bytes=40 * 1024, line_interval=100)
+    lines = [log_line("j1", i, second=i // 30) for i in range(5000)]
+    for start in range(0, len(lines), 37):  # lotes que no coinciden con los registros
+        writer.write("j1", b"".join(lines[start:start + 37]))
+    writer.flush()
+    assert len(segments.segments("j1")) >= 4
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return LineIndex(segments), offsets
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_offset_of_line(indexed_log, segments, compressed):
+    index, offsets = indexed_log
+    if compressed:
+        segments.shutdown()
+        assert all(segment.compressed for segment in segments.segments("j1"))
+    for line in (0, 1, 99, 100, 101, 1234, 2500, 4999):
+        assert index.offset_of_line("j1", line) == offsets[line]
+    assert index.offset_of_line("j1", 5000) == offsets[-1]
+    assert index.offset_of_line("j1", 10 ** 9) == offsets[-1]  # posterior al final: el final
+    assert index.offset_of_line("nope", 10) is None
+
+
+def test_offset_of_time(indexed_log):
+    index, offsets = indexed_log
+    # todos los segundos: el registro más cercano puede caer antes, justo en o a mitad del segundo
+    for second in range(167):
+        assert index.offset_of_time("j1", _ts(second)) == offsets[second * 30]
+    assert index.offset_of_time("j1", _ts(17) + 0.5) == offsets[18 * 30]  # entre dos segundos
+    assert index.offset_of_time("j1", _ts(0) - 3600) == 0
+    assert index.offset_of_time("j1", _ts(167)) == offsets[-1]  # ninguna línea: el final
+
+
+def test_line_at(indexed_log):
+    index, offsets = indexed_log
+    for line in (0, 100, 777, 3000, 4999):
+        assert index.line_at("j1", offsets[line]) == line
+    assert index.line_at("j1", offsets[-1]) == 5000
+
+
+def test_lines_before_quota_map_to_oldest_kept(indexed_log, segments):
+    """Con los segmentos más viejos borrados, una línea anterior va al inicio de lo que se conserva"""
+    index, offsets = indexed_log
+    segments.shutdown()
+    oldest = segments.segments("j1")[0]
+    oldest.path.unlink()
+    for suffix in (".lines", ".idx", ".seek"):
+        segments.sidecar_path(oldest, suffix).unlink(missing_ok=True)
+
+    kept = segments.segments("j1")[0].start
+    assert index.offset_of_line("j1", 0) == kept
+    line = offsets.index(kept) + 10
+    assert index.offset_of_line("j1", line) == offsets[line]  # la numeración no cambia
+
+
+def test_skip_until_across_chunks(monkeypatch):
+    """La primera línea con fecha >= timestamp, aunque caiga entre dos lecturas; sin fecha se saltea"""
+    monkeypatch.setattr(log_lines, "CHUNK_SIZE", 16)
+    data = (b"2026-01-01 00:00:01 - a\n"
+            b"sin fecha, continuacion de la anterior\n"
+            b"2026-01-01 00:00:03 - b\n"
+            b"2026-01-01 00:00:05 - c\n")
+    f = io.BytesIO(data)
+    c = data.index(b"2026-01-01 00:00:05")
+    assert _skip_until(f, 0, len(data), _ts(1)) == 0
+    assert _skip_until(f, 0, len(data), _ts(2)) == data.index(b"2026-01-01 00:00:03")
+    assert _skip_until(f, 0, len(data), _ts(4)) == c
+    assert _skip_until(f, 0, len(data), _ts(6)) == len(data)
+    assert _skip_until(f, c, len(data), _ts(0)) == c  # desde un registro a mitad del archivo
+    assert _skip_until(f, 0, c, _ts(4)) == c  # acotado a `end`
+
+
+def test_skip_lines_across_chunks(monkeypatch):
+    monkeypatch.setattr(log_lines, "CHUNK_SIZE", 5)
+    data = b"".join(b"line %d\n" % i for i in range(20))
+    f = io.BytesIO(data)
+    assert _skip_lines(f, 0, len(data), 0) == 0
+    assert _skip_lines(f, 0, len(data), 3) == data.index(b"line 3\n")
+    assert _skip_lines(f, data.index(b"line 5\n"), len(data), 10) == data.index(b"line 15\n")
+    assert _skip_lines(f, 0, len(data), 100) == len(data)
@@ -0,0 +1,132 @@
+"""
+Rotación, lectura por miembros y cuota de los segmentos de log
+"""
+import io
+
+from services import log_segments as segments_module
+from services.log_segments import MEMBER_OFFSET, _MemberReader
+from tests.conftest import log_line
+
+
+def _rotated(segments, job_id, chunks):
+    """Escribe cada chunk como archivo vivo y lo rota (un segmento por chunk)"""
+    base = 0
+    for chunk in chunks:
+        segments.live_path(job_id).write_bytes(chunk)
+        base = segments.rotate(job_id, base)
+    return base
+
+
+def test_rotation_keeps_logical_offsets(segments, make_writer):
+    """Los segmentos son contiguos y las lecturas los cruzan como un solo log"""
+    writer = make_writer(max_bytes=2000)
+    lines = [log_line("j1", i) for i in range(300)]
+    for line in lines:
+        writer.write("j1", line)
+    writer.flush()
+
+    rotated = segments.segments("j1")
+    assert len(rotated) >= 5
+    assert rotated[0].start == 0
+    for previous, segment in zip(rotated, rotated[1:]):
+        assert previous.end == segment.start
+    assert segments.live_base("j1") == rotated[-1].end
+
+    expected = [line.decode().rstrip("\n") for line in lines]
+    page = segments.read_forward("j1", 1000, 0)
+    assert page["lines"] == expected
+    assert page["end"] == page["size"] == sum(len(line) for line in lines)
+
+    tail = segments.read_tail("j1", 10)
+    assert tail["lines"] == expected[-10:]
+    # página anterior desde el cursor: sigue siendo continua a través de la rotación
+    before = segments.read_tail("j1", 150, tail["start"])
+    assert before["lines"] == expected[-160:-10]
+
+
+def test_compressed_segments_read_the_same(segments, make_writer):
+    """Después de comprimir en segundo plano las lecturas no cambian"""
+    writer = make_writer(max_bytes=4000)
+    lines = [log_line("j1", i) for i in range(400)]
+    for line in lines:
+        writer.write("j1", line)
+    writer.flush()
+    before = segments.read_forward("j1", 1000, 0)
+
+    segments.shutdown()  # espera a que termine de comprimir lo encolado
+    rotated = segments.segments("j1")
+    assert rotated and all(segment.compressed for segment in rotated)
+    assert all(segments.sidecar_path(segment, ".seek").exists() for segment in rotated)
+
+    assert segments.read_forward("j1", 1000, 0) == before
+    offset = sum(len(line) for line in lines[:200])  # línea 200, dentro de un segmento comprimido
+    assert segments.read_forward("j1", 3, offset)["lines"] == before["lines"][200:203]
+    assert segments.read_tail("j1", 3, offset)["lines"] == before["lines"][197:200]
+    data = b"".join(lines)
+    assert segments.read_bytes("j1", offset - 50, offset + 5000) == data[offset - 50:offset + 5000]
+
+
+def test_member_reader_seeks_across_members(segments, monkeypatch):
+    """Un segmento comprimido en varios miembros se lee con seek sin descomprimir todo"""
+    monkeypatch.setattr(segments_module, "MEMBER_SIZE", 100)
+    content = bytes(range(256)) * 20  # 5120 bytes -> 52 miembros
+    _rotated(segments, "j1", [content])
+    segments.shutdown()
+
+    (part,) = segments.parts("j1")
+    assert part.compressed
+    table = segments.sidecar_path(part, ".seek").read_bytes()
+    assert len(table) // MEMBER_OFFSET.size == 52
+
+    f, size = segments.open_part(part)
+    with f:
+        assert isinstance(f, _MemberReader)
+        assert size == len(content)
+        f.seek(4321)
+        assert f.read(250) == content[4321:4571]  # cruza tres miembros
+        f.seek(-10, io.SEEK_END)
+        assert f.read(100) == content[-10:]
+        assert f.read(1) == b""
+        f.seek(0)
+        assert f.read() == content
+        assert f.member == 51  # solo el último miembro queda en memoria
+
+
+def test_quota_deletes_oldest_segments(tmp_path):
+    """La cuota borra los segmentos más viejos (con sus índices) y conserva el último de cada job"""
+    segments = segments_module.LogSegments(log_dir=str(tmp_path), compression="none", max_total_mb=0)
+    chunk = b"x" * 999 + b"\n"
+    _rotated(segments, "j1", [chunk] * 4)
+    _rotated(segments, "j2", [chunk] * 2)
+    segments.shutdown()
+    oldest = segments.segments("j1")[0]
+    segments.sidecar_path(oldest, ".lines").write_bytes(b"\0" * 24)
+
+    segments.max_total_bytes = 4000
+    freed = segments.enforce_quota()
+    assert freed == 2 * 1000 + 24
+    assert [s.start for s in segments.segments("j1")] == [2000, 3000]
+    assert [s.start for s in segments.segments("j2")] == [0, 1000]
+    assert not segments.sidecar_path(oldest, ".lines").exists()
+
+    # la lectura desde el offset borrado empieza en lo más viejo que se conserva
+    page = segments.read_forward("j1", 1, 0)
+    assert page["first"] == 2000 and page["start"] == 2000
+
+    # por debajo de lo mínimo: solo queda el último segmento de cada job
+    segments.max_total_bytes = 1
+    segments.enforce_quota()
+    assert [s.start for s in segments.segments("j1")] == [3000]
+    assert [s.start for s in segments.segments("j2")] == [1000]
+
+
+def test_delete_removes_live_file_segments_and_sidecars(segments):
+    _rotated(segments, "j1", [b"a\n", b"b\n"])
+    segments.live_path("j1").write_bytes(b"c\n")
+    segments.live_sidecar_path("j1", ".lines").write_bytes(b"")
+
+    assert segments.delete("j1")
+    assert not segments.exists("j1")
+    assert not segments.live_sidecar_path("j1", ".lines").exists()
+    assert segments.read_tail("j1", 10) is None
+    assert not segments.delete("j1")
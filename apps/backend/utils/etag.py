@@ -0,0 +1,33 @@
+"""
+Respuestas condicionales (ETag / If-None-Match)
+"""
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """ETag débil a partir de contadores de versión (p. ej. versión del store + tick del monitor)"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Compara el ETag con el header If-None-Match del request
+
+    Args:
+        request: Request actual
+        etag: ETag de la representación actual
+
+    Returns:
+        Respuesta 304 si el cliente ya tiene esa versión, None si hay que responder completo
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [tag.strip() for tag in header.split(",")]
+    # comparación débil: W/"x" equivale a "x"
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    if "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in tags):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
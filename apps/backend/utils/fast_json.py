@@ -0,0 +1,32 @@
+"""
+Serialización JSON rápida (orjson si está instalado, si no la librería estándar)
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serializa a JSON compacto (UTF-8)
+
+    Args:
+        data: Contenido serializable (dicts, listas, str, números, None)
+
+    Returns:
+        JSON en bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Deserializa JSON (str o bytes)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,49 +1,207 @@
 """
 Validadores de entrada para comandos y parámetros
 """
+import re
 import shutil
-from typing import List, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import os
 
+from config import settings
+
 
 class ValidationError(Exception):
     """Custom exception for validation errors"""
     pass
 
 
-def validate_command(command: List[str]) -> Tuple[bool, str]:
+class CommandResolver:
     """
-    Args:
-        command: List with command and args
-    Returns:
-        (is valid: bool, mesage: str)
+    Cache of executable lookups keyed by (name, PATH)
+    
+    - shutil.which stats every PATH directory; here it runs once per executable
+    - the cache is dropped when a watched directory (PATH entries and parents of
+      absolute executables) changes its mtime (install / uninstall of a binary)
+    - the mtimes are checked at most once every `ttl` seconds, so a burst of
+      submissions does not touch the filesystem
+    - the keys come from the requests: the cache is an LRU of at most
+      `max_entries`, so random executable names cannot grow it without bound
     """
+    
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (name, PATH) -> path or None
+        self.cache: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+        self.dir_mtimes: Dict[str, float] = {}
+        self.paths: Set[str] = set()  # PATH values already registered
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+    
+    def _mtime(self, directory: str) -> float:
+        try:
+            return os.stat(directory).st_mtime
+        except OSError:
+            return -1.0
+    
+    def _check_dirs(self, path: str):
+        """Invalidate the cache if a watched directory changed (at most once per ttl)"""
+        if path not in self.paths:
+            self.paths.add(path)
+            for directory in path.split(os.pathsep):
+                if directory and directory not in self.dir_mtimes:
+                    self.dir_mtimes[directory] = self._mtime(directory)
+        
+        now = time.monotonic()
+        if now - self.checked_at < self.ttl:
+            return
+        self.checked_at = now
+        changed = [d for d, mtime in self.dir_mtimes.items() if self._mtime(d) != mtime]
+        if changed:
+            for directory in changed:
+                self.dir_mtimes[directory] = self._mtime(directory)
+            self.cache.clear()
+    
+    def resolve(self, executable: str) -> Optional[str]:
+        """
+        Args:
+            executable: Name (searched on PATH) or absolute path
+        Returns:
+            Path of the executable, or None if it does not exist
+        """
+        path = os.environ.get("PATH", os.defpath)
+        key = (executable, path)
+        with self.lock:
+            self._check_dirs(path)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        
+        if os.path.isabs(executable):
+            resolved = executable if os.path.exists(executable) else None
+            watched = os.path.dirname(executable)
+        else:
+            resolved = shutil.which(executable, path=path)
+            watched = None
+        
+        with self.lock:
+            if watched and watched not in self.dir_mtimes:
+                self.dir_mtimes[watched] = self._mtime(watched)
+            self.cache[key] = resolved
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return resolved
+
+
+class CommandPolicy:
+    """
+    Allow / deny rules for commands, compiled once
+    
+    - allow: executables allowed (name or path); empty = any executable
+    - deny: tokens not allowed in any argument (exact match, hash set)
+    - deny_patterns: regular expressions not allowed in any argument (one compiled regex)
+    A check is O(argc) and does not touch the filesystem.
+    """
+    
+    def __init__(self, allow: Iterable[str] = (), deny: Iterable[str] = (), deny_patterns: Iterable[str] = ()):
+        self.allow = frozenset(allow)
+        self.deny = frozenset(deny)
+        patterns = [f"(?:{pattern})" for pattern in deny_patterns]
+        self.deny_regex = re.compile("|".join(patterns)) if patterns else None
+    
+    @classmethod
+    def from_settings(cls) -> "CommandPolicy":
+        return cls(settings.command_allow, settings.command_deny, settings.command_deny_patterns)
+    
+    def check(self, command: List[str]) -> Tuple[bool, str]:
+        """
+        Args:
+            command: List with command and args
+        Returns:
+            (is valid: bool, mesage: str)
+        """
+        executable = command[0]
+        if self.allow and executable not in self.allow and os.path.basename(executable) not in self.allow:
+            return False, f"the command '{executable}' is not allowed"
+        
+        if not self.deny.isdisjoint(command):
+            return False, "Potential danger command detected"
+        
+        if self.deny_regex is not None:
+            search = self.deny_regex.search
+            if any(search(arg) for arg in command):
+                return False, "Potential danger command detected"
+        
+        return True, "Valid command"
+
+
+# Global instances
+command_resolver = CommandResolver(ttl=settings.command_cache_ttl, max_entries=settings.command_cache_size)
+command_policy = CommandPolicy.from_settings()
+
+
+def _check_command(command: List[str]) -> Tuple[bool, str]:
+    """Shape and allow / deny rules (no filesystem access)"""
     if not command or len(command) == 0:
         return False, "The command is empty"
     
     if not isinstance(command, list):
         return False, "Command must be a list"
     
-    # Check if the command exist
-    executable = command[0]
-    
-    # if is an absolute route check if exist
-    if os.path.isabs(executable):
-        if not os.path.exists(executable):
+    return command_policy.check(command)
+
+
+def _check_resolved(executable: str, resolved: Optional[str]) -> Tuple[bool, str]:
+    """Result of looking up the executable"""
+    if resolved is None:
+        if os.path.isabs(executable):
             return False, f"El ejecutable '{executable}' no existe"
-    else:
-        # search on PATH
-        if not shutil.which(executable):
-            return False, f"the command '{executable}' is not in path"
-    
-    # Black list 
-    dangerous_commands = ["rm", "mkfs", "dd", "format", ">", ">>"]
-    if any(cmd in command for cmd in dangerous_commands):
-        return False, "Potential danger command detected"
+        return False, f"the command '{executable}' is not in path"
     
     return True, "Valid command"
 
 
+def validate_command(command: List[str]) -> Tuple[bool, str]:
+    """
+    Args:
+        command: List with command and args
+    Returns:
+        (is valid: bool, mesage: str)
+    """
+    is_valid, msg = _check_command(command)
+    if not is_valid:
+        return is_valid, msg
+    
+    # Check if the command exist (cached lookup)
+    executable = command[0]
+    return _check_resolved(executable, command_resolver.resolve(executable))
+
+
+def validate_commands(commands: List[List[str]]) -> List[Tuple[bool, str]]:
+    """
+    Validate several commands together: the rules are checked per command and
+    each distinct executable is looked up once for the whole batch
+    
+    Args:
+        commands: List of commands
+    Returns:
+        List of (is valid, mesage), in the same order
+    """
+    checks = [_check_command(command) for command in commands]
+    resolved: Dict[str, Optional[str]] = {}
+    for command, (is_valid, _) in zip(commands, checks):
+        if is_valid and command[0] not in resolved:
+            resolved[command[0]] = command_resolver.resolve(command[0])
+    
+    return [
+        _check_resolved(command[0], resolved[command[0]]) if is_valid else (is_valid, msg)
+        for command, (is_valid, msg) in zip(commands, checks)
+    ]
+
+
 def validate_pid(pid: int) -> Tuple[bool, str]:
     """
     Args:
@@ -76,4 +234,8 @@ def validate_job_id(job_id: str) -> Tuple[bool, str]:
     if len(job_id) < 3:
         return False, "El job_id is so short-must be 3<len"
     
+    # names the log files: it must not leave log_dir
+    if any(sep in job_id for sep in ("/", "\\", "\0")) or job_id.startswith("."):
+        return False, "job_id must not contain path separators or start with '.'"
+    
     return True, "Valid Job ID "
@@ -2,7 +2,24 @@
 'use client';
 
 import { useEffect, useState } from 'react';
-import { apiClient, SystemStats, Job } from '@/lib/api';
+import { apiClient, SystemStats, Job, JobMetrics } from '@/lib/api';
+
+// Une jobs por job_id: la lista es la de GET /jobs/ (historial incluido) y el
+// stream solo aporta cambios; si se cruzan, gana la versión más nueva
+function mergeJobs(prev: Job[], incoming: Job[]): Job[] {
+  const updates = new Map(incoming.map((job) => [job.job_id, job]));
+  const merged = prev.map((job) => {
+    const update = updates.get(job.job_id);
+    if (!update) return job;
+    updates.delete(job.job_id);
+    if ((job.version ?? 0) > (update.version ?? 0)) return job;
+    // las métricas llegan aparte (evento `jobs`); se conservan mientras corre
+    const metrics = update.status === 'running' ? update.metrics ?? job.metrics : undefined;
+    return { ...job, ...update, metrics };
+  });
+  // los nuevos van primero (la lista es de más reciente a más viejo)
+  return [...updates.values(), ...merged];
+}
 
 export function useSystemMonitor(refreshInterval: number = 2000) {
   const [systemStats, setSystemStats] = useState<SystemStats | null>(null);
@@ -12,6 +29,7 @@ export function useSystemMonitor(refreshInterval: number = 2000) {
 
   useEffect(() => {
     let isMounted = true;
+    let interval: ReturnType<typeof setInterval> | null = null;
 
     const fetchData = async () => {
       try {
@@ -22,7 +40,7 @@ export function useSystemMonitor(refreshInterval: number = 2000) {
 
         if (isMounted) {
           setSystemStats(stats);
-          setJobs(jobsList);
+          setJobs((prev) => mergeJobs(prev, jobsList));
           setIsConnected(true);
           setError(null);
         }
@@ -34,12 +52,66 @@ export function useSystemMonitor(refreshInterval: number = 2000) {
       }
     };
 
-    fetchData();
-    const interval = setInterval(fetchData, refreshInterval);
+    // Historial: una sola vez por conexión, después se aplican los eventos
+    const loadJobs = async () => {
+      try {
+        const jobsList = await apiClient.getJobs();
+        if (isMounted) setJobs((prev) => mergeJobs(prev, jobsList));
+      } catch {
+        // la próxima reconexión o el polling lo reintentan
+      }
+    };
+
+    // Polling solo como respaldo si el stream no está disponible
+    const startPolling = () => {
+      if (interval) return;
+      fetchData();
+      interval = setInterval(fetchData, refreshInterval);
+    };
+
+    const stopPolling = () => {
+      if (interval) clearInterval(interval);
+      interval = null;
+    };
+
+    const source = new EventSource(apiClient.getStreamURL());
+
+    source.addEventListener('snapshot', (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      stopPolling();
+      setSystemStats(data.system);
+      setJobs((prev) => mergeJobs(prev, data.jobs));
+      setIsConnected(true);
+      setError(null);
+      loadJobs();
+    });
+
+    source.addEventListener('system', (e) => {
+      setSystemStats(JSON.parse((e as MessageEvent).data));
+    });
+
+    source.addEventListener('jobs', (e) => {
+      const metrics: Record<string, JobMetrics> = JSON.parse((e as MessageEvent).data);
+      setJobs((prev) =>
+        prev.map((job) => (metrics[job.job_id] ? { ...job, metrics: metrics[job.job_id] } : job))
+      );
+    });
+
+    // Cambios de ciclo de vida: el payload es el job completo (más `event`)
+    source.addEventListener('job', (e) => {
+      const job: Job = JSON.parse((e as MessageEvent).data);
+      setJobs((prev) => mergeJobs(prev, [job]));
+    });
+
+    source.onerror = () => {
+      // EventSource reintenta solo; mientras tanto se usa polling
+      startPolling();
+    };
 
     return () => {
       isMounted = false;
-      clearInterval(interval);
+      source.close();
+      stopPolling();
     };
   }, [refreshInterval]);
 
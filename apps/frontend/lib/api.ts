@@ -25,6 +25,7 @@ export interface Job {
   end_time?: number;
   exit_code?: number;
   metrics?: JobMetrics;
+  version?: number;
 }
 
 export interface CreateJobRequest {
@@ -94,6 +95,11 @@ class APIClient {
     return response.json();
   }
 
+  // Stream en vivo (Server-Sent Events)
+  getStreamURL(): string {
+    return `${this.baseURL}/stream`;
+  }
+
   // Health check
   async healthCheck(): Promise<{ status: string; system: SystemStats }> {
     const response = await fetch(`${this.baseURL}/health`);